@@ -0,0 +1,79 @@
+"""
+-------------------------------------------------
+文件名：benchmark.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    性能对比脚本，不依赖图形界面：
+    - scheduler：对比贪心的 `nearest_task_first` 与全局最优的 `optimal_assignment`
+      在不同机器人/车辆规模下的耗时和总行驶距离
+
+用法示例：
+    python benchmark.py scheduler
+    python benchmark.py scheduler --robots 50 --vehicles 200 1000 5000 --repeats 3
+-------------------------------------------------
+"""
+import argparse
+import random
+import time
+
+from models.charging_robot import ChargingRobot
+from models.scheduler import nearest_task_first, optimal_assignment, build_cost_matrix
+
+
+class _ParkedVehicle:
+    """基准测试用的最简车辆，只需要 position 属性"""
+    def __init__(self, position):
+        self.position = position
+
+
+def _total_distance(assignment):
+    if not assignment:
+        return 0.0
+    robots = list(assignment)
+    vehicles = [assignment[r] for r in robots]
+    cost = build_cost_matrix(robots, vehicles)
+    return float(cost.diagonal().sum())
+
+
+def bench_scheduler(num_robots, num_vehicles, repeats=3, grid=200, seed=0):
+    """
+    对同一组随机场景分别运行两种策略，返回 {策略名: (平均耗时秒, 平均总距离)}。
+    """
+    rng = random.Random(seed)
+    strategies = {"nearest_task_first": nearest_task_first, "optimal_assignment": optimal_assignment}
+    totals = {name: [0.0, 0.0] for name in strategies}
+    for _ in range(repeats):
+        robots = [ChargingRobot(robot_id=i, position=(rng.randrange(grid), rng.randrange(grid)))
+                  for i in range(num_robots)]
+        vehicles = [_ParkedVehicle((rng.randrange(grid), rng.randrange(grid))) for _ in range(num_vehicles)]
+        for name, strategy in strategies.items():
+            start = time.perf_counter()
+            assignment = strategy(robots, vehicles)
+            totals[name][0] += time.perf_counter() - start
+            totals[name][1] += _total_distance(assignment)
+    return {name: (t / repeats, d / repeats) for name, (t, d) in totals.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="智能园区性能对比")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scheduler", help="调度策略对比")
+    p.add_argument("--robots", type=int, nargs="+", default=[10, 50])
+    p.add_argument("--vehicles", type=int, nargs="+", default=[100, 1000, 5000])
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == "scheduler":
+        print(f"{'robots':>6} {'vehicles':>8} {'strategy':>20} {'time_ms':>10} {'distance':>12}")
+        for r in args.robots:
+            for v in args.vehicles:
+                result = bench_scheduler(r, v, repeats=args.repeats, seed=args.seed)
+                for name, (t, d) in result.items():
+                    print(f"{r:>6} {v:>8} {name:>20} {t * 1000:>10.2f} {d:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
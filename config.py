@@ -0,0 +1,21 @@
+"""
+-------------------------------------------------
+文件名：config.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    全局配置文件，定义园区地图的格子编码。
+    地图以 uint8 数组存储，每个格子一个字节；渲染和调试时再映射回字符。
+-------------------------------------------------
+"""
+import numpy as np
+
+# 地图格子编码（与原字符地图一一对应）
+CELL_FREE = 0      # 'S' 空闲区
+CELL_ROAD = 1      # 'R' 道路
+CELL_BUILDING = 2  # 'B' 建筑
+CELL_STATION = 3   # 'C' 充电桩
+CELL_GATE = 4      # 'G' 大门
+
+# 编码 -> 字符，CELL_CHARS[map] 即可得到字符地图
+CELL_CHARS = np.array(["S", "R", "B", "C", "G"])
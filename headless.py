@@ -0,0 +1,281 @@
+"""
+-------------------------------------------------
+文件名：headless.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该文件是无界面（headless）批量模拟的入口点，负责：
+    - 按给定随机种子和参数初始化 `Simulation`
+    - 以固定步长（或离散事件跳跃）尽可能快地推进 N 个时间单位，不依赖 Qt 定时器和显示器
+    - 运行过程中统计车位占用率、排队长度、进出场耗时、机器人利用率等指标
+    - 运行结束后输出汇总指标（JSON）
+
+用法示例：
+    python headless.py --ticks 86400 --seed 42 --output result.json
+    python headless.py --config scenario.json --ticks 10000
+    python headless.py --layout lots/north.json --ticks 10000            # 使用布局文件描述的真实园区
+    python headless.py --engine fleet --traffic queue --spawn-interval 1 --ticks 10000  # 带拥堵的交通模型
+    python headless.py --ticks 3600 --seed 1 --save-snapshot warm.snap   # 预热并保存快照
+    python headless.py --snapshot warm.snap --seed 2 --ticks 10000       # 从预热状态分叉运行
+    python headless.py --ticks 10000 --events events.jsonl               # 输出事件日志
+-------------------------------------------------
+"""
+import argparse
+import json
+import sys
+import time
+
+from simulation import Simulation
+from models.layout import load_layout
+from snapshot import save_snapshot, load_snapshot
+from utils.logger import EventLog, open_sink
+from utils.profiler import Profiler
+
+
+class MetricsCollector:
+    """
+    统计模拟指标，作为 `Simulation.run()` / `run_until()` 的 on_tick 回调使用。
+    每次回调记录一次状态快照，该状态一直保持到下一次回调，均值按时间加权，
+    因此逐步模式和离散事件模式（时间跳跃）下的结果含义一致。
+    """
+    def __init__(self, simulation):
+        self.sim = simulation
+        self.samples = 0
+        self.start_time = simulation.global_time
+        self.last_time = simulation.global_time
+
+        self.total_spots = len(simulation.get_parking_spots())
+        self.start_totals = self._totals(simulation)
+        # 排队长度：路上行驶的车辆（进场/离场）和等待充电的停放车辆
+        # 机器人利用率：非空闲状态的时间 / 总时间
+        self.last = self._sample(simulation)
+        self.sums = [0.0] * len(self.last)
+        self.peaks = list(self.last)
+
+    def _sample(self, sim):
+        states = sim.count_vehicle_states()
+        driving = states["entering"] + states["exiting"]
+        waiting = sim.count_waiting_for_charge()
+        busy = [1 if robot.status != "idle" else 0 for robot in sim.robots]
+        return [sim.occupied_count, driving, waiting] + busy
+
+    @staticmethod
+    def _totals(sim):
+        # 累计量：停车数、进场耗时、离场数、离场耗时、拥堵模型下被堵住的车辆·步数
+        blocked = 0 if sim.road_graph is None else sim.road_graph.blocked_total
+        return [sim.total_parked, sim.entry_time_total, sim.total_exited, sim.exit_time_total, blocked]
+
+    def _accumulate(self, now):
+        dt = now - self.last_time
+        if dt > 0:
+            for i, value in enumerate(self.last):
+                self.sums[i] += value * dt
+        self.last_time = now
+
+    def __call__(self, sim):
+        self.samples += 1
+        self._accumulate(sim.global_time)
+        self.last = self._sample(sim)
+        for i, value in enumerate(self.last):
+            if value > self.peaks[i]:
+                self.peaks[i] = value
+
+    def summary(self):
+        self._accumulate(self.sim.global_time)
+        duration = max(self.sim.global_time - self.start_time, 1)
+        spots = max(self.total_spots, 1)
+        occupied, driving, waiting = self.sums[:3]
+        robot_util = [busy / duration for busy in self.sums[3:]]
+        parked, entry_time, exited, exit_time, blocked = (
+            end - start for end, start in zip(self._totals(self.sim), self.start_totals))
+        return {
+            "ticks": self.sim.global_time - self.start_time,
+            "steps": self.samples,
+            "global_time": self.sim.global_time,
+            "vehicles_spawned": self.sim.total_spawned,
+            "vehicles_exited": self.sim.total_exited,
+            "vehicles_in_park": len(self.sim.vehicles),
+            "parking_spots": self.total_spots,
+            "occupancy_mean": occupied / duration / spots,
+            "occupancy_peak": self.peaks[0] / spots,
+            "occupancy_final": self.sim.occupied_count / spots,
+            "driving_queue_mean": driving / duration,
+            "driving_queue_peak": self.peaks[1],
+            "charge_queue_mean": waiting / duration,
+            "charge_queue_peak": self.peaks[2],
+            "entry_time_mean": entry_time / parked if parked else 0.0,
+            "exit_time_mean": exit_time / exited if exited else 0.0,
+            "blocked_mean": blocked / duration,
+            "robot_utilisation": robot_util,
+            "robot_utilisation_mean": sum(robot_util) / len(robot_util) if robot_util else 0.0,
+            "stations": self.sim.station_stats(),
+        }
+
+
+def build_simulation(config, seed=None, snapshot=None):
+    """
+    根据配置字典创建模拟实例。
+    :param config: Simulation 构造参数以及 layout_file（布局描述文件，见 models/layout.py）/
+                   spawn_interval / gate_spawn_prob / dispatch_interval / charging_strategy /
+                   charging_curves / arrival_model / arrival_profile
+    :param seed: 随机种子（传给 Simulation，派生各子系统的独立随机数流），None 表示不固定
+    :param snapshot: 快照文件路径。给出时从快照恢复（布局和构造参数以快照为准，忽略 config 中的构造参数），
+                     seed 不为 None 时用它重新派生随机数流，config 中的其余设置照常覆盖
+    """
+    config = dict(config)
+    spawn_interval = config.pop("spawn_interval", None)
+    gate_spawn_prob = config.pop("gate_spawn_prob", None)
+    dispatch_interval = config.pop("dispatch_interval", None)
+    charging_strategy = config.pop("charging_strategy", None)
+    charging_curves = config.pop("charging_curves", None)
+    arrival_model = config.pop("arrival_model", None)
+    arrival_profile = config.pop("arrival_profile", None)
+    layout_file = config.pop("layout_file", None)
+    if layout_file is not None:
+        config["layout"] = load_layout(layout_file)
+    if "grid_size" in config:
+        config["grid_size"] = tuple(config["grid_size"])
+
+    if snapshot is not None:
+        sim = load_snapshot(snapshot, seed=seed)
+    else:
+        sim = Simulation(seed=seed, **config)
+    if spawn_interval is not None:
+        sim.spawn_interval = spawn_interval
+    if gate_spawn_prob is not None:
+        sim.gate_spawn_prob = gate_spawn_prob
+    if dispatch_interval is not None:
+        sim.dispatch_interval = dispatch_interval
+    if charging_strategy is not None:
+        sim.set_charging_strategy(charging_strategy)
+    if charging_curves is not None:
+        sim.set_charging_curves(charging_curves)
+    if arrival_model is not None or arrival_profile is not None:
+        sim.set_arrival_model(arrival_model or "bernoulli", profile=arrival_profile)
+    return sim
+
+
+def run_headless(config, num_ticks, seed=None, snapshot=None, save_to=None, events=None, profile=False):
+    """
+    无界面运行一个场景，返回汇总指标字典。
+    :param config: 场景配置（见 build_simulation）
+    :param num_ticks: 模拟时长（时间单位），从起始状态（新建或快照）起算
+    :param seed: 随机种子
+    :param snapshot: 起始快照文件路径，None 表示从头开始
+    :param save_to: 运行结束后把状态保存为快照文件
+    :param events: 事件日志输出目标（文件路径或 tcp://host:port、unix:///path，见 utils/logger.py），None 表示不记录
+    :param profile: 是否按阶段统计耗时（见 utils/profiler.py），结果写入 "profile"
+    """
+    sim = build_simulation(config, seed, snapshot)
+    if events is not None:
+        sim.telemetry = EventLog([open_sink(events)])
+    if profile:
+        sim.profiler = Profiler()
+    collector = MetricsCollector(sim)
+
+    start = time.perf_counter()
+    sim.run_until(sim.global_time + num_ticks, on_tick=collector)
+    elapsed = time.perf_counter() - start
+    if sim.telemetry is not None:
+        sim.telemetry.close()
+
+    result = collector.summary()
+    result["seed"] = seed
+    result["wall_time_s"] = elapsed
+    result["ticks_per_second"] = num_ticks / elapsed if elapsed > 0 else float("inf")
+    if sim.telemetry is not None:
+        result["events"] = sim.telemetry.emitted
+    if sim.profiler is not None:
+        result["profile"] = sim.profiler.stats()
+    if save_to is not None:
+        save_snapshot(sim, save_to)
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="智能园区无界面批量模拟")
+    parser.add_argument("--ticks", type=int, default=1000, help="模拟时长（时间单位）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--config", type=str, default=None, help="场景配置 JSON 文件")
+    parser.add_argument("--layout", type=str, default=None, help="布局描述文件（JSON），替代随机生成布局")
+    parser.add_argument("--grid", type=int, nargs=2, default=None, metavar=("W", "H"), help="地图尺寸")
+    parser.add_argument("--buildings", type=int, default=None, help="建筑数量")
+    parser.add_argument("--stations", type=int, default=None, help="充电桩数量")
+    parser.add_argument("--gates", type=int, default=None, help="大门数量")
+    parser.add_argument("--robots", type=int, default=None, help="充电机器人数量")
+    parser.add_argument("--station-slots", type=int, default=None, help="每个充电站的补电车位数")
+    parser.add_argument("--station-policy", type=str, default=None, choices=("fifo", "priority"),
+                        help="充电站排队规则")
+    parser.add_argument("--spawn-interval", type=int, default=None, help="车辆刷新间隔")
+    parser.add_argument("--gate-prob", type=float, nargs="+", default=None, help="各大门刷新概率")
+    parser.add_argument("--arrivals", type=str, default=None, choices=("bernoulli", "poisson"),
+                        help="到达模型：每门每刷新时刻伯努利（最多一辆）或泊松（--gate-prob 为均值）")
+    parser.add_argument("--profile", type=float, nargs="+", default=None,
+                        help="时变到达系数，按刷新时刻循环乘到各门速率上")
+    parser.add_argument("--dispatch-interval", type=int, default=None, help="充电调度间隔")
+    parser.add_argument("--strategy", type=str, default=None, choices=("distance", "demand", "deadline"),
+                        help="充电需求队列排序策略")
+    parser.add_argument("--curves", type=str, nargs="+", default=None, choices=("linear", "cccv"),
+                        help="车型充电曲线，刷新车辆时随机选用")
+    parser.add_argument("--engine", type=str, default=None, choices=("object", "fleet"), help="车辆引擎")
+    parser.add_argument("--mode", type=str, default=None, choices=("tick", "event"), help="推进方式")
+    parser.add_argument("--traffic", type=str, default=None, choices=("free", "queue"),
+                        help="交通模型：车辆互不影响，或道路格子有容量、车辆排队通行")
+    parser.add_argument("--cell-capacity", type=int, default=None, help="拥堵模型下每个道路格子的容量")
+    parser.add_argument("--snapshot", type=str, default=None,
+                        help="从快照文件恢复后继续运行（给出 --seed 时重新派生随机数流）")
+    parser.add_argument("--save-snapshot", type=str, default=None, help="运行结束后把状态保存为快照文件")
+    parser.add_argument("--events", type=str, default=None,
+                        help="事件日志输出：*.jsonl 为 JSONL 文件，其余路径为按列二进制分块，"
+                             "tcp://host:port 或 unix:///path 为本地套接字")
+    parser.add_argument("--profile-phases", action="store_true", help="按阶段统计 update 耗时的 p50/p95/p99")
+    parser.add_argument("--output", type=str, default=None, help="指标输出文件，默认打印到标准输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    config = {"grid_size": (200, 200), "num_buildings": 2, "num_stations": 2, "num_gates": 3}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+
+    # 命令行参数优先于配置文件
+    overrides = {
+        "layout_file": args.layout,
+        "grid_size": args.grid,
+        "num_buildings": args.buildings,
+        "num_stations": args.stations,
+        "num_gates": args.gates,
+        "num_robots": args.robots,
+        "station_slots": args.station_slots,
+        "station_policy": args.station_policy,
+        "spawn_interval": args.spawn_interval,
+        "gate_spawn_prob": args.gate_prob,
+        "dispatch_interval": args.dispatch_interval,
+        "charging_strategy": args.strategy,
+        "charging_curves": args.curves,
+        "arrival_model": args.arrivals,
+        "arrival_profile": args.profile,
+        "engine": args.engine,
+        "mode": args.mode,
+        "traffic": args.traffic,
+        "cell_capacity": args.cell_capacity,
+    }
+    config.update({k: v for k, v in overrides.items() if v is not None})
+
+    result = run_headless(config, args.ticks, seed=args.seed, snapshot=args.snapshot, save_to=args.save_snapshot,
+                          events=args.events, profile=args.profile_phases)
+    result["config"] = {k: list(v) if isinstance(v, tuple) else v for k, v in config.items()}
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,18 +5,34 @@
 日期：2025年3月
 功能描述：
     该文件是整个模拟系统的入口点，负责：
-    - 初始化 `Simulation`（智能园区）
+    - 初始化 `Simulation`（智能园区），命令行给出布局描述文件时加载真实园区（python main.py lot.json）
+    - 加 --profile-phases 时启动即显示耗时剖析叠加层（运行中也可按 P 键开关），与 headless.py 的同名参数一致
     - 启动 `run_gui()` 进行可视化渲染
     - 运行园区动态模拟，包括车辆移动和充电机器人调度
 -------------------------------------------------
 """
+import argparse
+
 from simulation import Simulation
+from models.layout import load_layout
 from render import run_gui
 
-def main():
-    # 可以根据需求调整 grid_size、num_buildings、num_stations、num_gates 等参数
-    sim = Simulation(grid_size=(200, 200), num_buildings=2, num_stations=2, num_gates=3)
-    run_gui(sim)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="智能园区可视化模拟")
+    parser.add_argument("layout", nargs="?", default=None, help="布局描述文件（见 models/layout.py），不给出时随机生成")
+    parser.add_argument("--profile-phases", action="store_true", help="启动即显示各阶段耗时剖析叠加层")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.layout is not None:
+        sim = Simulation(layout=load_layout(args.layout))
+    else:
+        # 可以根据需求调整 grid_size、num_buildings、num_stations、num_gates 等参数
+        sim = Simulation(grid_size=(200, 200), num_buildings=2, num_stations=2, num_gates=3)
+    run_gui(sim, profile=args.profile_phases)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
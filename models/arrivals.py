@@ -0,0 +1,150 @@
+"""
+-------------------------------------------------
+文件名：arrivals.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了车辆到达生成器 (`ArrivalGenerator`)，按块预先抽样未来一段时间的全部到达：
+    - 每隔 spawn_interval 为一个刷新时刻，一次抽取 block_slots 个刷新时刻 × 全部大门的到达数
+    - "bernoulli"：每个刷新时刻每个大门最多来一辆，概率为该门的速率（即原有规则）
+    - "poisson"：每个刷新时刻每个大门的到达数服从泊松分布，均值为该门的速率，可模拟高峰期的成批到达
+    - 时变到达曲线 profile：按刷新时刻给速率乘上系数（可调用对象 profile(t)，或按刷新时刻循环的系数序列）
+    到达的停车时长、初始/目标电量、行驶方向、车型曲线也以数组形式整块抽取，
+    Simulation 据此对空闲车位池批量预订并批量创建车辆。
+-------------------------------------------------
+"""
+import numpy as np
+
+ARRIVAL_MODELS = ("bernoulli", "poisson")
+
+
+class ArrivalBatch:
+    """同一刷新时刻到达的一批车辆，各属性为等长的 NumPy 数组"""
+
+    def __init__(self, time, gate, parking_duration, initial_battery, target_battery, clockwise, curve):
+        self.time = time
+        self.gate = gate                          # 大门下标
+        self.parking_duration = parking_duration
+        self.initial_battery = initial_battery
+        self.target_battery = target_battery
+        self.clockwise = clockwise
+        self.curve = curve                        # Simulation.charging_curves 中的下标
+
+    def __len__(self):
+        return len(self.gate)
+
+    def head(self, count):
+        """只保留前 count 辆（空闲车位不足时使用）"""
+        return ArrivalBatch(self.time, self.gate[:count], self.parking_duration[:count],
+                            self.initial_battery[:count], self.target_battery[:count],
+                            self.clockwise[:count], self.curve[:count])
+
+
+class ArrivalGenerator:
+    def __init__(self, simulation, model="bernoulli", profile=None, block_slots=256):
+        """
+        :param simulation: Simulation 实例，读取 spawn_interval、gate_spawn_prob、charging_curves 和随机数流
+        :param model: 到达模型，见 ARRIVAL_MODELS
+        :param profile: 时变到达曲线，None 表示速率不随时间变化
+        :param block_slots: 每次预先抽样的刷新时刻数
+        """
+        if model not in ARRIVAL_MODELS:
+            raise ValueError(f"unknown arrival model: {model}")
+        self.sim = simulation
+        self.model = model
+        self.profile = profile
+        self.block_slots = block_slots
+        self.reset()
+
+    def reset(self):
+        """丢弃已抽样的块（速率、刷新间隔或车型曲线变化时由 Simulation.resample_arrivals 调用，从下一个刷新时刻起生效）"""
+        self._times = np.zeros(0, dtype=np.int64)   # 块内各刷新时刻
+        self._offsets = np.zeros(1, dtype=np.int64)  # 第 k 个刷新时刻的到达位于 [offsets[k], offsets[k+1])
+        self._arrays = None
+        self._interval = None
+
+    # ====== 速率 ======
+    def _rates(self, times):
+        """返回 (刷新时刻数, 大门数) 的速率矩阵"""
+        sim = self.sim
+        base = np.zeros(len(sim.gates))
+        probs = np.asarray(sim.gate_spawn_prob[:len(base)], dtype=np.float64)
+        base[:len(probs)] = probs
+        if self.profile is None:
+            factor = np.ones(len(times))
+        elif callable(self.profile):
+            factor = np.array([self.profile(int(t)) for t in times], dtype=np.float64)
+        else:
+            profile = np.asarray(self.profile, dtype=np.float64)
+            factor = profile[(times // self._interval) % len(profile)]
+        return factor[:, None] * base[None, :]
+
+    # ====== 抽样 ======
+    def _refill(self, first_time):
+        """从刷新时刻 first_time 起抽样一个块"""
+        sim = self.sim
+        self._interval = sim.spawn_interval
+        times = first_time + self._interval * np.arange(self.block_slots, dtype=np.int64)
+        rates = self._rates(times)
+        rng = sim.arrival_rng
+        if self.model == "poisson":
+            counts = rng.poisson(rates)
+        else:
+            counts = (rng.random(rates.shape) < rates).astype(np.int64)
+
+        # 展平为按 (刷新时刻, 大门) 排序的到达序列
+        gate = np.repeat(np.tile(np.arange(rates.shape[1]), len(times)), counts.ravel())
+        n = len(gate)
+        parking_duration = rng.integers(15, 41, size=n)
+        vrng = sim.vehicle_rng
+        initial = vrng.integers(1, 51, size=n)
+        target = vrng.integers(initial, 101)
+        clockwise = vrng.integers(0, 2, size=n).astype(bool)
+        curves = len(sim.charging_curves)
+        curve = vrng.integers(0, curves, size=n) if curves > 1 else np.zeros(n, dtype=np.int64)
+
+        self._times = times
+        self._offsets = np.concatenate([[0], np.cumsum(counts.sum(axis=1))])
+        self._arrays = (gate, parking_duration, initial, target, clockwise, curve)
+
+    def _slot(self, time):
+        # 返回 time 所在刷新时刻在当前块中的下标，必要时抽样新块
+        interval = self.sim.spawn_interval
+        if self._interval != interval or not len(self._times) or not self._times[0] <= time <= self._times[-1]:
+            first = -(-time // interval) * interval  # 不早于 time 的第一个刷新时刻
+            self._refill(first)
+        return int((time - self._times[0]) // self._interval)
+
+    def take(self, time):
+        """
+        返回刷新时刻 time 到达的车辆批次；time 不是刷新时刻或无到达时返回 None。
+        """
+        if time % self.sim.spawn_interval:
+            return None
+        k = self._slot(time)
+        if self._times[k] != time:
+            return None
+        lo, hi = int(self._offsets[k]), int(self._offsets[k + 1])
+        if lo == hi:
+            return None
+        return ArrivalBatch(time, *(a[lo:hi] for a in self._arrays))
+
+    def next_time(self, after, max_blocks=64):
+        """
+        返回晚于 after 的第一个有车辆到达的刷新时刻（离散事件模式使用）。
+        各大门速率都为 0 时不会再有到达，返回 None（速率改变时由 Simulation.resample_arrivals 重新排定）；
+        到达曲线的零速率时段很长、连续 max_blocks 个块都没有到达时，返回已检查的最后一个刷新时刻：
+        调用方在该时刻取到空批次后从那里继续查找，不会因为一段空闲期而再也不刷新车辆。
+        """
+        gates = len(self.sim.gates)
+        if not any(self.sim.gate_spawn_prob[:gates]):
+            return None
+        time = (after // self.sim.spawn_interval + 1) * self.sim.spawn_interval
+        for _ in range(max_blocks):
+            k = self._slot(time)
+            totals = np.diff(self._offsets[k:])
+            hits = np.nonzero(totals)[0]
+            if hits.size:
+                return int(self._times[k + hits[0]])
+            time = int(self._times[-1]) + self._interval
+        return int(self._times[-1])
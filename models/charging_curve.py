@@ -0,0 +1,184 @@
+"""
+-------------------------------------------------
+文件名：charging_curve.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了车辆充电曲线 (`ChargingCurve`)，把“每单位时间充一次电”的规则写成闭式解：
+    - `advance(b, n)`：从电量 b 连续充 n 个单位时间后的电量
+    - `ticks_to_reach(b, target)`：从 b 充到 target 需要的单位时间数
+    - `energy_over(b, n, target)`：n 个单位时间内实际充入的电量（到 target 为止）
+    这样引擎只需排定一个“充电完成”事件，或一次跳过整段充电过程，每次充电会话为 O(1)。
+    提供两种曲线，可按车型为每辆车指定：
+    - `LinearCurve`：原有规则，充电速度 = offset - slope × 当前电量（默认 100 - 0.5 × 电量）
+    - `CCCVCurve`：恒流-恒压两段式，电量低于 cv_start 时每单位时间固定充 current，
+      之后每单位时间补上剩余差距的 cv_ratio 比例
+-------------------------------------------------
+"""
+import math
+
+
+class ChargingCurve:
+    """
+    充电曲线基类。子类给出单步规则的闭式解 `advance`，以及 `ticks_to_reach` 的估计值，
+    基类负责把估计值修正为精确的最小步数。
+    """
+
+    def advance(self, battery, ticks):
+        raise NotImplementedError
+
+    def _estimate_ticks(self, battery, target):
+        raise NotImplementedError
+
+    def rate(self, battery):
+        """当前电量下单位时间的充电量（即原 get_charging_speed）"""
+        return self.advance(battery, 1) - battery
+
+    def step(self, battery, target):
+        """充电一个单位时间，不超过 target"""
+        return min(self.advance(battery, 1), target)
+
+    def ticks_to_reach(self, battery, target):
+        """
+        从 battery 充到不低于 target 所需的最少单位时间数，永远达不到时返回 math.inf。
+        """
+        if battery >= target:
+            return 0
+        n = self._estimate_ticks(battery, target)
+        if n == math.inf:
+            return n
+        n = max(int(n), 1)
+        # 闭式估计可能因浮点误差差一步，用 advance 校正到精确值
+        while self.advance(battery, n) < target:
+            n += 1
+        while n > 1 and self.advance(battery, n - 1) >= target:
+            n -= 1
+        return n
+
+    def energy_over(self, battery, ticks, target=math.inf):
+        """ticks 个单位时间内充入的电量（充到 target 为止）"""
+        if ticks <= 0 or battery >= target:
+            return 0.0
+        return min(self.advance(battery, ticks), target) - battery
+
+
+class LinearCurve(ChargingCurve):
+    """
+    充电速度随电量线性下降：b' = b + offset - slope × b。
+    即 b_n = F - (F - b)(1 - slope)^n，其中 F = offset / slope 为不动点。
+    """
+
+    def __init__(self, offset=100, slope=0.5):
+        """
+        :param offset: 电量为 0 时的充电速度
+        :param slope: 电量每增加 1，充电速度下降多少（0 <= slope < 1）
+        """
+        if not 0 <= slope < 1:
+            raise ValueError("slope must be in [0, 1)")
+        self.offset = offset
+        self.slope = slope
+
+    def __repr__(self):
+        return f"LinearCurve(offset={self.offset}, slope={self.slope})"
+
+    def advance(self, battery, ticks):
+        if ticks <= 0:
+            return battery
+        if self.slope == 0:
+            return battery + self.offset * ticks
+        fixed = self.offset / self.slope
+        return fixed - (fixed - battery) * (1 - self.slope) ** ticks
+
+    def _estimate_ticks(self, battery, target):
+        if self.slope == 0:
+            return math.inf if self.offset <= 0 else math.ceil((target - battery) / self.offset)
+        fixed = self.offset / self.slope
+        if target >= fixed:
+            return math.inf
+        return math.ceil(math.log((fixed - target) / (fixed - battery)) / math.log(1 - self.slope))
+
+
+class CCCVCurve(ChargingCurve):
+    """
+    恒流-恒压两段式充电：
+    - 恒流段（电量 < cv_start）：每单位时间充 current
+    - 恒压段：每单位时间补上与 (capacity + tolerance) 差距的 cv_ratio 比例，最多到 capacity
+    tolerance 让恒压段在有限时间内真正充满，而不是无限逼近 capacity。
+    """
+
+    def __init__(self, current=20, cv_start=80, cv_ratio=0.3, capacity=100, tolerance=0.5):
+        """
+        :param current: 恒流段每单位时间充入的电量
+        :param cv_start: 切换到恒压段的电量
+        :param cv_ratio: 恒压段每单位时间补上剩余差距的比例（0 < cv_ratio < 1）
+        :param capacity: 电池容量
+        :param tolerance: 恒压段渐近线高出容量的余量
+        """
+        if current <= 0 or not 0 < cv_ratio < 1:
+            raise ValueError("current must be positive and cv_ratio in (0, 1)")
+        self.current = current
+        self.cv_start = cv_start
+        self.cv_ratio = cv_ratio
+        self.capacity = capacity
+        self.tolerance = tolerance
+
+    def __repr__(self):
+        return (f"CCCVCurve(current={self.current}, cv_start={self.cv_start}, "
+                f"cv_ratio={self.cv_ratio}, capacity={self.capacity})")
+
+    def _cc_ticks(self, battery):
+        # 恒流段还需要多少步（最后一步可能越过 cv_start）
+        if battery >= self.cv_start:
+            return 0
+        return math.ceil((self.cv_start - battery) / self.current)
+
+    def _cv_advance(self, battery, ticks):
+        limit = self.capacity + self.tolerance
+        return min(self.capacity, limit - (limit - battery) * (1 - self.cv_ratio) ** ticks)
+
+    def advance(self, battery, ticks):
+        if ticks <= 0:
+            return battery
+        cc = self._cc_ticks(battery)
+        if ticks <= cc:
+            return min(self.capacity, battery + self.current * ticks)
+        battery = min(self.capacity, battery + self.current * cc)
+        return self._cv_advance(battery, ticks - cc)
+
+    def _estimate_ticks(self, battery, target):
+        if target > self.capacity:
+            return math.inf
+        cc = self._cc_ticks(battery)
+        if cc:
+            k = math.ceil((target - battery) / self.current)
+            if k <= cc:
+                return k
+            battery = min(self.capacity, battery + self.current * cc)
+            if battery >= target:
+                return cc
+        limit = self.capacity + self.tolerance
+        return cc + math.ceil(math.log((limit - target) / (limit - battery)) / math.log(1 - self.cv_ratio))
+
+
+DEFAULT_CURVE = LinearCurve()
+
+# 按名称创建曲线（用于配置文件 / 命令行）
+CURVES = {
+    "linear": LinearCurve,
+    "cccv": CCCVCurve,
+}
+
+
+def make_curve(spec):
+    """
+    根据名称或 {"type": 名称, 参数...} 字典创建充电曲线，已是 ChargingCurve 时原样返回。
+    """
+    if isinstance(spec, ChargingCurve):
+        return spec
+    if isinstance(spec, str):
+        spec = {"type": spec}
+    spec = dict(spec)
+    kind = spec.pop("type", "linear")
+    if kind not in CURVES:
+        raise ValueError(f"unknown charging curve: {kind}")
+    return CURVES[kind](**spec)
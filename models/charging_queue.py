@@ -0,0 +1,98 @@
+"""
+-------------------------------------------------
+文件名：charging_queue.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了充电需求队列 (`ChargingDemandQueue`)，持久保存等待充电的停放车辆。
+    车辆停入车位时入队，以优先级堆维护，调度时按优先级增量取出，不再每次从全部车辆重建。
+    支持三种策略：
+    - "distance"：由调度器借助待充电车辆的空间索引为每个空闲机器人取最近的车辆，不按队列顺序出队，
+      因此队列只记录哪些车辆在等待（按入队顺序），不维护优先级堆
+    - "demand"：充电需求（target_battery_level - current_battery），大者优先
+    - "deadline"：剩余停车时间（预计离场时刻），早离场者优先
+    车辆离场或已被分配时不立即从堆中删除，而是在出队时惰性跳过；
+    失效条目超过堆的一半时整体压缩一次，堆的大小与队列长度同阶。
+-------------------------------------------------
+"""
+import heapq
+import itertools
+
+STRATEGIES = ("distance", "demand", "deadline")
+
+
+class ChargingDemandQueue:
+    def __init__(self, simulation, strategy="distance"):
+        """
+        :param simulation: Simulation 实例（用于读取充电站位置）
+        :param strategy: 排序策略，见 STRATEGIES
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown charging strategy: {strategy}")
+        self.sim = simulation
+        self.strategy = strategy
+        self.ordered = strategy != "distance"  # 是否按优先级出队（维护优先级堆）
+        self._heap = []
+        self._queued = {}      # 当前在队列中的车辆（按入队顺序）
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._queued)
+
+    def __bool__(self):
+        return bool(self._queued)
+
+    def __contains__(self, vehicle):
+        return vehicle in self._queued
+
+    def _key(self, vehicle):
+        if self.strategy == "demand":
+            return -(vehicle.target_battery_level - vehicle.current_battery)
+        return vehicle.parked_time + vehicle.parking_duration
+
+    def push(self, vehicle):
+        """车辆停入车位且需要充电时入队（重复入队忽略）"""
+        if vehicle in self._queued:
+            return
+        self._queued[vehicle] = None
+        if self.ordered:
+            heapq.heappush(self._heap, (self._key(vehicle), next(self._counter), vehicle))
+
+    def discard(self, vehicle):
+        """车辆离场或不再需要充电时移出队列（堆中的条目在出队时跳过）"""
+        self._queued.pop(vehicle, None)
+        if len(self._heap) > 2 * len(self._queued):
+            self._compact()
+
+    def _compact(self):
+        # 丢弃已出队车辆的条目；同一车辆多次入队时只保留最先出队的条目，与惰性跳过的结果一致
+        first = {}
+        for entry in self._heap:
+            vehicle = entry[2]
+            if vehicle in self._queued and (vehicle not in first or entry < first[vehicle]):
+                first[vehicle] = entry
+        self._heap = list(first.values())
+        heapq.heapify(self._heap)
+
+    def pop_batch(self, count):
+        """
+        按优先级（"distance" 策略按入队顺序）取出最多 count 辆仍需充电的车辆。
+        :return: 车辆列表
+        """
+        if not self.ordered:
+            batch = []
+            for vehicle in list(self._queued)[:count]:
+                del self._queued[vehicle]
+                if vehicle.state == "parked" and vehicle.charging_status != "charged":
+                    batch.append(vehicle)
+            return batch
+        batch = []
+        while self._heap and len(batch) < count:
+            _, _, vehicle = heapq.heappop(self._heap)
+            if vehicle not in self._queued:
+                continue
+            del self._queued[vehicle]
+            if vehicle.state != "parked" or vehicle.charging_status == "charged":
+                continue
+            batch.append(vehicle)
+        return batch
@@ -6,16 +6,32 @@
 功能描述：
     该模块定义了充电机器人 (`ChargingRobot`)，用于为园区内停在车位上的车辆提供自动充电服务。
     机器人具备移动能力，可以前往指定车辆并执行充电任务，充电过程受充电速度、电池系数、调度策略等因素影响。
+    能耗模型：
+    - 移动每格消耗 move_cost，给车辆输出电量按 charge_efficiency 折算自身消耗
+    - 任何时候都保留“最低电量阈值 + 返回最近充电站的行驶能耗”，电量不够时只部分输出并结束任务
+    - 空闲时主动决策：电量不足以完成最小输出任务，或没有待服务车辆且电量偏低时，前往充电站补电
+    - 充电站车位有限，满员时机器人在站内排队等待（由 Simulation 管理）
+    移动、补电、给车辆充电各为一段，段内每一步的电量都由段开始时的电量按闭式解算出，
+    逐步更新和离散事件模式一次跳过多步得到的数值完全相同（不会因浮点误差累积而相差一步）。
 -------------------------------------------------
 """
+import math
+
+from models.route import ManhattanRoute
+from utils.logger import EVENT_CHARGE_START, EVENT_CHARGE_STOP
 
 class ChargingRobot:
     def __init__(self, robot_id, position, battery_level=100, max_battery=100, move_speed=2, 
-                 charge_efficiency=0.95, min_battery_threshold=20, station_position=None): 
+                 charge_efficiency=0.95, min_battery_threshold=20, station_position=None,
+                 move_cost=0.1, recharge_level=50, recharge_rate=5, min_transfer=5):
         """
         充电机器人类，负责移动、充电、管理自身电量。
 
         :param charge_efficiency: 机器人充电效率为0。95（损耗 5% 能量）
+        :param move_cost: 每移动一格消耗的电量
+        :param recharge_level: 没有待服务车辆时，电量低于该值即趁空闲补电
+        :param recharge_rate: 未绑定 ChargingStation 时，在充电站每单位时间补充的电量
+        :param min_transfer: 一次任务至少能输出的电量，达不到时不接任务、直接补电
         """
         # 机器人属性：编号、位置、电量、最大电量、移动速度、充电效率、最低电量阈值、充电站位置列表
         self.id = robot_id
@@ -30,6 +46,18 @@ class ChargingRobot:
         self.target_station = None
         self.status = "idle"
         self.route = []
+        self.move_cost = move_cost
+        self.recharge_level = recharge_level
+        self.recharge_rate = recharge_rate
+        self.min_transfer = min_transfer
+        self.planner = None     # 可选的避障寻路服务 (GridPlanner)，由 Simulation 注入
+        self._station_trip = (None, None, 0)  # 最近一次查询的 (位置, 地图版本, 返回最近充电站的步数)
+        self.simulation = None  # 可选的 Simulation，用于任务结束回调和充电站排队
+        self.charging_station = None  # 当前所在（补电或排队）的 ChargingStation
+        # 当前一段（移动/补电/给车辆充电）开始时自身和车辆的电量，以及已进行的步数
+        self._segment_battery = battery_level
+        self._segment_vehicle = 0.0
+        self._segment_ticks = 0
 
     def charging_vehicle(self):
         """ 
@@ -37,25 +65,39 @@ class ChargingRobot:
         该函数每次单位间隔调用一次。
         """
         if self.target_vehicle and self.status == "charging_vehicle":
-            charge_rate = self.target_vehicle.get_charging_speed()
-            self.target_vehicle.charging(charge_rate)
+            if self.target_vehicle.state != "parked":
+                # 车辆已离开车位，放弃本次任务
+                self.release_target()
+                return
+            vehicle = self.target_vehicle
+            budget = self.transfer_budget(self.position)
+            step = min(vehicle.get_charging_speed(), vehicle.target_battery_level - vehicle.current_battery)
+            if budget >= step:
+                self._segment_ticks += 1
+                self._charge_segment()
+            else:
+                # 再充就会低于保留电量：只输出剩余额度（机器人电量消耗受车辆电池系数影响）
+                vehicle.current_battery += budget
+                self.battery_level -= budget / self.charge_efficiency
 
-            # 机器人电量消耗受车辆电池系数影响
-            self.battery_level -= charge_rate / self.charge_efficiency
-            
-            if self.target_vehicle.charging_status == "charged":
-                self.status = "idle"
-                self.target_vehicle = None  # 任务完成
+            if vehicle.charging_status == "charged":
+                self._finish_job(vehicle)  # 任务完成
+            elif budget <= step:
+                self._finish_job(vehicle)  # 电量只剩保留部分，结束任务回站补电
+                self.go_recharge()
 
     def being_charged(self):
         """充电机器人进入充电站充电"""
         # 机器人进入充电站充电，每次单位时间充 charge_amount%，直到电量充满
         if self.status == "being_charged":
-            charge_amount = 5  # 每次单位时间充 charge_amount%
-            self.battery_level = min(self.max_battery, self.battery_level + charge_amount)
+            self._segment_ticks += 1
+            self._recharge_segment()
             if self.battery_level >= self.max_battery:
+                station = self.target_station
                 self.status = "idle"
                 self.target_station = None  # 任务完成
+                if self.simulation is not None:
+                    self.simulation.leave_station(self, station)
 
     def bind_target_vehicle(self, vehicle):
         """
@@ -64,6 +106,19 @@ class ChargingRobot:
         """
         self.target_vehicle = vehicle
         self.compute_route_to_target(vehicle.position)
+        if not self.route:
+            self.status = "charging_vehicle"  # 已在车辆旁边，直接开始充电
+            self._start_segment()
+            self._emit(EVENT_CHARGE_START, vehicle)
+
+    def release_target(self):
+        """放弃当前车辆任务（例如车辆提前离场），回到空闲状态"""
+        if self.status == "charging_vehicle" and self.target_vehicle is not None:
+            self._emit(EVENT_CHARGE_STOP, self.target_vehicle)
+        self.target_vehicle = None
+        if self.status in ("moving", "charging_vehicle") and self.target_station is None:
+            self.route = []
+            self.status = "idle"
 
     def bind_target_station(self, station_pos): # 目标充电站信息在self.station_position_list中，可以配合去合理调用函数!
         """
@@ -71,44 +126,239 @@ class ChargingRobot:
         :param station_pos: Tuple[int, int] 表示充电站坐标
         """
         self.target_station = station_pos
+        if self.simulation is not None:
+            self.simulation.head_to_station(self, station_pos)
         self.compute_route_to_target(station_pos)
+        if not self.route:
+            self._arrive_station()  # 已在充电站，直接开始补电
 
-    def compute_route_to_target(self, target_pos):
-        """计算机器人自由移动到目标车辆位置的路径，不受道路限制"""
-        # 注意 目前这个是一个简单的直线路径，实际中需要更复杂的路径规划算法 
-        # 记得在后续的迭代中完善这个函数！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！！
-        self.route = []
-        x, y = self.position
-        target_x, target_y = target_pos
+    def get_recharge_rate(self):
+        """当前每单位时间的补电量：由所在充电站决定"""
+        if self.charging_station is not None:
+            return self.charging_station.charge_rate
+        return self.recharge_rate
+
+    def _arrive_station(self):
+        # 到达充电站：有空闲车位则开始补电，否则排队等待
+        if self.simulation is None or self.simulation.enter_station(self, self.target_station):
+            self.start_recharge()
+        else:
+            self.status = "waiting_station"
+
+    def start_recharge(self):
+        """在充电站开始补电（到站时有空位，或排队后轮到）"""
+        self.status = "being_charged"
+        self._start_segment()
+
+    def _finish_job(self, vehicle):
+        # 结束车辆任务（充满或电量不足），通知 Simulation 处理未充满的车辆
+        self._emit(EVENT_CHARGE_STOP, vehicle)
+        self.status = "idle"
+        self.target_vehicle = None
+        if self.simulation is not None:
+            self.simulation.on_robot_job_finished(self, vehicle)
+
+    # ====== 分段闭式计算 ======
+    def _start_segment(self):
+        # 进入移动/补电/给车辆充电状态时调用：记录段开始时的电量
+        self._segment_battery = self.battery_level
+        self._segment_vehicle = self.target_vehicle.current_battery if self.status == "charging_vehicle" else 0.0
+        self._segment_ticks = 0
+
+    def _move_segment(self):
+        self.battery_level = max(0.0, self._segment_battery - self.move_cost * self._segment_ticks)
+
+    def _recharge_segment(self):
+        self.battery_level = min(self.max_battery,
+                                 self._segment_battery + self.get_recharge_rate() * self._segment_ticks)
+
+    def _charge_segment(self):
+        # 车辆按充电曲线从段开始时的电量充 _segment_ticks 步，机器人按实际充入量和效率扣减电量
+        vehicle = self.target_vehicle
+        vehicle.charging(self._segment_ticks, start=self._segment_vehicle)
+        self.battery_level = (self._segment_battery
+                              - (vehicle.current_battery - self._segment_vehicle) / self.charge_efficiency)
+
+    def _emit(self, kind, vehicle):
+        # 向 Simulation 的事件日志记录充电开始/结束（关联编号为机器人编号）
+        telemetry = self.simulation.telemetry if self.simulation is not None else None
+        if telemetry is not None:
+            x, y = vehicle.position
+            telemetry.emit(self.simulation.global_time, kind, vehicle.vid, x, y, vehicle.current_battery, self.id)
+
+    # ====== 能耗模型 ======
+    def travel_distance(self, start, end):
+        """start 到 end 的行驶步数：有寻路服务时按避障路径，否则按曼哈顿距离"""
+        if self.planner is not None:
+            distance = self.planner.distance(start, end)
+            if distance is not None:
+                return distance
+        return abs(end[0] - start[0]) + abs(end[1] - start[1])
+
+    def nearest_station(self, pos):
+        """
+        距离 pos 最近的充电站，没有充电站时返回 None。
+        接入 Simulation 时由它的充电站空间索引回答，否则在 station_position_list 中按曼哈顿距离查找。
+        """
+        if self.simulation is not None:
+            return self.simulation.nearest_station(pos)
+        if not self.station_position_list:
+            return None
+        return min(self.station_position_list, key=lambda s: abs(s[0] - pos[0]) + abs(s[1] - pos[1]))
 
-        while x != target_x:
-            x += 1 if x < target_x else -1
-            self.route.append((x, y))
+    def reserve_energy(self, pos):
+        """在 pos 处必须保留的电量：最低电量阈值 + 从 pos 返回最近充电站的行驶能耗"""
+        # 给车辆充电时每一步都在同一位置查询，缓存最近一次的行驶步数（地图修改后失效）
+        version = self.simulation.map_version if self.simulation is not None else None
+        last_pos, last_version, travel = self._station_trip
+        if pos != last_pos or version != last_version:
+            station = self.nearest_station(pos)
+            travel = 0 if station is None else self.travel_distance(pos, station)
+            self._station_trip = (pos, version, travel)
+        return self.min_battery_threshold + self.move_cost * travel
 
-        while y != target_y:
-            y += 1 if y < target_y else -1
-            self.route.append((x, y))
+    def transfer_budget(self, pos, battery=None):
+        """
+        在 pos 处最多还能输出给车辆的电量（已扣除效率损耗和保留电量）。
+        :param battery: 假设的自身电量，默认为当前电量
+        """
+        if battery is None:
+            battery = self.battery_level
+        return max(0.0, (battery - self.reserve_energy(pos)) * self.charge_efficiency)
+
+    def can_serve(self, vehicle):
+        """前往 vehicle 之后，能否至少输出 min_transfer（或车辆全部需求，取较小者）的电量"""
+        demand = vehicle.target_battery_level - vehicle.current_battery
+        arrive = self.battery_level - self.move_cost * self.travel_distance(self.position, vehicle.position)
+        return self.transfer_budget(vehicle.position, arrive) >= min(self.min_transfer, demand)
+
+    def needs_recharge(self, work_pending=True):
+        """
+        空闲时的补电决策：
+        - 电量已不足以完成一次最小输出任务 => 必须补电
+        - 没有待服务车辆且电量低于 recharge_level => 趁空闲提前补电
+        :param work_pending: 是否还有等待充电的车辆
+        """
+        if self.battery_level >= self.max_battery or not self.station_position_list:
+            return False
+        if self.transfer_budget(self.position) < self.min_transfer:
+            return True
+        return not work_pending and self.battery_level < self.recharge_level
+
+    def go_recharge(self):
+        """前往充电站补电（由 Simulation 按距离和排队情况选站），返回是否出发"""
+        if self.simulation is not None:
+            station = self.simulation.choose_station(self)
+        else:
+            station = self.nearest_station(self.position)
+        if station is None:
+            return False
+        self.bind_target_station(station)
+        return True
+
+    def maybe_recharge(self):
+        """空闲时调用：需要补电则前往充电站，返回是否出发"""
+        if self.status != "idle":
+            return False
+        pending = self.simulation is None or bool(self.simulation.charging_queue)
+        if self.needs_recharge(pending):
+            return self.go_recharge()
+        return False
+
+    def compute_route_to_target(self, target_pos):
+        """
+        计算机器人移动到目标位置的路径，不受道路限制但会绕开建筑。
+        有寻路服务时使用 A* 避障路径（压缩路点），否则退回先横后纵的直线路径。
+        """
+        if self.planner is not None:
+            self.route = self.planner.plan(self.position, target_pos)
+        else:
+            self.route = ManhattanRoute(self.position, target_pos)
 
         if self.route:
             self.status = "moving"
+            self._start_segment()
 
     def move_along_route(self):
         """机器人沿路径移动一步"""
         if self.route and self.status == "moving":
-            self.position = self.route.pop(0)
-            if not self.route and self.target_vehicle:
+            self.position = self.route.advance()
+            self._segment_ticks += 1
+            self._move_segment()
+            if self.route:
+                return  # 路线未走完，保持移动状态
+            if self.target_vehicle:
                 self.status = "charging_vehicle"
-            elif not self.route and self.target_station:
-                self.status = "being_charged"
+                self._start_segment()
+                self._emit(EVENT_CHARGE_START, self.target_vehicle)
+            elif self.target_station:
+                self._arrive_station()
             else:
                 self.status = "idle"
         else:
             self.status = "idle"
 
 
+    def ticks_until_transition(self):
+        """
+        离散事件模式使用：返回当前状态还需多少个时间单位才会结束（状态发生切换）。
+        空闲时返回 None（空闲机器人不需要调度事件）。
+        """
+        if self.status == "moving":
+            return max(len(self.route), 1)
+        if self.status == "charging_vehicle" and self.target_vehicle:
+            # 按车辆充电曲线的闭式解（从段开始时起算）：充满目标电量，或输出额度用完（取先到者）。
+            # 额度是否用完由 update() 逐步判断，与闭式解可能差一步，因此提前一步交给 update()
+            vehicle = self.target_vehicle
+            curve = vehicle.charging_curve
+            start = self._segment_vehicle
+            full = curve.ticks_to_reach(start, vehicle.target_battery_level)
+            limited = curve.ticks_to_reach(start, start + self.transfer_budget(self.position, self._segment_battery)) - 1
+            ticks = min(full, limited) - self._segment_ticks
+            return 1 if ticks == math.inf else max(int(ticks), 1)
+        if self.status == "being_charged":
+            # 段开始后第 n 步补满：b0 + rate × n >= max_battery 的最小 n（与 being_charged 的计算方式一致）
+            start, rate = self._segment_battery, self.get_recharge_rate()
+            n = max(math.ceil((self.max_battery - start) / rate), self._segment_ticks + 1)
+            while n > self._segment_ticks + 1 and start + rate * (n - 1) >= self.max_battery:
+                n -= 1
+            while start + rate * n < self.max_battery:
+                n += 1
+            return n - self._segment_ticks
+        return None
+
+    def advance(self, ticks):
+        """
+        离散事件模式使用：一次性推进 ticks 个时间单位，等价于连续调用 ticks 次 update()。
+        状态切换前的各时间单位按闭式解一次跳过（移动跳动路线游标、充电按充电曲线计算），
+        只有发生状态切换的那一步调用 update()，每段移动/充电过程为 O(1)。
+        空闲和排队状态不随时间变化（补电决策由 Simulation 在事件时刻触发），直接返回。
+        """
+        while ticks > 0 and self.status not in ("idle", "waiting_station"):
+            remaining = self.ticks_until_transition()
+            skip = min(ticks, remaining - 1) if remaining is not None else 0
+            if skip > 0:
+                self._skip(skip)
+                ticks -= skip
+            else:
+                self.update()
+                ticks -= 1
+
+    def _skip(self, ticks):
+        # 跳过 ticks 个不会发生状态切换的时间单位
+        self._segment_ticks += ticks
+        if self.status == "moving":
+            self.route.seek(self.route.cursor + ticks)
+            self.position = self.route.last_visited()
+            self._move_segment()
+        elif self.status == "charging_vehicle":
+            self._charge_segment()
+        elif self.status == "being_charged":
+            self._recharge_segment()
+
     def update(self):
         """根据机器人当前状态执行对应的更新操作，每次刷新调用一次"""
-        #机器人一共有四种状态：移动中、给车辆充电、空闲、自身充电
+        #机器人一共有五种状态：移动中、给车辆充电、空闲、自身充电、在充电站排队
 
         if self.status == "moving": #机器人处于移动状态，前往车辆位置或充电站
             self.move_along_route()
@@ -117,7 +367,7 @@ class ChargingRobot:
         elif self.status == "being_charged": #机器人进入充电站充电
             self.being_charged()
         elif self.status == "idle":
-            # 空闲时可以检查电量是否需要返回充电站，或等待新任务
-            # 这边加入决策算法，根据自身电路、车辆充电需求等因素决定下一步动作
-            pass
+            # 空闲时检查电量：不够完成最小任务，或无事可做且电量偏低时，前往充电站补电
+            self.maybe_recharge()
+        # waiting_station：在充电站排队，由 Simulation 在有空位时切换为 being_charged
 
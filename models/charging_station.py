@@ -4,6 +4,139 @@
 创作人：顾昊瑜
 日期：2025年3月
 功能描述：
-
+    该模块定义了充电站 (`ChargingStation`)，供充电机器人补电使用，是一个容量有限的资源。
+    - slots：可同时补电的机器人数量；charge_rate：每单位时间为机器人补充的电量
+    - 车位已满时机器人进入等待队列，支持两种排队规则：
+      "fifo"（先到先补）和 "priority"（自身电量低者优先）
+    - 统计每站的到达数、完成数（吞吐量）、等待时间、队列峰值和车位利用率，
+      用于按峰值负载评估充电站车位数量
 -------------------------------------------------
-"""
\ No newline at end of file
+"""
+import heapq
+import itertools
+
+QUEUE_POLICIES = ("fifo", "priority")
+
+
+class ChargingStation:
+    def __init__(self, station_id, position, slots=1, charge_rate=5, queue_policy="fifo", start_time=0):
+        """
+        :param station_id: 充电站编号
+        :param position: 充电站坐标 (x, y)
+        :param slots: 可同时补电的机器人数量
+        :param charge_rate: 每单位时间为机器人补充的电量
+        :param queue_policy: 排队规则，"fifo" 或 "priority"
+        :param start_time: 统计起始时刻
+        """
+        if queue_policy not in QUEUE_POLICIES:
+            raise ValueError(f"unknown queue policy: {queue_policy}")
+        self.id = station_id
+        self.position = position
+        self.slots = slots
+        self.charge_rate = charge_rate
+        self.queue_policy = queue_policy
+
+        self.users = set()                # 正在补电的机器人
+        self.inbound = 0                  # 已选定本站、正在途中的机器人数
+        self._queue = []                  # (排序键, 序号, 机器人, 到达时刻)
+        self._queued = set()
+        self._counter = itertools.count()
+
+        # 统计量
+        self.arrivals = 0
+        self.completed = 0
+        self.total_wait = 0
+        self.max_wait = 0
+        self.queue_peak = 0
+        self._busy_time = 0               # 各车位被占用时间之和
+        self._start_time = start_time
+        self._last_time = start_time
+
+    def __repr__(self):
+        return f"ChargingStation(id={self.id}, position={self.position}, slots={self.slots})"
+
+    @property
+    def queue_length(self):
+        return len(self._queued)
+
+    @property
+    def has_free_slot(self):
+        return len(self.users) < self.slots
+
+    def load(self):
+        """占用车位和排队的机器人总数"""
+        return len(self.users) + len(self._queued)
+
+    def _account(self, now):
+        # 把上次记录以来的占用时间累加到利用率统计中
+        if now > self._last_time:
+            self._busy_time += len(self.users) * (now - self._last_time)
+            self._last_time = now
+
+    # ====== 车位占用 ======
+    def request(self, robot, now):
+        """
+        机器人到达充电站请求补电。
+        :return: True 表示立即获得车位；False 表示进入等待队列
+        """
+        self._account(now)
+        self.arrivals += 1
+        if self.has_free_slot:
+            self.users.add(robot)
+            return True
+        key = robot.battery_level if self.queue_policy == "priority" else 0
+        heapq.heappush(self._queue, (key, next(self._counter), robot, now))
+        self._queued.add(robot)
+        self.queue_peak = max(self.queue_peak, len(self._queued))
+        return False
+
+    def cancel(self, robot):
+        """机器人放弃排队（队列中的条目在出队时跳过）"""
+        self._queued.discard(robot)
+
+    def release(self, robot, now):
+        """
+        机器人补电完成离开，按排队规则让等待的机器人依次占用空出的车位。
+        :return: 新获得车位的机器人列表
+        """
+        self._account(now)
+        if robot in self.users:
+            self.users.discard(robot)
+            self.completed += 1
+        started = []
+        while self._queue and self.has_free_slot:
+            _, _, waiting, arrived = heapq.heappop(self._queue)
+            if waiting not in self._queued:
+                continue
+            self._queued.discard(waiting)
+            wait = now - arrived
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.users.add(waiting)
+            started.append(waiting)
+        return started
+
+    # ====== 统计 ======
+    def stats(self, now):
+        """
+        返回该站的统计指标：
+        - wait_mean / wait_max：排队机器人的平均/最长等待时间（立即获得车位的计为 0）
+        - utilisation：车位占用时间 / (车位数 × 统计时长)
+        - throughput：单位时间完成的补电次数
+        """
+        self._account(now)
+        duration = max(now - self._start_time, 1)
+        started = self.arrivals - len(self._queued)
+        return {
+            "id": self.id,
+            "position": list(self.position),
+            "slots": self.slots,
+            "arrivals": self.arrivals,
+            "completed": self.completed,
+            "queue_length": len(self._queued),
+            "queue_peak": self.queue_peak,
+            "wait_mean": self.total_wait / started if started else 0.0,
+            "wait_max": self.max_wait,
+            "utilisation": self._busy_time / (self.slots * duration),
+            "throughput": self.completed / duration,
+        }
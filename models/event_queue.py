@@ -0,0 +1,56 @@
+"""
+-------------------------------------------------
+文件名：event_queue.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了事件队列 (`EventQueue`)，用于离散事件模式下的模拟调度。
+    事件按 (时间, 优先级, 次序, 序号) 存放在最小堆中：
+    - 时间小的先处理，同一时刻优先级数值小的先处理（如车辆刷新先于其它事件，与逐步模式一致）
+    - 次序决定同一时刻、同一优先级的事件的先后（如按车辆编号，与逐步模式中遍历实体的顺序一致）
+    - 序号保证其余相同的事件按加入顺序处理
+    模拟时间直接跳到下一个事件，空闲实体不再逐步更新。
+-------------------------------------------------
+"""
+import heapq
+import itertools
+
+
+class EventQueue:
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __bool__(self):
+        return bool(self._heap)
+
+    def push(self, time, kind, payload=None, priority=1, order=0):
+        """
+        加入一个事件。
+        :param time: 事件发生时刻
+        :param kind: 事件类型（字符串）
+        :param payload: 事件携带的对象（车辆、机器人、大门编号等）
+        :param priority: 同一时刻内的处理先后，数值越小越先处理
+        :param order: 同一时刻、同一优先级内的处理先后，数值越小越先处理
+        """
+        heapq.heappush(self._heap, (time, priority, order, next(self._counter), kind, payload))
+
+    def peek_time(self):
+        """返回最早事件的时刻，队列为空时返回 None"""
+        return self._heap[0][0] if self._heap else None
+
+    def pop(self):
+        """弹出最早的事件，返回 (time, kind, payload)"""
+        time, _, _, _, kind, payload = heapq.heappop(self._heap)
+        return time, kind, payload
+
+    def remove_kind(self, kind):
+        """删除某一类型的全部事件（O(n)，只在重新排定时使用）"""
+        self._heap = [event for event in self._heap if event[4] != kind]
+        heapq.heapify(self._heap)
+
+    def clear(self):
+        self._heap.clear()
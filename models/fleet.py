@@ -0,0 +1,419 @@
+"""
+-------------------------------------------------
+文件名：fleet.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了结构化数组（SoA）形式的车队引擎 (`VehicleFleet`)，作为 `Vehicle` 对象模式的可选替代。
+    - 位置、状态、路线游标、电量、计时等全部存放在 NumPy 数组中，每一行对应一辆车
+    - step() 对全部车辆做一次向量化推进，行为与 `Vehicle.update()` 逐辆更新一致
+    - 离场车辆按布尔掩码批量压缩，不再逐个 list.remove
+    - `FleetVehicleView` 是对某一行的轻量视图，为渲染器等提供与 `Vehicle` 相同的读取接口
+-------------------------------------------------
+"""
+
+import numpy as np
+
+from models.charging_curve import DEFAULT_CURVE
+from utils.logger import EVENT_EXIT
+
+# 状态编码（与 Vehicle.state 字符串一一对应）
+STATE_ENTERING = 0
+STATE_PARKED = 1
+STATE_EXITING = 2
+STATE_EXITED = 3
+STATE_NAMES = ("entering", "parked", "exiting", "exited")
+
+# 充电状态编码（与 Vehicle.charging_status 对应）
+CHARGE_NAMES = ("waiting", "charging", "charged")
+CHARGE_CODES = {name: i for i, name in enumerate(CHARGE_NAMES)}
+
+LANE_IDS = ("inner", "outer")  # 车道编号 0 = 内道（顺时针），1 = 外道（逆时针）
+
+
+class VehicleFleet:
+    # 每行数据的列名及类型，扩容和压缩时统一处理
+    _COLUMNS = {
+        "ids": np.int64,
+        "x": np.int32,
+        "y": np.int32,
+        "state": np.int8,
+        "lane": np.int8,
+        "route_start": np.int32,
+        "route_len": np.int32,
+        "cursor": np.int32,
+        "horizontal": np.bool_,
+        "initial_battery": np.float64,
+        "battery": np.float64,
+        "target_battery": np.float64,
+        "charge_state": np.int8,
+        "curve": np.int16,
+        "spawn_time": np.int64,
+        "parked_time": np.int64,
+        "parking_duration": np.int64,
+        "spot": np.int32,
+        "gate": np.int32,
+    }
+
+    def __init__(self, simulation, capacity=1024):
+        """
+        :param simulation: Simulation 实例（需已构建车道索引和车位索引）
+        :param capacity: 初始行容量，不足时自动翻倍
+        """
+        self.sim = simulation
+        self.size = 0
+        self.capacity = max(int(capacity), 1)
+        self.next_id = 0
+        for name, dtype in self._COLUMNS.items():
+            setattr(self, name, np.zeros(self.capacity, dtype=dtype))
+
+        # 两条车道拼接成一个坐标数组：车道 k 的第 i 个点位于 loop_offset[k] + i
+        loops = [simulation.get_lane_loop(lane_id) for lane_id in LANE_IDS]
+        self.loop_len = np.array([len(loop) for loop in loops], dtype=np.int64)
+        self.loop_offset = np.concatenate([[0], np.cumsum(self.loop_len)[:-1]]).astype(np.int64)
+        self.loop_xy = np.array([p for loop in loops for p in loop], dtype=np.int32).reshape(-1, 2)
+        # 拼接数组下标 -> 所在车道内的下标，与 snap_to_lane 一致
+        self.loop_canon = np.array(
+            [simulation.lane_cell_index[lane_id][p] for lane_id, loop in zip(LANE_IDS, loops) for p in loop],
+            dtype=np.int64)
+
+        # 拥堵模型：车道上每个点对应的道路图节点
+        self.road_graph = simulation.road_graph
+        if self.road_graph is not None:
+            self.loop_node = self.road_graph.nodes(self.loop_xy[:, 0], self.loop_xy[:, 1])
+
+        # 充电曲线表：curve 列存放下标，第 0 条为默认曲线
+        self.curves = [DEFAULT_CURVE]
+        self._spot_index = {spot: i for i, spot in enumerate(simulation.parking_spots)}
+        self._gate_index = {gate: i for i, gate in enumerate(simulation.gates)}
+        # 每个大门在两条车道上的离场贴靠点下标
+        self.gate_exit = np.zeros((len(LANE_IDS), max(len(simulation.gates), 1)), dtype=np.int64)
+        for g, gate in enumerate(simulation.gates):
+            exit_point = simulation.get_spawn_position_for_gate(gate)
+            for k, lane_id in enumerate(LANE_IDS):
+                self.gate_exit[k, g] = simulation.snap_to_lane(exit_point, lane_id)
+        # 每个车位的停车贴靠点下标（批量刷新时按数组查表）
+        self.spot_target = np.zeros((len(LANE_IDS), max(len(simulation.parking_spots), 1)), dtype=np.int64)
+        for i, spot in enumerate(simulation.parking_spots):
+            target = simulation.get_parking_adjacent_position(spot)
+            for k, lane_id in enumerate(LANE_IDS):
+                self.spot_target[k, i] = simulation.snap_to_lane(target, lane_id)
+
+    # ====== 容器接口 ======
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        ids = self.ids[:self.size].tolist()
+        for vid in ids:
+            yield FleetVehicleView(self, vid)
+
+    def _curve_index(self, curve):
+        if curve is None:
+            return 0
+        for i, known in enumerate(self.curves):
+            if known is curve:
+                return i
+        self.curves.append(curve)
+        return len(self.curves) - 1
+
+    def row_of(self, vid):
+        """根据车辆编号查找所在行（ids 始终递增，二分查找），已离场返回 -1"""
+        row = int(np.searchsorted(self.ids[:self.size], vid))
+        if row < self.size and self.ids[row] == vid:
+            return row
+        return -1
+
+    def count_states(self):
+        """返回 {状态名: 数量}"""
+        counts = np.bincount(self.state[:self.size], minlength=len(STATE_NAMES))
+        return {name: int(c) for name, c in zip(STATE_NAMES, counts)}
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    # ====== 新增车辆 ======
+    def add_many(self, gate, spots, parking_duration, spawn_time, initial_battery, target_battery,
+                 clockwise, charging_curves=None):
+        """
+        批量新增车辆，整批以数组写入（刷新点与大门离场点相同，贴靠下标均为查表）。
+        :param gate: 大门下标数组
+        :param spots: 已预订的车位列表
+        :param parking_duration / initial_battery / target_battery / clockwise: 等长数组
+        :param charging_curves: 每辆车的充电曲线列表，None 表示默认曲线
+        :return: 新车辆编号数组
+        """
+        n = len(spots)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self.size + n > self.capacity:
+            self._grow(self.size + n)
+        rows = slice(self.size, self.size + n)
+        self.size += n
+
+        gate = np.asarray(gate, dtype=np.int64)
+        lane = np.where(np.asarray(clockwise, dtype=bool), 0, 1)
+        spot_idx = np.array([self._spot_index[s] for s in spots], dtype=np.int64)
+        start = self.gate_exit[lane, gate]
+        end = self.spot_target[lane, spot_idx]
+        loop_len = self.loop_len[lane]
+
+        vids = np.arange(self.next_id, self.next_id + n, dtype=np.int64)
+        self.next_id += n
+        self.ids[rows] = vids
+        xy = self.loop_xy[self.loop_offset[lane] + start]
+        self.x[rows], self.y[rows] = xy[:, 0], xy[:, 1]
+        self.state[rows] = STATE_ENTERING
+        self.lane[rows] = lane
+        self.route_start[rows] = start
+        self.route_len[rows] = (end - start) % loop_len + 1
+        self.cursor[rows] = 0
+        self.horizontal[rows] = True
+        self.initial_battery[rows] = initial_battery
+        self.battery[rows] = initial_battery
+        self.target_battery[rows] = target_battery
+        self.charge_state[rows] = 0
+        if charging_curves is None:
+            self.curve[rows] = 0
+        else:
+            self.curve[rows] = [self._curve_index(c) for c in charging_curves]
+        self.spawn_time[rows] = spawn_time
+        self.parked_time[rows] = -1
+        self.parking_duration[rows] = parking_duration
+        self.spot[rows] = spot_idx
+        self.gate[rows] = gate
+        return vids
+
+    # ====== 向量化推进 ======
+    def _cells(self, rows, step):
+        """返回 rows 对应车辆路线第 step 步（0 起）的扁平车道下标"""
+        lane = self.lane[rows]
+        return self.loop_offset[lane] + (self.route_start[rows] + step) % self.loop_len[lane]
+
+    def step(self, now, dirty_cells=None):
+        """
+        全部车辆推进一步，对应每辆车调用一次 Vehicle.update()。
+        :param now: 当前全局时间
+        :param dirty_cells: 若给出集合，则把位置或状态变化的车辆新旧格子加入其中
+        :return: 本步离场（被移除）的车辆数
+        """
+        n = self.size
+        if n == 0:
+            return 0
+        state = self.state[:n]
+        cursor = self.cursor[:n]
+        route_len = self.route_len[:n]
+
+        if dirty_cells is not None:
+            old_x, old_y, old_state = self.x[:n].copy(), self.y[:n].copy(), state.copy()
+
+        moving = (state == STATE_ENTERING) | (state == STATE_EXITING)
+        has_route = cursor < route_len
+        advance = np.nonzero(moving & has_route)[0]
+        arrive = np.nonzero(moving & ~has_route)[0]
+        leave = np.nonzero((state == STATE_PARKED)
+                           & (now - self.parked_time[:n] >= self.parking_duration[:n]))[0]
+
+        # 1) 沿路线前进一格（拥堵模型下前方格子已满的车辆原地等待，按行顺序即刷新先后放行）
+        if advance.size and self.road_graph is not None:
+            # 游标为 0 的车辆尚未上路（在大门处或车位中），不占用道路格子
+            prev = self.loop_node[self._cells(advance, np.maximum(cursor[advance] - 1, 0))]
+            old_node = np.where(cursor[advance] > 0, prev, -1)
+            new_node = self.loop_node[self._cells(advance, cursor[advance])]
+            advance = advance[self.road_graph.admit(old_node, new_node)]
+        if advance.size:
+            cell = self._cells(advance, cursor[advance])
+            self.x[advance] = self.loop_xy[cell, 0]
+            self.y[advance] = self.loop_xy[cell, 1]
+            cursor[advance] += 1
+            # 朝向：仍有下一格时由下一格决定
+            more = advance[cursor[advance] < route_len[advance]]
+            if more.size:
+                nxt = self._cells(more, cursor[more])
+                self.horizontal[more] = self.loop_xy[nxt, 0] != self.x[more]
+
+        # 2) 路线走完：进场 -> 停车，离场 -> 离开
+        if arrive.size:
+            parked = arrive[state[arrive] == STATE_ENTERING]
+            exited = arrive[state[arrive] == STATE_EXITING]
+            state[parked] = STATE_PARKED
+            self.parked_time[parked] = now
+            state[exited] = STATE_EXITED
+            self.sim.exit_time_total += int((now - self.parked_time[exited] - self.parking_duration[exited]).sum())
+            if self.sim.telemetry is not None:
+                self.sim.telemetry.emit_many(now, EVENT_EXIT, self.ids[exited], self.x[exited], self.y[exited],
+                                             self.battery[exited])
+            if self.road_graph is not None:
+                self.road_graph.leave_many(self.road_graph.nodes(self.x[arrive], self.y[arrive]))
+            spots = self.sim.parking_spots
+            for i in self.spot[parked].tolist():
+                if i >= 0:
+                    self.sim.occupy_spot(spots[i])
+            for vid in self.ids[parked].tolist():
+                self.sim.on_vehicle_parked(FleetVehicleView(self, vid))
+            for i in self.spot[exited].tolist():
+                if i >= 0:
+                    self.sim.release_spot(spots[i])
+
+        # 3) 停够时长 -> 离场，路线从当前位置到大门贴靠点
+        if leave.size:
+            for vid in self.ids[leave].tolist():
+                self.sim.on_vehicle_departed(FleetVehicleView(self, vid))
+            lane = self.lane[leave]
+            current = np.where(cursor[leave] > 0, self._cells(leave, cursor[leave] - 1),
+                               self._cells(leave, 0))
+            current = self.loop_canon[current]
+            exit_index = self.gate_exit[lane, self.gate[leave]]
+            self.route_start[leave] = current
+            self.route_len[leave] = (exit_index - current) % self.loop_len[lane] + 1
+            cursor[leave] = 0
+            state[leave] = STATE_EXITING
+            first = self._cells(leave, 0)
+            self.horizontal[leave] = self.loop_xy[first, 0] != self.x[leave]
+
+        if dirty_cells is not None:
+            changed = np.nonzero((self.x[:n] != old_x) | (self.y[:n] != old_y) | (state != old_state))[0]
+            dirty_cells.update(zip(old_x[changed].tolist(), old_y[changed].tolist()))
+            dirty_cells.update(zip(self.x[changed].tolist(), self.y[changed].tolist()))
+            spots = self.sim.parking_spots
+            for i in self.spot[changed[state[changed] != old_state[changed]]].tolist():
+                if i >= 0:
+                    self.sim.dirty_spots.add(spots[i])
+
+        # 4) 批量压缩已离场的行
+        exited_count = int(np.count_nonzero(state == STATE_EXITED))
+        if exited_count:
+            keep = np.nonzero(state != STATE_EXITED)[0]
+            for name in self._COLUMNS:
+                arr = getattr(self, name)
+                arr[:keep.size] = arr[keep]
+            self.size = keep.size
+        return exited_count
+
+
+class FleetVehicleView:
+    """
+    车队中某辆车的只读视图，提供与 Vehicle 相同的常用属性和方法。
+    视图按车辆编号定位所在行，车队压缩后依然有效；车辆离场后 state 为 "exited"。
+    """
+    __slots__ = ("fleet", "vid")
+
+    def __init__(self, fleet, vid):
+        self.fleet = fleet
+        self.vid = vid
+
+    def _row(self):
+        return self.fleet.row_of(self.vid)
+
+    @property
+    def state(self):
+        row = self._row()
+        return "exited" if row < 0 else STATE_NAMES[self.fleet.state[row]]
+
+    @property
+    def position(self):
+        row = self._row()
+        return (int(self.fleet.x[row]), int(self.fleet.y[row]))
+
+    @property
+    def clockwise(self):
+        return self.fleet.lane[self._row()] == 0
+
+    @property
+    def bound_spot(self):
+        i = int(self.fleet.spot[self._row()])
+        return self.fleet.sim.parking_spots[i] if i >= 0 else None
+
+    @property
+    def origin_gate(self):
+        return self.fleet.sim.gates[int(self.fleet.gate[self._row()])]
+
+    @property
+    def parked_time(self):
+        t = int(self.fleet.parked_time[self._row()])
+        return None if t < 0 else t
+
+    @property
+    def parking_duration(self):
+        return int(self.fleet.parking_duration[self._row()])
+
+    @property
+    def spawn_time(self):
+        return int(self.fleet.spawn_time[self._row()])
+
+    @property
+    def current_battery(self):
+        return float(self.fleet.battery[self._row()])
+
+    @current_battery.setter
+    def current_battery(self, value):
+        self.fleet.battery[self._row()] = value
+
+    @property
+    def target_battery_level(self):
+        return float(self.fleet.target_battery[self._row()])
+
+    @property
+    def charging_status(self):
+        return CHARGE_NAMES[self.fleet.charge_state[self._row()]]
+
+    @charging_status.setter
+    def charging_status(self, value):
+        self.fleet.charge_state[self._row()] = CHARGE_CODES[value]
+
+    def __eq__(self, other):
+        return isinstance(other, FleetVehicleView) and other.fleet is self.fleet and other.vid == self.vid
+
+    def __hash__(self):
+        return hash((id(self.fleet), self.vid))
+
+    # 与 Vehicle 相同的读取接口
+    def get_current_position(self):
+        return self.position
+
+    def get_current_orientation(self):
+        return "horizontal" if self.fleet.horizontal[self._row()] else "vertical"
+
+    def get_render_offset(self):
+        x0, y0, x1, y1 = self.fleet.sim.ring
+        rw = self.fleet.sim.road_width
+        x, y = self.position
+        if y0 <= y < y0+rw or (y1 - rw) <= y < y1:
+            return (0, -5)
+        elif x0 <= x < x0+rw or (x1 - rw) <= x < x1:
+            return (-5, 0)
+        return (0, 0)
+
+    def get_current_battery(self):
+        return self.current_battery
+
+    def get_target_battery_level(self):
+        return self.target_battery_level
+
+    @property
+    def charging_curve(self):
+        return self.fleet.curves[self.fleet.curve[self._row()]]
+
+    # 充电规则与 Vehicle 相同
+    def charging(self, ticks=1, start=None):
+        row = self._row()
+        fleet = self.fleet
+        curve = fleet.curves[fleet.curve[row]]
+        battery = float(fleet.battery[row]) if start is None else start
+        battery = min(curve.advance(battery, ticks), fleet.target_battery[row])
+        fleet.battery[row] = battery
+        fleet.charge_state[row] = CHARGE_CODES["charged" if battery >= fleet.target_battery[row] else "charging"]
+
+    def get_charging_speed(self):
+        return self.charging_curve.rate(self.current_battery)
+
+    def get_debug_info(self):
+        return f"State={self.state}, pos={self.position}, vid={self.vid}"
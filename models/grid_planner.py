@@ -0,0 +1,161 @@
+"""
+-------------------------------------------------
+文件名：grid_planner.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了充电机器人的网格避障寻路服务 (`GridPlanner`)。
+    - 机器人可以在除建筑 ('B') 以外的任意格子上自由移动（四连通）
+    - 使用 A* 搜索（曼哈顿距离启发），f 相同时优先扩展离终点更近的格子，同等代价下优先保持原方向，减少转弯
+    - 结果压缩为转弯处的路点序列，以 `WaypointRoute` 返回，不生成逐格列表
+    - 按 (起点, 终点) 做 LRU 缓存，机器人在充电站和车位之间往返时直接复用
+    - 地图版本号变化时自动清空缓存
+-------------------------------------------------
+"""
+import heapq
+from collections import OrderedDict
+from time import perf_counter_ns
+
+from models.route import ManhattanRoute, WaypointRoute
+from utils.profiler import PHASE_PLANNING
+
+
+class GridPlanner:
+    def __init__(self, simulation, max_cached_paths=1024):
+        """
+        :param simulation: Simulation 实例，需提供 get_passable_mask() 和 map_version
+        :param max_cached_paths: 最多缓存多少条 (起点, 终点) 路径
+        """
+        self.sim = simulation
+        self.max_cached_paths = max_cached_paths
+        self._cached = OrderedDict()   # (起点, 终点) -> 路点元组，不可达时为 None
+        self._passable = None          # 扁平化的可通行表 (bytes)
+        self._cols = 0
+        self._rows = 0
+        self._map_version = None
+
+    # ====== 缓存管理 ======
+    def invalidate(self):
+        """清空缓存，下次查询时按当前地图重建"""
+        self._cached.clear()
+        self._passable = None
+        self._map_version = None
+
+    def _sync(self):
+        if self._map_version != self.sim.map_version:
+            self.invalidate()
+            mask = self.sim.get_passable_mask()
+            self._rows, self._cols = mask.shape
+            self._passable = mask.tobytes()
+            self._map_version = self.sim.map_version
+
+    # ====== A* ======
+    def _search(self, start, goal):
+        """
+        四连通 A*，起点和终点本身总视为可通行。
+        :return: 压缩后的路点元组（不含起点，含终点），不可达时返回 None
+        """
+        cols, rows = self._cols, self._rows
+        passable = self._passable
+        sx, sy = start
+        gx, gy = goal
+        s = sy * cols + sx
+        g = gy * cols + gx
+
+        # 堆元素：(f, h, 转弯次数, 序号, 格子)；f 相同时先扩展离终点更近（g 更大）的格子，
+        # 开阔区域内沿一条最短路径直奔终点，而不是把整片 f 相同的格子都扩展一遍
+        dist = {s: 0}
+        turns = {s: 0}
+        parent = {s: -1}
+        heading = {s: -1}
+        counter = 0
+        h0 = abs(gx - sx) + abs(gy - sy)
+        heap = [(h0, h0, 0, counter, s)]
+        steps = ((0, 1), (0, -1), (1, 0), (-1, 0))
+        while heap:
+            f, h, t, _, cur = heapq.heappop(heap)
+            cost = dist[cur]
+            if t != turns[cur] or f != cost + h:
+                continue  # 过期条目
+            if cur == g:
+                break
+            cx, cy = cur % cols, cur // cols
+            d_in = heading[cur]
+            for d, (dx, dy) in enumerate(steps):
+                nx, ny = cx + dx, cy + dy
+                if not (0 <= nx < cols and 0 <= ny < rows):
+                    continue
+                nxt = ny * cols + nx
+                if nxt != g and not passable[nxt]:
+                    continue
+                ncost = cost + 1
+                nturns = t + (d_in != -1 and d != d_in)
+                old = dist.get(nxt)
+                # 同等代价时保留转弯更少的前驱，路径更直、路点更少
+                if old is not None and (old < ncost or (old == ncost and turns[nxt] <= nturns)):
+                    continue
+                dist[nxt] = ncost
+                turns[nxt] = nturns
+                parent[nxt] = cur
+                heading[nxt] = d
+                counter += 1
+                nh = abs(gx - nx) + abs(gy - ny)
+                heapq.heappush(heap, (ncost + nh, nh, nturns, counter, nxt))
+        if g not in parent:
+            return None
+
+        # 回溯并只保留转弯处和终点
+        waypoints = [goal]
+        cur = g
+        while parent[cur] != -1:
+            prev = parent[cur]
+            if parent[prev] != -1 and heading[prev] != heading[cur]:
+                waypoints.append((prev % cols, prev // cols))
+            cur = prev
+        waypoints.reverse()
+        return tuple(waypoints)
+
+    # ====== 查询 ======
+    def waypoints(self, start, goal):
+        """
+        返回从 start 到 goal 的避障路点元组（不含 start，含 goal），不可达时返回 None。
+        """
+        self._sync()
+        start = (int(start[0]), int(start[1]))
+        goal = (int(goal[0]), int(goal[1]))
+        if start == goal:
+            return ()
+        key = (start, goal)
+        if key in self._cached:
+            self._cached.move_to_end(key)
+            return self._cached[key]
+        prof = self.sim.profiler
+        t0 = perf_counter_ns() if prof is not None else 0
+        result = self._search(start, goal)
+        if prof is not None:
+            prof.record(PHASE_PLANNING, perf_counter_ns() - t0)
+        self._cached[key] = result
+        if len(self._cached) > self.max_cached_paths:
+            self._cached.popitem(last=False)
+        return result
+
+    def plan(self, start, goal):
+        """
+        返回从 start 到 goal 的机器人路线。不可达（如被建筑完全包围）时退回先横后纵的直线路线。
+        """
+        waypoints = self.waypoints(start, goal)
+        if waypoints is None:
+            return ManhattanRoute(start, goal)
+        return WaypointRoute(start, waypoints)
+
+    def distance(self, start, goal):
+        """避障路径的步数，不可达返回 None"""
+        waypoints = self.waypoints(start, goal)
+        if waypoints is None:
+            return None
+        total = 0
+        prev = start
+        for point in waypoints:
+            total += abs(point[0] - prev[0]) + abs(point[1] - prev[1])
+            prev = point
+        return total
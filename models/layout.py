@@ -0,0 +1,277 @@
+"""
+-------------------------------------------------
+文件名：layout.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块负责从布局文件加载真实园区，替代随机生成布局。布局由两部分组成：
+    - 栅格：ASCII 文本（每行一排格子，字符 S/R/B/C/G 与 config.py 的编码对应，'.' 也表示空闲区）
+      或 PNG 图片（每像素一格，颜色按调色板映射为格子编码），整张栅格一次查表完成解析
+    - JSON 描述文件：栅格路径以及大门、车位、充电桩、环路边界等，例如
+      {
+        "raster": "lot.txt",
+        "gates": [[0, 20, 4, 26]],
+        "parking_spots": [[0, 10, 4, 12], {"row": [10, 0, 60, 4], "size": [2, 4]}],
+        "charging_stations": [[30, 30]],
+        "ring": [4, 4, 96, 96],
+        "palette": {"#808080": "R"}
+      }
+      车位可以逐个给出 [x1, y1, x2, y2]，也可以给出一整排 {"row": 区域, "size": [宽, 高]} 按尺寸切分；
+      大门和充电桩未给出时取栅格中的 'G' 连通区域和 'C' 格子；环路未给出时取道路格子的外接矩形；
+      车位未给出时布局中的 parking_spots 为 None，由 Simulation 按默认规则沿地图边缘生成（给出空列表则没有车位）。
+      车道循环、车位贴靠点和大门生成点都由 Simulation 根据环路边界自动推导。
+    解析结果编译为二进制缓存（与描述文件同名的 .npz），源文件内容不变时直接加载缓存，
+    大型园区（如 2000×2000）可快速启动。
+-------------------------------------------------
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from config import CELL_FREE, CELL_ROAD, CELL_BUILDING, CELL_STATION, CELL_GATE, CELL_CHARS
+
+CACHE_VERSION = 2  # 版本 2：描述文件未给出车位时缓存中不含 parking_spots
+
+# ASCII 栅格：字符 -> 格子编码
+ASCII_CODES = {char: code for code, char in enumerate(CELL_CHARS.tolist())}
+ASCII_CODES["."] = CELL_FREE
+
+# PNG 栅格的默认调色板（与 render.py 的显示颜色一致）
+DEFAULT_PALETTE = {
+    (255, 255, 255): CELL_FREE,
+    (128, 128, 128): CELL_ROAD,
+    (0, 0, 0): CELL_BUILDING,
+    (0, 0, 255): CELL_STATION,
+    (255, 165, 0): CELL_GATE,
+}
+
+
+# ====== 栅格解析 ======
+def parse_ascii(data):
+    """
+    把 ASCII 栅格（bytes）一次性解析为 (高, 宽) 的 uint8 编码地图。
+    各行长度必须相同，行尾的 '\\r' 和文件末尾的空行会被忽略。
+    """
+    lines = data.replace(b"\r", b"").rstrip(b"\n").split(b"\n")
+    width = len(lines[0])
+    if any(len(line) != width for line in lines):
+        raise ValueError("all raster rows must have the same length")
+    raw = np.frombuffer(b"".join(lines), dtype=np.uint8).reshape(len(lines), width)
+    table = np.full(256, 255, dtype=np.uint8)
+    for char, code in ASCII_CODES.items():
+        table[ord(char)] = code
+    cells = table[raw]
+    bad = np.argwhere(cells == 255)
+    if len(bad):
+        y, x = bad[0].tolist()
+        raise ValueError(f"unknown raster character {chr(raw[y, x])!r} at ({x}, {y})")
+    return cells
+
+
+def _parse_color(color):
+    # "#RRGGBB" 或 [r, g, b] -> (r, g, b)
+    if isinstance(color, str):
+        color = color.lstrip("#")
+        return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+    return tuple(int(c) for c in color)
+
+
+def parse_png(path, palette=None):
+    """
+    把 PNG 栅格解析为 (高, 宽) 的 uint8 编码地图，每个像素一格。
+    :param palette: {颜色: 格子字符或编码}，在默认调色板基础上覆盖
+    """
+    try:
+        from PyQt5.QtGui import QImage
+    except ImportError as exc:
+        raise ImportError("PNG layouts require PyQt5 (QImage) to decode the image") from exc
+    image = QImage(path)
+    if image.isNull():
+        raise ValueError(f"cannot read image {path}")
+    image = image.convertToFormat(QImage.Format_RGB32)
+    w, h = image.width(), image.height()
+    ptr = image.constBits()
+    ptr.setsize(image.bytesPerLine() * h)
+    # Format_RGB32 每像素 0xffRRGGBB，按行存储（行尾可能有填充）
+    pixels = np.frombuffer(ptr, dtype=np.uint32).reshape(h, image.bytesPerLine() // 4)[:, :w] & 0xFFFFFF
+
+    codes = dict(DEFAULT_PALETTE)
+    for color, cell in (palette or {}).items():
+        codes[_parse_color(color)] = ASCII_CODES[cell] if isinstance(cell, str) else int(cell)
+    colors, inverse = np.unique(pixels, return_inverse=True)
+    lookup = np.empty(len(colors), dtype=np.uint8)
+    for i, value in enumerate(colors.tolist()):
+        rgb = ((value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF)
+        if rgb not in codes:
+            raise ValueError(f"colour #{value:06X} is not in the layout palette")
+        lookup[i] = codes[rgb]
+    return lookup[inverse.reshape(h, w)]
+
+
+# ====== 布局元素 ======
+def _components(mask):
+    """
+    返回布尔掩码中各四连通区域的外接矩形 [(x1, y1, x2, y2), ...]（右/下边界不含）。
+    只遍历掩码为真的格子，适用于大门这类稀疏元素。
+    """
+    cells = set(zip(*(a.tolist() for a in np.nonzero(mask))))  # (y, x)
+    boxes = []
+    while cells:
+        stack = [cells.pop()]
+        ys, xs = [], []
+        while stack:
+            y, x = stack.pop()
+            ys.append(y)
+            xs.append(x)
+            for neighbour in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                if neighbour in cells:
+                    cells.remove(neighbour)
+                    stack.append(neighbour)
+        boxes.append((min(xs), min(ys), max(xs) + 1, max(ys) + 1))
+    boxes.sort(key=lambda b: (b[1], b[0]))
+    return boxes
+
+
+def _expand_spots(entries):
+    """
+    把描述文件中的车位条目展开为 (N, 5) 数组，每行 (x1, y1, x2, y2, 是否水平)。
+    整排车位按 size 切分，区域不能整除时多余部分丢弃；宽大于高的车位为水平车位。
+    """
+    boxes = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            x1, y1, x2, y2 = entry["row"]
+            sw, sh = entry["size"]
+            xs = np.arange(x1, x2 - sw + 1, sw)
+            ys = np.arange(y1, y2 - sh + 1, sh)
+            gx, gy = np.meshgrid(xs, ys)
+            gx, gy = gx.ravel(), gy.ravel()
+            boxes.append(np.stack([gx, gy, gx + sw, gy + sh], axis=1))
+        else:
+            boxes.append(np.array([entry[:4]]))
+    if not boxes:
+        return np.zeros((0, 5), dtype=np.int32)
+    boxes = np.concatenate(boxes).astype(np.int32)
+    horizontal = (boxes[:, 2] - boxes[:, 0]) > (boxes[:, 3] - boxes[:, 1])
+    return np.column_stack([boxes, horizontal]).astype(np.int32)
+
+
+def _road_ring(cells):
+    # 道路格子的外接矩形作为环路外边界
+    rows = np.nonzero((cells == CELL_ROAD).any(axis=1))[0]
+    cols = np.nonzero((cells == CELL_ROAD).any(axis=0))[0]
+    if not len(rows):
+        raise ValueError("layout has no road cells and no explicit ring")
+    return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+
+
+def compile_layout(spec, base_dir="."):
+    """
+    根据描述字典解析栅格并整理出完整布局（未使用缓存）。
+    :param spec: 布局描述（见模块说明）
+    :param base_dir: 描述中相对路径的基准目录
+    :return: Simulation(layout=...) 可直接使用的布局字典
+    """
+    raster = os.path.join(base_dir, spec["raster"])
+    if raster.lower().endswith(".png"):
+        cells = parse_png(raster, spec.get("palette"))
+    else:
+        with open(raster, "rb") as f:
+            cells = parse_ascii(f.read())
+    h, w = cells.shape
+
+    if "gates" in spec:
+        gates = [tuple(int(v) for v in g) for g in spec["gates"]]
+        for x1, y1, x2, y2 in gates:
+            cells[y1:y2, x1:x2] = CELL_GATE
+    else:
+        gates = _components(cells == CELL_GATE)
+
+    if "charging_stations" in spec:
+        stations = [tuple(int(v) for v in s) for s in spec["charging_stations"]]
+        for x, y in stations:
+            cells[y, x] = CELL_STATION
+    else:
+        ys, xs = np.nonzero(cells == CELL_STATION)
+        stations = list(zip(xs.tolist(), ys.tolist()))
+
+    spots = _expand_spots(spec["parking_spots"]) if "parking_spots" in spec else None
+    if spots is not None and len(spots) and ((spots[:, 0] < 0).any() or (spots[:, 1] < 0).any()
+                       or (spots[:, 2] > w).any() or (spots[:, 3] > h).any()):
+        raise ValueError("parking spot outside the raster")
+
+    ring = tuple(int(v) for v in spec["ring"]) if "ring" in spec else _road_ring(cells)
+    return {
+        "map": cells,
+        "gates": gates,
+        "charging_stations": stations,
+        "parking_spots": spots,
+        "ring": ring,
+    }
+
+
+# ====== 二进制缓存 ======
+def _source_key(spec_bytes, spec, base_dir):
+    # 描述文件和栅格文件内容的摘要，任一变化都会使缓存失效
+    digest = hashlib.sha1(spec_bytes)
+    with open(os.path.join(base_dir, spec["raster"]), "rb") as f:
+        digest.update(f.read())
+    digest.update(str(CACHE_VERSION).encode())
+    return digest.hexdigest()
+
+
+def _save_cache(path, key, layout):
+    arrays = {
+        "key": np.array(key),
+        "map": layout["map"],
+        "gates": np.array(layout["gates"], dtype=np.int32).reshape(-1, 4),
+        "charging_stations": np.array(layout["charging_stations"], dtype=np.int32).reshape(-1, 2),
+        "ring": np.array(layout["ring"], dtype=np.int32),
+    }
+    if layout["parking_spots"] is not None:
+        arrays["parking_spots"] = layout["parking_spots"]
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def _load_cache(path, key):
+    try:
+        data = np.load(path)
+    except (OSError, ValueError):
+        return None
+    with data:
+        if str(data["key"]) != key:
+            return None
+        return {
+            "map": data["map"],
+            "gates": [tuple(g) for g in data["gates"].tolist()],
+            "charging_stations": [tuple(s) for s in data["charging_stations"].tolist()],
+            "parking_spots": data["parking_spots"] if "parking_spots" in data.files else None,
+            "ring": tuple(data["ring"].tolist()),
+        }
+
+
+def load_layout(path, cache=True):
+    """
+    加载布局描述文件（JSON），返回 Simulation(layout=...) 可直接使用的布局字典。
+    :param cache: 是否使用与描述文件同名的 .npz 二进制缓存（源文件未变时直接加载，否则重新编译并写入）
+    """
+    with open(path, "rb") as f:
+        spec_bytes = f.read()
+    spec = json.loads(spec_bytes.decode("utf-8"))
+    base_dir = os.path.dirname(os.path.abspath(path))
+    if not cache:
+        return compile_layout(spec, base_dir)
+
+    cache_path = os.path.splitext(path)[0] + ".npz"
+    key = _source_key(spec_bytes, spec, base_dir)
+    layout = _load_cache(cache_path, key) if os.path.exists(cache_path) else None
+    if layout is None:
+        layout = compile_layout(spec, base_dir)
+        try:
+            _save_cache(cache_path, key, layout)
+        except OSError:
+            pass  # 目录不可写时只是不缓存
+    return layout
@@ -18,4 +18,5 @@ class ParkingSpot:
         self.x2 = x2
         self.y2 = y2
         self.is_horizontal = is_horizontal
-        self.is_occupied = False
\ No newline at end of file
+        self.is_occupied = False  # 车辆已停入
+        self.reserved_by = None   # 预订该车位的车辆（刷新时即预订，离场后释放）
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+-------------------------------------------------
+文件名：road_graph.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了道路网络的编译表示 (`RoadGraph`)，用于带拥堵的交通模型：
+    - 地图中每个可行驶格子（道路/大门）编译为一个节点，扁平格子下标 -> 节点编号按数组查表
+    - 每个节点有容量（同一格子最多容纳的车辆数）和占用数组，可单独调低某些格子的容量（如大门、窄路）
+    - 车辆只有在下一格未满时才能前进，否则原地排队，从而形成真实的排队和通行时间
+    - 并行更新规则：本步能否进入某格只看本步开始时的占用，同一格的多个申请按车辆先后（刷新顺序）依次放行；
+      本步腾出的位置下一步才可用，堵塞解除时车队从前往后逐辆启动
+    对象引擎逐辆调用 `request_move`，车队引擎调用向量化的 `admit`，两者结果一致。
+    沿道路网络行驶的布局（见 Simulation.road_routing）中双向车流共用同一串格子，按格子计容量会让
+    迎面相遇的两辆车互相等待而死锁，因此按方向分槽（directional）：每个格子的四个行驶方向各有一份容量，
+    车辆占用的是“所在格子 × 进入该格的方向”，迎面和横穿的车流互不阻挡。环路车道互不相交，不分方向。
+-------------------------------------------------
+"""
+import numpy as np
+
+# 行驶方向 (dx, dy) -> 方向槽下标；(0, 0)（原地，如只有一格的路线）归入第 0 槽
+HEADINGS = {(1, 0): 0, (0, 1): 1, (-1, 0): 2, (0, -1): 3, (0, 0): 0}
+
+
+class RoadGraph:
+    def __init__(self, simulation, cell_capacity=1, directional=False):
+        """
+        :param simulation: Simulation 实例，读取 get_driveable_mask()
+        :param cell_capacity: 每个道路格子（分方向时为每个格子的每个方向）默认可同时容纳的车辆数
+        :param directional: 是否按行驶方向分槽，容量和占用数组按“节点 × 4 + 方向”排列（只用于逐辆接口）
+        """
+        self.sim = simulation
+        mask = simulation.get_driveable_mask()
+        self.rows, self.cols = mask.shape
+        flat = np.flatnonzero(mask)
+        self.node_of = np.full(mask.size, -1, dtype=np.int32)  # 扁平格子下标 -> 节点编号
+        self.node_of[flat] = np.arange(len(flat), dtype=np.int32)
+        self.node_xy = np.stack([flat % self.cols, flat // self.cols], axis=1).astype(np.int32)
+        self.directional = directional
+        self.lanes = len(set(HEADINGS.values())) if directional else 1  # 每个节点的方向槽数
+        self.capacity = np.full(len(flat) * self.lanes, cell_capacity, dtype=np.int32)
+        self.occupancy = np.zeros(len(flat) * self.lanes, dtype=np.int32)
+        self._free = self.capacity.copy()  # 本步开始时各节点的剩余容量
+        self.blocked_total = 0  # 累计“想前进但被堵住”的车辆·步数
+
+    def __len__(self):
+        return len(self.node_xy)
+
+    def node(self, pos):
+        """格子坐标 -> 节点编号，不是道路格子时返回 -1"""
+        x, y = pos
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return -1
+        return int(self.node_of[y * self.cols + x])
+
+    def nodes(self, xs, ys):
+        """向量化的坐标 -> 节点编号"""
+        return self.node_of[np.asarray(ys, dtype=np.int64) * self.cols + np.asarray(xs, dtype=np.int64)]
+
+    def slot(self, pos, heading=(0, 0)):
+        """格子坐标和进入方向 -> 容量/占用数组下标（不分方向时即节点编号），不是道路格子时返回 -1"""
+        node = self.node(pos)
+        if node < 0 or not self.directional:
+            return node
+        return node * self.lanes + HEADINGS[heading]
+
+    def set_capacity(self, cells, capacity):
+        """
+        调整部分格子的容量（如单车道瓶颈、大门），分方向时每个方向都设为 capacity。
+        :param cells: [(x, y), ...]
+        """
+        for pos in cells:
+            node = self.node(pos)
+            if node >= 0:
+                self.capacity[node * self.lanes:(node + 1) * self.lanes] = capacity
+
+    def reset_occupancy(self, positions, headings=None):
+        """
+        按当前在路上的车辆位置重建占用数组（从快照恢复等情况下使用）。
+        :param headings: 分方向时各车辆进入所在格子的方向 [(dx, dy), ...]
+        """
+        self.occupancy[:] = 0
+        if positions:
+            xs, ys = zip(*positions)
+            nodes = self.nodes(xs, ys)
+            slots = nodes * self.lanes
+            if self.directional and headings is not None:
+                slots += np.array([HEADINGS[h] for h in headings], dtype=slots.dtype)
+            np.add.at(self.occupancy, slots[nodes >= 0], 1)
+
+    # ====== 逐辆接口（对象引擎） ======
+    def begin_tick(self):
+        """每步开始时调用：记录各节点本步可接纳的车辆数"""
+        np.subtract(self.capacity, self.occupancy, out=self._free)
+
+    def request_move(self, old_pos, new_pos, old_heading=(0, 0), new_heading=(0, 0)):
+        """
+        车辆申请从 old_pos 移动到 new_pos（old_pos 为 None 表示尚未上路，如在大门或车位中）。
+        :param old_heading / new_heading: 分方向时车辆进入 old_pos / new_pos 的行驶方向，不分方向时忽略
+        :return: 是否放行；放行时同步更新占用
+        """
+        new = self.slot(new_pos, new_heading)
+        old = -1 if old_pos is None else self.slot(old_pos, old_heading)
+        if new == old or new < 0:
+            if new != old and old >= 0:
+                self.occupancy[old] -= 1
+            return True
+        if self._free[new] <= 0:
+            self.blocked_total += 1
+            return False
+        self._free[new] -= 1
+        self.occupancy[new] += 1
+        if old >= 0:
+            self.occupancy[old] -= 1
+        return True
+
+    def leave(self, pos, heading=(0, 0)):
+        """车辆离开道路（停入车位或驶出园区），heading 为分方向时它进入所在格子的方向"""
+        slot = self.slot(pos, heading)
+        if slot >= 0:
+            self.occupancy[slot] -= 1
+
+    # ====== 向量化接口（车队引擎，只用于不分方向的环路车道） ======
+    def admit(self, old_nodes, new_nodes):
+        """
+        一次处理一批移动申请（按数组顺序即优先顺序），返回放行的布尔掩码并更新占用。
+        :param old_nodes: 当前所在节点，-1 表示尚未上路
+        :param new_nodes: 申请进入的节点，-1 表示不受容量限制的格子
+        """
+        old_nodes = np.asarray(old_nodes)
+        new_nodes = np.asarray(new_nodes)
+        free = self.capacity - self.occupancy
+        admitted = (new_nodes == old_nodes) | (new_nodes < 0)
+        contend = np.nonzero(~admitted)[0]
+        if contend.size:
+            target = new_nodes[contend]
+            # 同一目标节点的申请按原顺序编号 0, 1, 2...，编号小于剩余容量者放行
+            order = np.argsort(target, kind="stable")
+            sorted_target = target[order]
+            starts = np.r_[0, np.nonzero(np.diff(sorted_target))[0] + 1]
+            rank = np.arange(order.size) - np.repeat(starts, np.diff(np.r_[starts, order.size]))
+            ok = np.zeros(contend.size, dtype=bool)
+            ok[order] = rank < free[sorted_target]
+            admitted[contend[ok]] = True
+            self.blocked_total += int(contend.size - np.count_nonzero(ok))
+
+        moved = admitted & (new_nodes != old_nodes)
+        leaving = old_nodes[moved]
+        entering = new_nodes[moved]
+        np.subtract.at(self.occupancy, leaving[leaving >= 0], 1)
+        np.add.at(self.occupancy, entering[entering >= 0], 1)
+        return admitted
+
+    def leave_many(self, nodes):
+        """一批车辆离开道路"""
+        nodes = np.asarray(nodes)
+        np.subtract.at(self.occupancy, nodes[nodes >= 0], 1)
@@ -0,0 +1,220 @@
+"""
+-------------------------------------------------
+文件名：road_router.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了道路寻路服务 (`RoadRouter`)，为车辆提供只走道路 ('R') 和大门 ('G') 的最短路径。
+    布局的道路不能承载默认环路车道时（如从文件加载的真实园区），车辆沿这里给出的最短路行驶。
+    - 以 NumPy 向量化的逐层 BFS 构建单源最短路树（父节点数组），结果与逐格 BFS 一致
+    - 由 Simulation.router 在首次使用时创建，并预先计算所有大门生成点的最短路树，
+      其余源点（如车位邻近位置）按需构建并做 LRU 缓存
+    - 道路网络是无向的，因此任意一端有缓存树即可回答查询（反向回溯即可）
+    - 任意格子到最近可行驶格子的贴靠表同样用向量化的多源 BFS 一次建好
+    - 地图版本号变化时自动清空缓存并重建
+-------------------------------------------------
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+
+class RoadRouter:
+    def __init__(self, simulation, max_cached_trees=256):
+        """
+        :param simulation: Simulation 实例，需提供 get_driveable_mask() 和 map_version
+        :param max_cached_trees: 按需构建的最短路树最多缓存多少棵（预计算的源点不计入、不淘汰）
+        """
+        self.sim = simulation
+        self.max_cached_trees = max_cached_trees
+
+        self._pinned_sources = []      # 预计算的源点，地图变化后重建
+        self._pinned = {}              # 源点 -> 父节点数组
+        self._cached = OrderedDict()   # 源点 -> 父节点数组（LRU）
+        self._snap = None              # 扁平格子下标 -> 最近的可行驶格子下标
+        self._mask = None
+        self._map_version = None
+
+    # ====== 缓存管理 ======
+    def invalidate(self):
+        """清空所有最短路树，下次查询时按当前地图重建"""
+        self._pinned.clear()
+        self._cached.clear()
+        self._snap = None
+        self._mask = None
+        self._map_version = None
+
+    def _sync(self):
+        # 地图版本变化 => 缓存失效
+        if self._map_version != self.sim.map_version:
+            self.invalidate()
+            self._mask = self.sim.get_driveable_mask()
+            self._map_version = self.sim.map_version
+            for source in self._pinned_sources:
+                if self._is_driveable(source):
+                    self._pinned[source] = self._build_tree(source)
+
+    def precompute(self, sources):
+        """
+        预先计算一组源点的最短路树，这些树常驻缓存、不会被 LRU 淘汰。
+        :param sources: [(x, y), ...]
+        """
+        self._sync()
+        for source in sources:
+            if source in self._pinned_sources:
+                continue
+            self._pinned_sources.append(source)
+            if self._is_driveable(source):
+                self._pinned[source] = self._cached.pop(source, None)
+                if self._pinned[source] is None:
+                    self._pinned[source] = self._build_tree(source)
+
+    def _get_tree(self, source, build=True):
+        tree = self._pinned.get(source)
+        if tree is not None:
+            return tree
+        tree = self._cached.get(source)
+        if tree is not None:
+            self._cached.move_to_end(source)
+            return tree
+        if not build:
+            return None
+        tree = self._build_tree(source)
+        self._cached[source] = tree
+        if len(self._cached) > self.max_cached_trees:
+            self._cached.popitem(last=False)
+        return tree
+
+    # ====== BFS ======
+    def _is_driveable(self, pos):
+        x, y = pos
+        rows, cols = self._mask.shape
+        return 0 <= x < cols and 0 <= y < rows and bool(self._mask[y, x])
+
+    def _build_tree(self, source):
+        """
+        向量化的逐层 BFS，返回扁平化的父节点数组（-1 表示不可达，源点指向自身）。
+        同一层内按“前沿顺序 × 方向顺序”取首次到达者为父节点，
+        与原逐格 BFS（方向顺序 下、上、右、左）得到的树完全一致。
+        """
+        rows, cols = self._mask.shape
+        flat_mask = self._mask.ravel()
+        parent = np.full(rows * cols, -1, dtype=np.int32)
+
+        start = source[1] * cols + source[0]
+        parent[start] = start
+        frontier = np.array([start], dtype=np.int64)
+        offsets = np.array([cols, -cols, 1, -1], dtype=np.int64)
+
+        while frontier.size:
+            cand = (frontier[:, None] + offsets[None, :]).ravel()
+            # 左右移动不能跨行
+            fx = np.repeat(frontier % cols, 4)
+            valid = (cand >= 0) & (cand < rows * cols)
+            step_x = np.tile(np.array([0, 0, 1, -1]), frontier.size)
+            valid &= (fx + step_x >= 0) & (fx + step_x < cols)
+            order = np.nonzero(valid)[0]
+            cells = cand[order]
+            keep = flat_mask[cells] & (parent[cells] < 0)
+            order, cells = order[keep], cells[keep]
+            if cells.size == 0:
+                break
+            cells, first = np.unique(cells, return_index=True)
+            # 恢复发现顺序，作为下一层的出队顺序
+            seq = np.argsort(first, kind="stable")
+            cells, first = cells[seq], first[seq]
+            parent[cells] = frontier[order[first] // 4]
+            frontier = cells
+        return parent
+
+    # ====== 查询 ======
+    def _walk(self, tree, target):
+        """沿父节点数组从 target 回溯到源点，返回 [target, ..., 源点的后继]"""
+        cols = self._mask.shape[1]
+        idx = target[1] * cols + target[0]
+        if tree[idx] < 0:
+            return None
+        cells = []
+        while tree[idx] != idx:
+            cells.append((int(idx % cols), int(idx // cols)))
+            idx = int(tree[idx])
+        return cells
+
+    def path(self, start, end):
+        """
+        返回从 start 到 end 的最短道路路径（不含 start，含 end），不可达时返回 None。
+        """
+        self._sync()
+        if not self._is_driveable(start) or not self._is_driveable(end):
+            return None
+        if start == end:
+            return []
+
+        tree = self._get_tree(start, build=False)
+        if tree is not None:
+            cells = self._walk(tree, end)
+            return None if cells is None else cells[::-1]
+
+        tree = self._get_tree(end, build=False)
+        if tree is not None:
+            # 反向回溯：得到 [start, ..., end 的前一格]，去掉 start 再补上 end
+            cells = self._walk(tree, start)
+            if cells is None:
+                return None
+            return cells[1:] + [end]
+
+        cells = self._walk(self._get_tree(start), end)
+        return None if cells is None else cells[::-1]
+
+    def reachable(self, start, end):
+        """start 与 end 之间是否有道路相连（只查最短路树，不回溯路径）"""
+        self._sync()
+        if not self._is_driveable(start) or not self._is_driveable(end):
+            return False
+        tree = self._get_tree(start, build=False)
+        if tree is None:
+            tree = self._get_tree(end, build=False)
+            start, end = end, start
+        if tree is None:
+            tree = self._get_tree(start)
+        cols = self._mask.shape[1]
+        return bool(tree[end[1] * cols + end[0]] >= 0)
+
+    def snap(self, pos):
+        """返回距离 pos 最近（按步数）的可行驶格子，pos 本身可行驶时即为 pos；地图上没有道路时返回 None"""
+        self._sync()
+        if self._snap is None:
+            self._snap = self._build_snap()
+        rows, cols = self._mask.shape
+        x = min(max(int(pos[0]), 0), cols - 1)
+        y = min(max(int(pos[1]), 0), rows - 1)
+        idx = int(self._snap[y * cols + x])
+        return None if idx < 0 else (idx % cols, idx // cols)
+
+    def _build_snap(self):
+        """多源逐层 BFS：从全部可行驶格子同时出发，每个格子记录最先到达它的可行驶格子"""
+        rows, cols = self._mask.shape
+        owner = np.full(rows * cols, -1, dtype=np.int64)
+        frontier = np.flatnonzero(self._mask)
+        owner[frontier] = frontier
+        offsets = np.array([cols, -cols, 1, -1], dtype=np.int64)
+        while frontier.size:
+            cand = (frontier[:, None] + offsets[None, :]).ravel()
+            fx = np.repeat(frontier % cols, 4)
+            step_x = np.tile(np.array([0, 0, 1, -1]), frontier.size)
+            valid = (cand >= 0) & (cand < rows * cols) & (fx + step_x >= 0) & (fx + step_x < cols)
+            order = np.nonzero(valid)[0]
+            cells = cand[order]
+            keep = owner[cells] < 0
+            order, cells = order[keep], cells[keep]
+            if cells.size == 0:
+                break
+            cells, first = np.unique(cells, return_index=True)
+            owner[cells] = owner[frontier[order[first] // 4]]
+            frontier = cells
+        return owner
+
+    def distance(self, start, end):
+        """最短道路距离（步数），不可达返回 None"""
+        route = self.path(start, end)
+        return None if route is None else len(route)
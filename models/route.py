@@ -0,0 +1,174 @@
+"""
+-------------------------------------------------
+文件名：route.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了基于游标的路线 (`Route`)，供车辆 (`Vehicle`) 和充电机器人 (`ChargingRobot`) 共用。
+    路线不再物化为坐标列表，而是对共享数据的只读视图 + 游标：
+    - `LoopRoute`：车道循环上的一段 (loop_id, start, end, cursor)，直接引用 Simulation 预计算的车道数组
+    - `ManhattanRoute`：先横后纵的直线路径，按游标即时计算坐标
+    - `WaypointRoute`：由转弯路点压缩表示的折线路径（机器人避障路径）
+    - `PathRoute`：道路最短路的格子序列（道路网络模式下的车辆路线），直接引用寻路结果
+    前进一步为 O(1)，创建路线不分配与路线长度相关的内存。
+-------------------------------------------------
+"""
+import bisect
+
+
+class Route:
+    """
+    路线基类。子类只需给出总步数 `length` 和第 k 步（0 起）的坐标 `_cell(k)`。
+    接口与原先的列表用法对应：
+    - `route.advance()`  ≈ `route.pop(0)`
+    - `route.peek()`     ≈ `route[0]`
+    - `len(route)` / `bool(route)` 为剩余步数
+    """
+    __slots__ = ("length", "cursor")
+
+    def __init__(self, length):
+        self.length = length
+        self.cursor = 0
+
+    def _cell(self, k):
+        raise NotImplementedError
+
+    def __len__(self):
+        return self.length - self.cursor
+
+    def __bool__(self):
+        return self.cursor < self.length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("route index out of range")
+        return self._cell(self.cursor + i)
+
+    def __iter__(self):
+        for k in range(self.cursor, self.length):
+            yield self._cell(k)
+
+    def peek(self):
+        """返回下一步的坐标，不移动游标"""
+        return self._cell(self.cursor)
+
+    def advance(self):
+        """前进一步并返回到达的坐标"""
+        cell = self._cell(self.cursor)
+        self.cursor += 1
+        return cell
+
+    def seek(self, cursor):
+        """把游标直接移动到第 cursor 步（O(1)），用于按时间跳跃"""
+        self.cursor = max(0, min(cursor, self.length))
+
+    def last_visited(self):
+        """返回最近一次到达的坐标（游标为 0 时返回第一格）"""
+        return self._cell(max(self.cursor - 1, 0))
+
+    def last(self):
+        """返回路线终点坐标"""
+        return self._cell(self.length - 1)
+
+    def heading(self, k):
+        """
+        第 k 步进入所在格子时的行驶方向 (dx, dy)：由第 k-1 步的格子指向第 k 步的格子；
+        第 0 步没有来向，取第 0 步指向第 1 步的方向（路线只有一格时为 (0, 0)）。
+        """
+        if k <= 0:
+            if self.length < 2:
+                return (0, 0)
+            k = 1
+        (x0, y0), (x1, y1) = self._cell(k - 1), self._cell(k)
+        return (x1 > x0) - (x1 < x0), (y1 > y0) - (y1 < y0)
+
+
+class LoopRoute(Route):
+    """
+    车道循环上从 start_index 到 end_index（含两端）的顺序段，
+    若 start_index > end_index 则跨过循环末尾回到开头。
+    """
+    __slots__ = ("loop", "loop_id", "start")
+
+    def __init__(self, loop, start_index, end_index, loop_id=None):
+        n = len(loop)
+        super().__init__((end_index - start_index) % n + 1 if n else 0)
+        self.loop = loop
+        self.loop_id = loop_id
+        self.start = start_index
+
+    @property
+    def end(self):
+        return (self.start + self.length - 1) % len(self.loop)
+
+    def _cell(self, k):
+        return self.loop[(self.start + k) % len(self.loop)]
+
+
+class ManhattanRoute(Route):
+    """
+    从 start 出发（不含 start）先沿 x 方向、再沿 y 方向走到 end 的路径。
+    """
+    __slots__ = ("sx", "sy", "ex", "ey", "dx", "dy", "nx")
+
+    def __init__(self, start, end):
+        self.sx, self.sy = start
+        self.ex, self.ey = end
+        self.dx = 1 if self.ex > self.sx else -1
+        self.dy = 1 if self.ey > self.sy else -1
+        self.nx = abs(self.ex - self.sx)
+        super().__init__(self.nx + abs(self.ey - self.sy))
+
+    def _cell(self, k):
+        k += 1
+        if k <= self.nx:
+            return (self.sx + self.dx * k, self.sy)
+        return (self.ex, self.sy + self.dy * (k - self.nx))
+
+
+class WaypointRoute(Route):
+    """
+    由压缩路点描述的折线路径：从 start 出发（不含 start），依次沿水平或竖直线段走到每个路点。
+    只保存转弯处的路点，坐标按游标在所在线段上即时计算。
+    """
+    __slots__ = ("start_pos", "waypoints", "_ends")
+
+    def __init__(self, start, waypoints):
+        """
+        :param start: 起点 (x, y)
+        :param waypoints: [(x, y), ...]，相邻两点（含起点）必须同行或同列，最后一个为终点
+        """
+        self.start_pos = start
+        self.waypoints = waypoints
+        self._ends = []  # 第 i 段结束时累计走过的步数
+        total = 0
+        prev = start
+        for point in waypoints:
+            total += abs(point[0] - prev[0]) + abs(point[1] - prev[1])
+            self._ends.append(total)
+            prev = point
+        super().__init__(total)
+
+    def _cell(self, k):
+        k += 1
+        i = bisect.bisect_left(self._ends, k)
+        x1, y1 = self.waypoints[i]
+        x0, y0 = self.waypoints[i - 1] if i else self.start_pos
+        d = k - (self._ends[i - 1] if i else 0)
+        return (x0 + (x1 > x0) * d - (x1 < x0) * d, y0 + (y1 > y0) * d - (y1 < y0) * d)
+
+
+class PathRoute(Route):
+    """
+    道路网络上的格子序列，与 LoopRoute 一样第 0 步为起点所在格子。
+    """
+    __slots__ = ("cells",)
+
+    def __init__(self, cells):
+        super().__init__(len(cells))
+        self.cells = cells
+
+    def _cell(self, k):
+        return self.cells[k]
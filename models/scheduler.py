@@ -10,6 +10,9 @@
 """
 import numpy as np
 
+from models.spatial_index import SpatialGrid
+
+
 def nearest_task_first(robots, vehicles):
     """
     充电策略 1: 最近任务优先
@@ -43,14 +46,14 @@ def nearest_task_first(robots, vehicles):
 def max_demand_first(robots, vehicles):
     """
     充电策略 2: 最大需求优先
-    机器人优先选择充电需求最大的车辆（charge_needed - battery_level 最大）。
+    机器人优先选择充电需求最大的车辆（target_battery_level - current_battery 最大）。
 
     :param robots: 充电机器人列表
     :param vehicles: 需要充电的车辆列表
     :return: 任务分配字典 {robot: vehicle}
     """
     task_assignment = {}  # 存储机器人到车辆的映射
-    available_vehicles = sorted(vehicles, key=lambda v: v.charge_needed - v.battery_level, reverse=True)  # 按需求排序
+    available_vehicles = sorted(vehicles, key=lambda v: v.target_battery_level - v.current_battery, reverse=True)  # 按需求排序
 
     for robot in robots:
         if robot.status in ["idle", "recharging"]:  # 仅空闲机器人才分配任务
@@ -58,4 +61,129 @@ def max_demand_first(robots, vehicles):
                 selected_vehicle = available_vehicles.pop(0)  # 选择需求最大的车辆
                 task_assignment[robot] = selected_vehicle
 
-    return task_assignment
\ No newline at end of file
+    return task_assignment
+
+
+try:  # SciPy 为可选依赖，存在时使用其 C 实现的匈牙利算法
+    from scipy.optimize import linear_sum_assignment as _scipy_lsa
+except ImportError:
+    _scipy_lsa = None
+
+
+def build_cost_matrix(robots, vehicles):
+    """
+    一次性向量化计算 机器人×车辆 的欧氏距离矩阵。
+
+    :param robots: 充电机器人列表
+    :param vehicles: 车辆列表
+    :return: 形状为 (len(robots), len(vehicles)) 的 float64 数组
+    """
+    rp = np.array([r.position for r in robots], dtype=np.float64).reshape(-1, 2)
+    vp = np.array([v.position for v in vehicles], dtype=np.float64).reshape(-1, 2)
+    return np.hypot(rp[:, None, 0] - vp[None, :, 0], rp[:, None, 1] - vp[None, :, 1])
+
+
+def _hungarian(cost):
+    """
+    匈牙利算法（带势函数的最短增广路实现），求解 n×m（n <= m）矩阵的最小代价完美匹配。
+    内层对列的扫描用 NumPy 向量化，整体 O(n²·m)。
+
+    :return: (行下标数组, 列下标数组)
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # p[j]：第 j 列匹配的行（1 起，0 表示未匹配）
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+
+            used_cols = np.nonzero(used)[0]
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # 沿增广路翻转匹配
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def solve_assignment(cost):
+    """
+    求解矩形代价矩阵的最小代价匹配，行数和列数中较小的一方全部匹配。
+    优先使用 SciPy，不可用时使用内置的匈牙利算法。
+
+    :return: (行下标数组, 列下标数组)
+    """
+    if cost.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if _scipy_lsa is not None:
+        rows, cols = _scipy_lsa(cost)
+        return np.asarray(rows), np.asarray(cols)
+    if cost.shape[0] <= cost.shape[1]:
+        return _hungarian(cost)
+    cols, rows = _hungarian(cost.T)
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def optimal_assignment(robots, vehicles, k_nearest=8, dense_limit=2000, index=None):
+    """
+    充电策略 3: 全局最优分配
+    对空闲机器人和待充电车辆建立距离代价矩阵，用匈牙利算法求总行驶距离最小的分配。
+    车辆数超过 dense_limit 时不构造完整矩阵：借助空间索引为每个机器人取最近的 k_nearest 辆车，
+    只在这些候选车辆组成的子矩阵上求解。
+
+    :param robots: 充电机器人列表
+    :param vehicles: 需要充电的车辆列表
+    :param k_nearest: 大规模时每个机器人的候选车辆数
+    :param dense_limit: 车辆数不超过该值时直接求解完整矩阵
+    :param index: 已包含这些车辆的 SpatialGrid（可选），None 时按车辆坐标临时建立
+    :return: 任务分配字典 {robot: vehicle}
+    """
+    idle = [r for r in robots if r.status in ["idle", "recharging"]]  # 仅空闲机器人才分配任务
+    if not idle or not vehicles:
+        return {}
+
+    if len(vehicles) <= dense_limit or k_nearest >= len(vehicles):
+        rows, cols = solve_assignment(build_cost_matrix(idle, vehicles))
+        return {idle[r]: vehicles[c] for r, c in zip(rows.tolist(), cols.tolist())}
+
+    if index is None:
+        index = SpatialGrid((max(v.position[0] for v in vehicles) + 1, max(v.position[1] for v in vehicles) + 1))
+        for v in vehicles:
+            index.insert(v, v.position)
+    # 每个机器人最近的 k 辆车，合并成候选车辆集合（按首次出现的顺序）
+    candidates = {}
+    for robot in idle:
+        for _, vehicle in index.k_nearest(robot.position, k_nearest):
+            candidates[vehicle] = None
+    candidates = list(candidates)
+    rows, cols = solve_assignment(build_cost_matrix(idle, candidates))
+    return {idle[r]: candidates[c] for r, c in zip(rows.tolist(), cols.tolist())}
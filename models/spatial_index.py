@@ -0,0 +1,154 @@
+"""
+-------------------------------------------------
+文件名：spatial_index.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了均匀分桶网格空间索引 (`SpatialGrid`)，用于机器人、车辆、充电站之间的近邻查询。
+    - 把园区按 bucket_size × bucket_size 划分为桶，每个对象按坐标放入对应桶
+    - 对象移动时增量更新：只有跨桶时才在桶之间迁移
+    - 支持 k 近邻查询（由近到远逐圈扩展桶，找到足够结果即停止）和半径查询
+    查询只访问目标附近的少量桶，代价与对象总数无关。
+-------------------------------------------------
+"""
+import heapq
+import math
+
+
+class SpatialGrid:
+    def __init__(self, grid_size, bucket_size=8):
+        """
+        :param grid_size: 园区尺寸 (w, h)
+        :param bucket_size: 每个桶覆盖的格子边长
+        """
+        self.grid_size = grid_size
+        self.bucket_size = bucket_size
+        self.cols = max(1, math.ceil(grid_size[0] / bucket_size))
+        self.rows = max(1, math.ceil(grid_size[1] / bucket_size))
+        self._buckets = {}   # (bx, by) -> {对象: 坐标}
+        self._where = {}     # 对象 -> (bx, by)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, item):
+        return item in self._where
+
+    def _bucket_of(self, pos):
+        bx = min(max(int(pos[0]) // self.bucket_size, 0), self.cols - 1)
+        by = min(max(int(pos[1]) // self.bucket_size, 0), self.rows - 1)
+        return bx, by
+
+    # ====== 增删改 ======
+    def insert(self, item, pos):
+        """加入对象（已存在则等同于 update）"""
+        if item in self._where:
+            self.update(item, pos)
+            return
+        key = self._bucket_of(pos)
+        self._buckets.setdefault(key, {})[item] = pos
+        self._where[item] = key
+
+    def update(self, item, pos):
+        """对象移动到新坐标，只有跨桶时才迁移"""
+        old = self._where.get(item)
+        if old is None:
+            self.insert(item, pos)
+            return
+        key = self._bucket_of(pos)
+        if key == old:
+            self._buckets[old][item] = pos
+            return
+        bucket = self._buckets[old]
+        del bucket[item]
+        if not bucket:
+            del self._buckets[old]
+        self._buckets.setdefault(key, {})[item] = pos
+        self._where[item] = key
+
+    def remove(self, item):
+        """移除对象（不存在则忽略）"""
+        key = self._where.pop(item, None)
+        if key is None:
+            return
+        bucket = self._buckets[key]
+        del bucket[item]
+        if not bucket:
+            del self._buckets[key]
+
+    def position_of(self, item):
+        key = self._where.get(item)
+        return None if key is None else self._buckets[key][item]
+
+    # ====== 查询 ======
+    def _ring(self, cx, cy, r):
+        """以 (cx, cy) 为中心、切比雪夫半径为 r 的一圈桶"""
+        if r == 0:
+            yield cx, cy
+            return
+        for bx in range(cx - r, cx + r + 1):
+            yield bx, cy - r
+            yield bx, cy + r
+        for by in range(cy - r + 1, cy + r):
+            yield cx - r, by
+            yield cx + r, by
+
+    def k_nearest(self, pos, k=1, predicate=None):
+        """
+        返回距离 pos 最近的 k 个对象，按距离升序，形如 [(距离, 对象), ...]。
+        :param predicate: 可选过滤函数，只返回 predicate(对象) 为真的对象
+        """
+        if k <= 0 or not self._where:
+            return []
+        cx, cy = self._bucket_of(pos)
+        px, py = pos
+        best = []  # 最大堆（取负距离），保留当前最近的 k 个
+        # 最远只需扩展到覆盖园区边界的那一圈
+        max_r = max(cx, self.cols - 1 - cx, cy, self.rows - 1 - cy)
+        remaining = len(self._where)  # 尚未访问的对象数，全部访问过即可停止
+        counter = 0
+        for r in range(max_r + 1):
+            # 第 r 圈的桶与查询点的最小可能距离
+            if remaining == 0 or (len(best) == k and (r - 1) * self.bucket_size > -best[0][0]):
+                break
+            for key in self._ring(cx, cy, r):
+                bucket = self._buckets.get(key)
+                if not bucket:
+                    continue
+                remaining -= len(bucket)
+                for item, (x, y) in bucket.items():
+                    if predicate is not None and not predicate(item):
+                        continue
+                    d = math.hypot(x - px, y - py)
+                    counter += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, counter, item))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, counter, item))
+        return [(-nd, item) for nd, _, item in sorted(best, reverse=True)]
+
+    def nearest(self, pos, predicate=None):
+        """返回最近的对象，没有时返回 None"""
+        result = self.k_nearest(pos, 1, predicate)
+        return result[0][1] if result else None
+
+    def within_radius(self, pos, radius, predicate=None):
+        """返回与 pos 距离不超过 radius 的全部对象，按距离升序，形如 [(距离, 对象), ...]"""
+        px, py = pos
+        bs = self.bucket_size
+        x0, y0 = self._bucket_of((px - radius, py - radius))
+        x1, y1 = self._bucket_of((px + radius, py + radius))
+        result = []
+        for bx in range(x0, x1 + 1):
+            for by in range(y0, y1 + 1):
+                bucket = self._buckets.get((bx, by))
+                if not bucket:
+                    continue
+                for item, (x, y) in bucket.items():
+                    if predicate is not None and not predicate(item):
+                        continue
+                    d = math.hypot(x - px, y - py)
+                    if d <= radius:
+                        result.append((d, item))
+        result.sort(key=lambda t: t[0])
+        return result
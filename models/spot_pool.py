@@ -0,0 +1,66 @@
+"""
+-------------------------------------------------
+文件名：spot_pool.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    该模块定义了空闲车位池 (`FreeSpotPool`)，维护当前可被预订的车位集合。
+    采用“列表 + 下标字典”结构，预订（移出）、释放（放回）均为 O(1)，批量随机预订按抽中的下标直接取用，
+    取代每次刷新车辆时对全部车位的线性扫描。
+-------------------------------------------------
+"""
+
+
+class FreeSpotPool:
+    def __init__(self, spots=()):
+        """
+        :param spots: 初始空闲车位
+        """
+        self._spots = []   # 空闲车位列表（顺序无意义）
+        self._index = {}   # 车位 -> 在列表中的下标
+        for spot in spots:
+            self.release(spot)
+
+    def __len__(self):
+        return len(self._spots)
+
+    def __contains__(self, spot):
+        return spot in self._index
+
+    def __iter__(self):
+        return iter(self._spots)
+
+    def spots(self):
+        """返回当前空闲车位列表的副本"""
+        return list(self._spots)
+
+    def release(self, spot):
+        """把车位放回空闲池（已在池中则忽略）"""
+        if spot not in self._index:
+            self._index[spot] = len(self._spots)
+            self._spots.append(spot)
+
+    def reserve(self, spot):
+        """把指定车位移出空闲池：与末尾元素交换后弹出"""
+        i = self._index.pop(spot, None)
+        if i is None:
+            return False
+        last = self._spots.pop()
+        if last is not spot:
+            self._spots[i] = last
+            self._index[last] = i
+        return True
+
+    def reserve_many(self, count, rng):
+        """
+        一次性随机预订 count 个不同的空闲车位（不足时全部预订），返回车位列表。
+        :param rng: numpy.random.Generator
+        """
+        count = min(count, len(self._spots))
+        if count == 0:
+            return []
+        picked = [self._spots[i] for i in rng.choice(len(self._spots), size=count, replace=False).tolist()]
+        for spot in picked:
+            self.reserve(spot)
+        return picked
+
@@ -23,11 +23,15 @@
     完成充电机器人与充电站之间层次的关系，机器人隶属于不同充电站（动态）
 -------------------------------------------------
 """
-import math
-import random
+
+from models.route import LoopRoute
+from models.charging_curve import DEFAULT_CURVE
+from utils.logger import EVENT_EXIT
 
 class Vehicle:
-    def __init__(self, simulation, origin_gate, spawn_pos, target_pos, parking_duration, spawn_time, route=None):
+    def __init__(self, simulation, origin_gate, spawn_pos, target_pos, parking_duration, spawn_time, route=None,
+                 spot=None, charging_curve=None, initial_battery=None, target_battery=None, clockwise=None,
+                 vid=None):
         """
         :param simulation: Simulation 实例
         :param origin_gate: 大门区域 (x1, y1, x2, y2)
@@ -35,9 +39,15 @@ class Vehicle:
         :param target_pos: 目标停车位旁位置
         :param parking_duration: 停车时长
         :param spawn_time: 生成时刻
-        :param route: 备用路径（内部将使用车道循环覆盖）
+        :param route: 备用路径（内部将使用车道循环或道路网络路线覆盖）
+        :param spot: 刷新时已预订的目标车位（ParkingSpot）
+        :param charging_curve: 该车型的充电曲线（ChargingCurve），默认为原有的线性规则
+        :param initial_battery / target_battery / clockwise: 预先抽样的电量与方向（批量刷新时给出），
+                                                              未给出时从 Simulation 的车辆属性随机数流抽取
+        :param vid: 车辆编号（按进场顺序编号，用于事件日志等）
         """
         self.sim = simulation 
+        self.vid = vid
         self.origin_gate = origin_gate
         self.spawn_pos = spawn_pos
         self.target_pos = target_pos
@@ -47,34 +57,37 @@ class Vehicle:
         # 车辆状态: entering -> parked -> exiting -> exited
         self.state = "entering"
         self.parked_time = None
-        self.bound_spot = None
+        self.bound_spot = spot
 
         # 电量特性
-        self.initial_battery_level = random.randint(1, 50)  # 初始电量随机设定在1到50之间
+        rng = self.sim.vehicle_rng
+        if initial_battery is None:
+            initial_battery = int(rng.integers(1, 51))  # 初始电量随机设定在1到50之间
+        if target_battery is None:
+            target_battery = int(rng.integers(initial_battery, 101))  # 目标电量介于初始电量和100之间随机
+        self.initial_battery_level = initial_battery
         self.current_battery = self.initial_battery_level  # 当前电量初始与初始电量相同
-        self.target_battery_level = random.randint(self.initial_battery_level, 100)  # 目标电量介于初始电量和100之间随机
+        self.target_battery_level = target_battery
+        self.charging_status = "waiting"  # waiting -> charging -> charged
+        self.charging_curve = charging_curve if charging_curve is not None else DEFAULT_CURVE
 
         # 随机分配方向：True=顺时针(内道)，False=逆时针(外道)
-        self.clockwise = random.choice([True, False])
-        if self.clockwise:
-            lane_loop = self.sim.get_inner_loop()
+        self.clockwise = bool(rng.integers(2)) if clockwise is None else clockwise
+        self.lane_id = "inner" if self.clockwise else "outer"
+        if self.sim.road_routing:
+            # 布局的道路不能承载环路车道：沿道路网络的最短路驶向车位
+            self.route = self.sim.road_route(spawn_pos, target_pos)
+            self.position = self.route.peek()
         else:
-            lane_loop = self.sim.get_outer_loop()
-
-        # 将生成点贴靠到对应车道上
-        self.position = min(
-            lane_loop,
-            key=lambda p: math.hypot(p[0] - spawn_pos[0], p[1] - spawn_pos[1])
-        )
-
-        # 计算进入路线：将目标位置也贴靠到车道
-        target_lane = min(
-            lane_loop,
-            key=lambda p: math.hypot(p[0] - target_pos[0], p[1] - target_pos[1])
-        )
-        start_index = self.find_index(lane_loop, self.position)
-        end_index = self.find_index(lane_loop, target_lane)
-        self.route = self.compute_loop_route(lane_loop, start_index, end_index)
+            lane_loop = self.sim.get_lane_loop(self.lane_id)
+
+            # 将生成点和目标位置贴靠到对应车道上（查 Simulation 预计算的车道索引）
+            start_index = self.sim.snap_to_lane(spawn_pos, self.lane_id)
+            end_index = self.sim.snap_to_lane(target_pos, self.lane_id)
+            self.position = lane_loop[start_index]
+            self.route = self.compute_loop_route(lane_loop, start_index, end_index, self.lane_id)
+        # 路线游标为 0 的时刻：刷新当步即会前进一格
+        self.route_time = spawn_time - 1
 
         # 车辆朝向/道路边侧，用于渲染微调
         self.orientation = "horizontal"
@@ -82,16 +95,10 @@ class Vehicle:
         self.debug_info = ""
         self._detect_road_side()
 
-    def find_index(self, loop, pos):
-        distances = [math.hypot(p[0] - pos[0], p[1] - pos[1]) for p in loop]
-        return distances.index(min(distances))
-
-    def compute_loop_route(self, loop, start_index, end_index):
+    def compute_loop_route(self, loop, start_index, end_index, loop_id=None):
         # 从 start_index 到 end_index 的顺序段（若 start > end，则跨过列表末尾循环）
-        if start_index <= end_index:
-            return loop[start_index:end_index+1]
-        else:
-            return loop[start_index:] + loop[:end_index+1]
+        # 返回共享车道数组上的游标视图，不复制坐标列表
+        return LoopRoute(loop, start_index, end_index, loop_id)
 
     def _compute_simple_manhattan(self, start, end):
         # 备用方法（目前不使用）
@@ -112,50 +119,50 @@ class Vehicle:
                 route.append((ex, y-1))
         return route
 
+    def _try_advance(self):
+        """
+        沿路线前进一格。拥堵模型下先向道路图申请进入下一格，前方已满时原地等待。
+        路线游标为 0 时车辆尚未上路（在大门处或车位中），不占用道路格子。
+        """
+        graph = self.sim.road_graph
+        if graph is None:
+            self.position = self.route.advance()
+            return
+        k = self.route.cursor
+        old_pos = self.position if k > 0 else None
+        if graph.directional:
+            allowed = graph.request_move(old_pos, self.route.peek(), self.route.heading(k - 1), self.route.heading(k))
+        else:
+            allowed = graph.request_move(old_pos, self.route.peek())
+        if allowed:
+            self.position = self.route.advance()
+
+    def _leave_road(self):
+        # 停入车位或驶出园区时释放所在的道路格子（分方向时按进入该格的方向）
+        graph = self.sim.road_graph
+        if graph is not None:
+            graph.leave(self.position, self.route.heading(self.route.cursor - 1))
+
     def update(self):
         if self.state == "entering":
             # 沿 route 前进
             if self.route:
-                self.position = self.route.pop(0)
+                self._try_advance()
             else:
                 # 抵达停车位邻近位置 => parked
-                self.state = "parked"
-                self.parked_time = self.sim.global_time
-                for s in self.sim.get_parking_spots():
-                    if (not s.is_occupied
-                        and self.sim.get_parking_adjacent_position(s) == self.target_pos):
-                        s.is_occupied = True
-                        self.bound_spot = s
-                        break
+                self.park()
 
         elif self.state == "parked":
             # 停够时长后 => exiting
             if (self.sim.global_time - self.parked_time) >= self.parking_duration:
-                self.state = "exiting"
-
-                if self.clockwise:
-                    lane_loop = self.sim.get_inner_loop()
-                else:
-                    lane_loop = self.sim.get_outer_loop()
-
-                # 离场时：目标为大门 spawn 点（贴靠）
-                exit_point = self.sim.get_spawn_position_for_gate(self.origin_gate)
-                exit_lane = min(
-                    lane_loop,
-                    key=lambda p: math.hypot(p[0] - exit_point[0], p[1] - exit_point[1])
-                )
-                current_index = self.find_index(lane_loop, self.position)
-                exit_index = self.find_index(lane_loop, exit_lane)
-                self.route = self.compute_loop_route(lane_loop, current_index, exit_index)
+                self.depart()
 
         elif self.state == "exiting":
             if self.route:
-                self.position = self.route.pop(0)
+                self._try_advance()
             else:
                 # 抵达大门 => exited
-                self.state = "exited"
-                if self.bound_spot:
-                    self.bound_spot.is_occupied = False
+                self.leave_park()
 
         elif self.state == "exited":
             pass
@@ -164,11 +171,68 @@ class Vehicle:
         self._update_orientation()
         self._detect_road_side()
 
+    # 状态切换（逐步更新和事件驱动模式共用）
+    def park(self):
+        """entering -> parked：停入车位"""
+        self.state = "parked"
+        self.parked_time = self.sim.global_time
+        self._leave_road()
+        if self.bound_spot is None:
+            # 未预订车位时按邻近位置 O(1) 查找
+            s = self.sim.spot_by_adjacent.get(self.target_pos)
+            if s is not None and not s.is_occupied and s.reserved_by is None:
+                s.reserved_by = self
+                self.bound_spot = s
+        if self.bound_spot is not None:
+            self.sim.occupy_spot(self.bound_spot)
+        self.sim.on_vehicle_parked(self)
+
+    def depart(self):
+        """parked -> exiting：计算从当前位置到大门贴靠点的离场路线"""
+        self.state = "exiting"
+        self.sim.on_vehicle_departed(self)
+
+        # 离场时：目标为大门 spawn 点（贴靠）
+        exit_point = self.sim.get_spawn_position_for_gate(self.origin_gate)
+        if self.sim.road_routing:
+            self.route = self.sim.road_route(self.position, exit_point)
+        else:
+            lane_loop = self.sim.get_lane_loop(self.lane_id)
+            current_index = self.sim.snap_to_lane(self.position, self.lane_id)
+            exit_index = self.sim.snap_to_lane(exit_point, self.lane_id)
+            self.route = self.compute_loop_route(lane_loop, current_index, exit_index, self.lane_id)
+        self.route_time = self.sim.global_time
+
+    def leave_park(self):
+        """exiting -> exited：离开园区并释放车位"""
+        self.state = "exited"
+        self.sim.exit_time_total += self.sim.global_time - self.parked_time - self.parking_duration
+        if self.sim.telemetry is not None:
+            self.sim.telemetry.emit(self.sim.global_time, EVENT_EXIT, self.vid, self.position[0], self.position[1],
+                                    self.current_battery)
+        self._leave_road()
+        if self.bound_spot:
+            self.sim.release_spot(self.bound_spot)
+
+    def sync_position(self, now):
+        """
+        事件驱动模式下车辆不逐步更新，需要位置时按时间直接跳到路线上对应的格子（O(1)）。
+        route_time 为路线游标位于 0 时的时刻，此后每个时间单位前进一格。
+        """
+        if self.state not in ("entering", "exiting"):
+            return
+        steps = min(now - self.route_time, self.route.length)
+        if steps > self.route.cursor:
+            self.route.seek(steps)
+            self.position = self.route.last_visited()
+            self._update_orientation()
+            self._detect_road_side()
+
     # 朝向和道路边相关方法
     def _update_orientation(self):
         if self.state in ("entering", "exiting") and self.route: # 仅在 entering/exiting 时更新
             cx, cy = self.position
-            nx, ny = self.route[0]
+            nx, ny = self.route.peek()
             self.orientation = "horizontal" if nx != cx else "vertical"
 
     def _detect_road_side(self):
@@ -176,17 +240,17 @@ class Vehicle:
         根据当前坐标判断在道路的 top/bottom/left/right 边，
         用于渲染 offset 微调
         """
-        w, h = self.sim.grid_size
+        x0, y0, x1, y1 = self.sim.ring
         rw = self.sim.road_width
         x, y = self.position
 
-        if rw <= y < rw+4:
+        if y0 <= y < y0+rw:
             self.road_side = "top"
-        elif (h - rw - 4) <= y < (h - rw):
+        elif (y1 - rw) <= y < y1:
             self.road_side = "bottom"
-        elif rw <= x < rw+4:
+        elif x0 <= x < x0+rw:
             self.road_side = "left"
-        elif (w - rw - 4) <= x < (w - rw):
+        elif (x1 - rw) <= x < x1:
             self.road_side = "right"
         else:
             self.road_side = None
@@ -228,13 +292,19 @@ class Vehicle:
         self.current_battery = min(self.current_battery + amount, self.target_battery_level)
 
     # 充电相关方法, 充电速度指单位时间充上的电量，当处于充电状态时，每隔。。。。。时间调用一次charge方法，代表单位时间内充电一次
-    def charging(self):
-        self.current_battery = min(self.current_battery + self.get_charging_speed(), 100)
-        if self.current_battery == 100:
+    # 充到目标电量即视为充电完成（与 update_battery_level 的上限一致）
+    def charging(self, ticks=1, start=None):
+        """
+        充电 ticks 个单位时间（按充电曲线闭式计算，不逐步迭代）
+        :param start: 从该电量起算，默认为当前电量
+        """
+        battery = self.current_battery if start is None else start
+        self.current_battery = min(self.charging_curve.advance(battery, ticks), self.target_battery_level)
+        if self.current_battery >= self.target_battery_level:
             self.charging_status = "charged"
         else:
             self.charging_status = "charging"
 
     # 充电速度由当前汽车的电量决定，电量越低充电速度越快，电量越高充电速度越慢
     def get_charging_speed(self):
-        return 100 - 0.5*self.current_battery
+        return self.charging_curve.rate(self.current_battery)
@@ -8,107 +8,210 @@
     - 采用 100ms 刷新率，实时更新车辆位置
     - 可视化园区结构，包括道路、车位、建筑、大门、充电桩
     - 动态展示车辆的行驶过程
+    - 按 P 键开关耗时剖析叠加层（各阶段 p50/p95/p99 与实体数量，见 utils/profiler.py）
 -------------------------------------------------
 """
 import sys
+from time import perf_counter_ns
+
+import numpy as np
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout
-from PyQt5.QtGui import QPainter, QColor
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QPainter, QColor, QImage, QPixmap, QFont
+from PyQt5.QtCore import Qt, QTimer, QRect
+
+from config import CELL_FREE, CELL_ROAD, CELL_BUILDING, CELL_STATION, CELL_GATE
+from models.fleet import FleetVehicleView, STATE_ENTERING, STATE_EXITING
+from utils.profiler import Profiler, PHASE_RENDER
+
+OVERLAY_LINE_HEIGHT = 14
+
+# 格子编码 -> RGB 颜色，按编码下标查表
+CELL_COLORS = np.full((256, 3), 200, dtype=np.uint8)  # 未知编码显示为浅灰
+CELL_COLORS[CELL_ROAD] = (128, 128, 128)      # 道路
+CELL_COLORS[CELL_BUILDING] = (0, 0, 0)        # 建筑
+CELL_COLORS[CELL_FREE] = (255, 255, 255)      # 空闲区
+CELL_COLORS[CELL_STATION] = (0, 0, 255)       # 充电桩
+CELL_COLORS[CELL_GATE] = (255, 165, 0)        # 大门
 
 class ParkRenderer(QWidget):
     def __init__(self, simulation):
         super().__init__()
         self.simulation = simulation
-        self.map_data = simulation.get_map_data()
+        self.map_data = simulation.map
         self.cell_size = 5
 
+        # 静态背景层（道路、建筑、大门、充电桩）只在地图变化时重新生成
+        self._background = None
+        self._background_version = None
+        # 需要绘制的车位（不覆盖大门）及其格子边界 (x1, y1, x2, y2)，随背景一起重建
+        self._spots = []
+        self._spot_bounds = np.zeros((0, 4), dtype=np.int32)
+
         rows, cols = self.map_data.shape
         # 根据地图尺寸设置窗口大小
         self.setFixedSize(cols * self.cell_size, rows * self.cell_size)
 
+        # 开启模拟的脏区域跟踪，只重绘发生变化的区域
+        simulation.track_dirty = True
+        simulation.consume_dirty()
+
+        # 耗时剖析叠加层（需 simulation.profiler 不为 None）
+        self.show_overlay = False
+        self._overlay_rect = QRect(0, 0, 480, OVERLAY_LINE_HEIGHT * 10 + 8)
+
+    def _build_background(self):
+        """
+        直接由编码地图查表得到 RGB 像素，生成一张每格 1 像素的 QImage，
+        再按 cell_size 最近邻放大为 QPixmap，替代逐格 drawRect。
+        """
+        self.map_data = self.simulation.map
+        rows, cols = self.map_data.shape
+        rgb = np.ascontiguousarray(CELL_COLORS[self.map_data])
+        image = QImage(rgb.data, cols, rows, cols * 3, QImage.Format_RGB888)
+        scaled = image.scaled(cols * self.cell_size, rows * self.cell_size,
+                              Qt.IgnoreAspectRatio, Qt.FastTransformation)
+        # QPixmap.fromImage 会复制像素数据，之后 rgb 缓冲区可以释放
+        self._background = QPixmap.fromImage(scaled)
+        self._background_version = self.simulation.map_version
+
+        self._spots = [spot for spot in self.simulation.get_parking_spots()
+                       if self.map_data[spot.y1, spot.x1] != CELL_GATE]
+        self._spot_bounds = np.array([(s.x1, s.y1, s.x2, s.y2) for s in self._spots],
+                                     dtype=np.int32).reshape(-1, 4)
+
+    def _visible_spots(self, x0, y0, x1, y1):
+        """与格子范围 [x0, x1] × [y0, y1] 相交的车位"""
+        b = self._spot_bounds
+        mask = (b[:, 0] <= x1) & (b[:, 2] > x0) & (b[:, 1] <= y1) & (b[:, 3] > y0)
+        return [self._spots[i] for i in np.flatnonzero(mask)]
+
+    def _moving_vehicles(self, x0, y0, x1, y1):
+        """坐标位于格子范围 [x0, x1] × [y0, y1] 内、正在行驶（entering/exiting）的车辆"""
+        vehicles = self.simulation.vehicles
+        if self.simulation.engine == "fleet":
+            n = vehicles.size
+            x, y, state = vehicles.x[:n], vehicles.y[:n], vehicles.state[:n]
+            mask = (((state == STATE_ENTERING) | (state == STATE_EXITING))
+                    & (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+            return [FleetVehicleView(vehicles, vid) for vid in vehicles.ids[:n][mask].tolist()]
+        return [v for v in vehicles
+                if v.state in ("entering", "exiting")
+                and x0 <= v.position[0] <= x1 and y0 <= v.position[1] <= y1]
+
+    def update_dirty(self):
+        """
+        根据模拟上报的脏区域发起局部重绘；没有任何变化时跳过本帧。
+        地图本身变化（背景需重建）时整体重绘。
+        """
+        cells, spots = self.simulation.consume_dirty()
+        if self._background_version != self.simulation.map_version:
+            self.update()
+            return
+        if self.show_overlay:
+            self.update(self._overlay_rect)  # 叠加层每帧刷新
+        if not cells and not spots:
+            return
+
+        cs = self.cell_size
+        # 车辆最大占 4×4 格，并有最多 5 像素的左/上渲染偏移，按此外扩
+        for x, y in cells:
+            self.update(QRect(x * cs - 5, y * cs - 5, 4 * cs + 5, 4 * cs + 5))
+        for spot in spots:
+            self.update(QRect(spot.x1 * cs, spot.y1 * cs,
+                              (spot.x2 - spot.x1) * cs, (spot.y2 - spot.y1) * cs))
+
     def paintEvent(self, event):
+        prof = self.simulation.profiler
+        if prof is not None:
+            start = perf_counter_ns()
+        if self._background_version != self.simulation.map_version:
+            self._build_background()
+
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
 
-        color_map = {
-            "R": QColor(128, 128, 128),  # 道路
-            "B": QColor(0, 0, 0),        # 建筑
-            "S": QColor(255, 255, 255),  # 空闲区
-            "C": QColor(0, 0, 255),      # 充电桩
-            "G": QColor(255, 165, 0)     # 大门
-        }
+        # 绘制地图背景（缓存的静态层，只贴需要重绘的部分）
+        rect = event.rect()
+        painter.drawPixmap(rect, self._background, rect)
 
-        rows, cols = self.map_data.shape
+        painter.setRenderHint(QPainter.Antialiasing)
 
-        # 绘制地图背景
-        for r in range(rows):
-            for c in range(cols):
-                cell = self.map_data[r, c]
-                painter.setBrush(color_map.get(cell, QColor(200, 200, 200)))
-                painter.setPen(Qt.NoPen)
-                painter.drawRect(
-                    c * self.cell_size,
-                    r * self.cell_size,
-                    self.cell_size,
-                    self.cell_size
-                )
-
-        # 绘制车位（若覆盖大门则跳过）
-        for spot in self.simulation.get_parking_spots():
-            if self.map_data[spot.y1, spot.x1] == "G":
-                continue
+        # 只绘制与重绘区域相交的对象：重绘区域换算为格子范围（含两端）
+        cs = self.cell_size
+        x0, y0 = rect.left() // cs, rect.top() // cs
+        x1, y1 = rect.right() // cs, rect.bottom() // cs
+
+        # 绘制车位（覆盖大门的车位已在重建背景时剔除）
+        painter.setPen(Qt.NoPen)
+        for spot in self._visible_spots(x0, y0, x1, y1):
             color = QColor(0, 255, 0) if not spot.is_occupied else QColor(255, 0, 0)
             painter.setBrush(color)
-            painter.setPen(Qt.NoPen)
 
-            x_pix = spot.x1 * self.cell_size
-            y_pix = spot.y1 * self.cell_size
-            w_pix = (spot.x2 - spot.x1) * self.cell_size
-            h_pix = (spot.y2 - spot.y1) * self.cell_size
+            x_pix = spot.x1 * cs
+            y_pix = spot.y1 * cs
+            w_pix = (spot.x2 - spot.x1) * cs
+            h_pix = (spot.y2 - spot.y1) * cs
             painter.drawRect(x_pix, y_pix, w_pix, h_pix)
 
-        # 绘制车辆（仅 entering/exiting）
-        for v in self.simulation.vehicles:
-            if v.state in ("entering", "exiting"):
-                painter.setPen(Qt.NoPen)
-                painter.setBrush(QColor(128, 0, 128))
-
-                orientation = v.get_current_orientation()
-                if orientation == "horizontal":
-                    w_cells, h_cells = 4, 2
-                else:
-                    w_cells, h_cells = 2, 4
-
-                x_pix = v.position[0] * self.cell_size
-                y_pix = v.position[1] * self.cell_size
-
-                # 根据车辆 road_side 做微调
-                dx, dy = v.get_render_offset()
-                x_pix += dx
-                y_pix += dy
-
-                painter.drawRect(
-                    x_pix,
-                    y_pix,
-                    w_cells * self.cell_size,
-                    h_cells * self.cell_size
-                )
-
-                # 如需调试，可在图上绘制文字
-                # debug_str = v.get_debug_info()
-                # painter.setPen(Qt.black)
-                # painter.drawText(x_pix, y_pix, debug_str)
+        # 绘制车辆（仅 entering/exiting）。车辆最大占 4×4 格，并有最多 5 像素（1 格）的左/上渲染偏移，
+        # 坐标在重绘区域左/上 4 格、右/下 1 格以内的车辆都可能与之相交
+        painter.setBrush(QColor(128, 0, 128))
+        for v in self._moving_vehicles(x0 - 4, y0 - 4, x1 + 1, y1 + 1):
+            orientation = v.get_current_orientation()
+            if orientation == "horizontal":
+                w_cells, h_cells = 4, 2
+            else:
+                w_cells, h_cells = 2, 4
+
+            x_pix = v.position[0] * cs
+            y_pix = v.position[1] * cs
+
+            # 根据车辆 road_side 做微调
+            dx, dy = v.get_render_offset()
+            x_pix += dx
+            y_pix += dy
+
+            painter.drawRect(x_pix, y_pix, w_cells * cs, h_cells * cs)
+
+            # 如需调试，可在图上绘制文字
+            # debug_str = v.get_debug_info()
+            # painter.setPen(Qt.black)
+            # painter.drawText(x_pix, y_pix, debug_str)
 
         # 绘制充电机器人
+        painter.setBrush(QColor(255, 215, 0))  # 黄色表示机器人
         for robot in self.simulation.robots:
-            x_pix = robot.position[0] * self.cell_size
-            y_pix = robot.position[1] * self.cell_size
-            painter.setBrush(QColor(255, 215, 0))  # 黄色表示机器人
-            painter.drawRect(x_pix, y_pix, self.cell_size, self.cell_size)
+            x, y = robot.position
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                painter.drawRect(x * cs, y * cs, cs, cs)
+
+        if prof is not None:
+            if self.show_overlay:
+                self._draw_overlay(painter, prof)
+            prof.record(PHASE_RENDER, perf_counter_ns() - start)
+
+    def _draw_overlay(self, painter, prof):
+        """左上角半透明底板上逐行显示各阶段耗时百分位数和实体数量"""
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 160))
+        painter.drawRect(self._overlay_rect)
+        painter.setPen(QColor(255, 255, 255))
+        painter.setFont(QFont("Monospace", 8))
+        for i, line in enumerate(prof.summary_lines()):
+            painter.drawText(6, OVERLAY_LINE_HEIGHT * (i + 1), line)
+
+    def toggle_overlay(self):
+        """开关耗时剖析叠加层，首次打开时为模拟接入 Profiler"""
+        if self.simulation.profiler is None:
+            self.simulation.profiler = Profiler()
+        self.show_overlay = not self.show_overlay
+        self.update(self._overlay_rect)
 
 
 class ParkSimulationWindow(QMainWindow):
-    def __init__(self, simulation):
+    def __init__(self, simulation, profile=False):
+        """
+        :param profile: 是否在启动时打开耗时剖析叠加层（运行中按 P 键开关）
+        """
         super().__init__()
         self.setWindowTitle("园区仿真 —— 内外车道顺逆时针（自定义渲染偏移）")
         layout = QVBoxLayout()
@@ -124,13 +227,21 @@ class ParkSimulationWindow(QMainWindow):
         self.timer = QTimer()
         self.timer.timeout.connect(self.on_timer)
         self.timer.start(100)
+        if profile:
+            self.renderer.toggle_overlay()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_P:
+            self.renderer.toggle_overlay()
+        else:
+            super().keyPressEvent(event)
 
     def on_timer(self):
         self.renderer.simulation.update()
-        self.renderer.update()
+        self.renderer.update_dirty()
 
-def run_gui(simulation):
+def run_gui(simulation, profile=False):
     app = QApplication(sys.argv)
-    window = ParkSimulationWindow(simulation)
+    window = ParkSimulationWindow(simulation, profile=profile)
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -11,21 +11,107 @@
     - 车辆充电完成后离开，释放车位
 -------------------------------------------------
 """
+import math
 import numpy as np
-import random
 
+from config import CELL_FREE, CELL_ROAD, CELL_BUILDING, CELL_STATION, CELL_GATE, CELL_CHARS
 from models.parking_spot import ParkingSpot
 from models.vehicle import Vehicle
+from models.fleet import VehicleFleet, FleetVehicleView, STATE_PARKED
 from models.charging_robot import ChargingRobot
+from models.charging_station import ChargingStation
+from models.road_graph import RoadGraph
+from models.road_router import RoadRouter
+from models.route import PathRoute
+from models.spot_pool import FreeSpotPool
+from models.event_queue import EventQueue
+from models.charging_queue import ChargingDemandQueue
+from models.scheduler import optimal_assignment
+from models.spatial_index import SpatialGrid
+from models.grid_planner import GridPlanner
+from models.charging_curve import DEFAULT_CURVE, make_curve
+from models.arrivals import ArrivalGenerator
+from utils.logger import EVENT_SPAWN, EVENT_PARK, EVENT_DEPART, EVENT_ROBOT_MOVE
+from utils.profiler import PHASE_SPAWN, PHASE_VEHICLES, PHASE_SCHEDULING, PHASE_ROBOTS
+
+# 离散事件模式下同一时刻内的处理阶段（即事件优先级），与逐步模式一步内的顺序一致：
+# 刷新车辆 -> 车辆状态切换（按车辆编号）-> 充电调度 -> 机器人更新（按机器人编号）
+STAGE_SPAWN = 0
+STAGE_VEHICLES = 1
+STAGE_DISPATCH = 2
+STAGE_ROBOTS = 3
+STAGE_DONE = 4  # 本时刻的事件已全部处理
+EVENT_STAGES = {"spawn": STAGE_SPAWN, "arrive": STAGE_VEHICLES, "depart": STAGE_VEHICLES, "exit": STAGE_VEHICLES,
+                "dispatch": STAGE_DISPATCH, "robot": STAGE_ROBOTS}
+
 
 class Simulation:
-    def __init__(self, grid_size=(50, 50), num_buildings=2, num_stations=2, num_gates=3):
+    def __init__(self, grid_size=(50, 50), num_buildings=2, num_stations=2, num_gates=3, engine="object",
+                 mode="tick", station_slots=1, station_policy="fifo", seed=None, num_robots=3, layout=None,
+                 traffic="free", cell_capacity=1):
+        """
+        :param layout: 现成的园区布局（布局文件见 models/layout.py，或从快照恢复），给出时不再随机生成：
+                       {"map": (高, 宽) 编码地图, "gates": [...], "charging_stations": [...],
+                        可选 "parking_spots": [(x1, y1, x2, y2, 是否水平), ...], "ring": 环路外边界 (x0, y0, x1, y1),
+                        "building_positions": [...]}；地图尺寸以 layout 为准，忽略 grid_size
+        :param num_robots: 充电机器人数量
+        :param seed: 随机种子。由它派生布局、车辆到达、车辆属性、调度四路相互独立的 NumPy 随机数流，
+                     相同种子的运行完全可复现；None 表示每次运行不同
+        :param station_slots: 每个充电站可同时为多少个机器人补电
+        :param station_policy: 充电站排队规则，"fifo"（先到先补）或 "priority"（电量低者优先）
+        :param engine: 车辆引擎，"object" 为逐辆 Vehicle 对象更新，
+                       "fleet" 为 NumPy 结构化数组的向量化车队（适合数万辆车的大规模模拟）
+        :param mode: 推进方式，"tick" 为逐步推进（每次 update 时间 +1），
+                     "event" 为离散事件模式（每次 update 直接跳到下一个事件，仅支持 object 引擎）
+        :param traffic: 交通模型，"free" 为车辆互不影响，
+                        "queue" 为带拥堵的模型：道路格子有容量，前方格子已满时车辆原地排队（见 models/road_graph.py），
+                        仅支持逐步推进
+        :param cell_capacity: 拥堵模型下每个道路格子可同时容纳的车辆数
+        """
+        if engine not in ("object", "fleet"):
+            raise ValueError(f"unknown engine: {engine}")
+        if mode not in ("tick", "event"):
+            raise ValueError(f"unknown mode: {mode}")
+        if mode == "event" and engine != "object":
+            raise ValueError("event mode requires the object engine")
+        if traffic not in ("free", "queue"):
+            raise ValueError(f"unknown traffic model: {traffic}")
+        if traffic == "queue" and mode != "tick":
+            raise ValueError("queue traffic requires tick mode")
+        self.engine = engine
+        self.seed = seed
+        # 每个子系统一路独立的随机数流：改变某一子系统的抽样次数不会影响其它子系统的随机序列
+        layout_seq, arrival_seq, vehicle_seq, scheduling_seq = np.random.SeedSequence(seed).spawn(4)
+        self.layout_rng = np.random.default_rng(layout_seq)          # 大门、建筑、充电站布局
+        self.arrival_rng = np.random.default_rng(arrival_seq)        # 车辆到达、目标车位、停车时长
+        self.vehicle_rng = np.random.default_rng(vehicle_seq)        # 电量、目标电量、行驶方向、车型
+        self.scheduling_rng = np.random.default_rng(scheduling_seq)  # 预留给带随机性的调度策略
+        self.mode = mode
+        if layout is not None:
+            rows, cols = np.shape(layout["map"])
+            grid_size = (cols, rows)
+        self.events = EventQueue()
+        self._events_started = False
+        self._robot_events = {}  # 机器人 -> (事件令牌, 上次推进到的时刻)
+        self._stage = (0, STAGE_DONE, 0)  # 正在处理的 (时刻, 阶段, 机器人编号)
         self.grid_size = grid_size
         self.num_buildings = num_buildings
         self.num_stations = num_stations
         self.num_gates = num_gates
+        self.station_slots = station_slots
+        self.charging_curves = [DEFAULT_CURVE]  # 车型充电曲线，刷新车辆时随机选用
+        self.station_policy = station_policy
 
-        self.map = np.full(self.grid_size, "S")
+        # 地图以 uint8 编码存储（见 config.py），形状为 (高, 宽)，按 map[y, x] 访问，
+        # 并维护可行驶（车辆）/可通行（机器人）/空闲三个布尔掩码
+        w, h = self.grid_size
+        self.map = np.full((h, w), CELL_FREE, dtype=np.uint8)
+        self.driveable = np.zeros((h, w), dtype=bool)
+        self.free = np.ones((h, w), dtype=bool)
+        self.map_version = 0  # 地图每次修改后递增，用于使寻路缓存失效
+        self._router = None   # 道路寻路服务，首次使用时创建（见 router）
+        self._map_chars = None
+        self._map_chars_version = None
         self.parking_spots = []
         self.gates = []
         self.vehicles = []
@@ -33,38 +119,107 @@ class Simulation:
         self.building_positions = []
 
         self.global_time = 0
-        self.spawn_interval = 10
-        self.gate_spawn_prob = [0.5, 0.3, 0.2]
+        # 脏区域跟踪（供渲染器增量重绘），默认关闭，无界面运行时零开销
+        self.track_dirty = False
+        self.dirty_cells = set()   # 本帧需重绘的格子（车辆/机器人新旧位置）
+        self.dirty_spots = set()   # 本帧占用状态发生变化的车位
+        # 事件日志（utils/logger.py 的 EventLog），默认关闭；开启后记录刷新、停车、充电、离场、机器人移动等事件
+        self.telemetry = None
+        # 耗时剖析（utils/profiler.py 的 Profiler），默认关闭；开启后按阶段记录 update 和寻路的耗时
+        self.profiler = None
+        self.total_spawned = 0  # 累计进入园区的车辆数
+        self.total_exited = 0   # 累计离开园区的车辆数
+        self.total_parked = 0   # 累计停入车位的车辆数
+        # 通行耗时：进场为刷新到停入车位，离场为停够时长到驶出大门（含排队等待）
+        self.entry_time_total = 0
+        self.exit_time_total = 0
+        # 到达生成器按块预先抽样到达；spawn_interval / gate_spawn_prob 修改后已抽样的块立即作废重抽
+        self.arrivals = ArrivalGenerator(self)
+        self._spawn_interval = 10
+        self._gate_spawn_prob = (0.5, 0.3, 0.2)
 
         self.road_offset = 4
         self.road_width = 4  # 道路宽度4格（内外各2格）
-        self._generate_inner_ring_roads()
-        self._generate_parking_spots()
-        self._generate_gates()
-        self._generate_buildings()
-        self._generate_charging_stations()
+        # 环路外边界 [x0, x1) × [y0, y1)，车道、生成点、车位贴靠点都由它推导
+        self.ring = (self.road_offset, self.road_offset, w - self.road_offset, h - self.road_offset)
+        if layout is None:
+            self._generate_inner_ring_roads()
+            self._generate_parking_spots()
+            self._generate_gates()
+            # 道路和大门铺好后刷新掩码，建筑和充电桩在空闲掩码上选址并同步更新它
+            self.mark_map_changed()
+            self._generate_buildings()
+            self._generate_charging_stations()
+        else:
+            self._apply_layout(layout)
+        self.mark_map_changed()
+        self._build_lane_index()
+        # 布局的道路不能承载默认环路车道时（如从文件加载的真实园区），车辆改为沿道路网络的最短路行驶
+        self.road_routing = self._lanes_off_road()
+        if self.road_routing and engine == "fleet":
+            raise ValueError("the fleet engine needs a layout whose roads carry the ring lanes")
+        self._build_spot_index()
+
+        # 拥堵模型：道路编译为带容量和占用的节点图，None 表示车辆互不阻挡
+        self.traffic = traffic
+        self.cell_capacity = cell_capacity
+        # 沿道路网络行驶时双向车流共用格子，按行驶方向分槽计容量
+        self.road_graph = (RoadGraph(self, cell_capacity, directional=self.road_routing)
+                           if traffic == "queue" else None)
+
+        if self.engine == "fleet":
+            # 车队模式下 vehicles 是 VehicleFleet，迭代时得到与 Vehicle 接口一致的轻量视图
+            self.vehicles = VehicleFleet(self)
 
         # 假设在模拟初始化时添加机器人到指定的初始位置
+        # 沿对角线每隔 10 格放置一个（前三个即原先的 (10, 10)、(20, 20)、(30, 30)）
         self.robots = [
-            ChargingRobot(robot_id=1, position=(10, 10), station_position=self.charging_stations),
-            ChargingRobot(robot_id=2, position=(20, 20), station_position=self.charging_stations),
-            ChargingRobot(robot_id=2, position=(30, 30), station_position=self.charging_stations),
+            ChargingRobot(robot_id=i + 1, position=((10 + 10 * i) % w, (10 + 10 * i) % h),
+                          station_position=self.charging_stations)
+            for i in range(num_robots)
         ]
+        # 机器人避障寻路服务：绕开建筑，按 (起点, 终点) 缓存压缩路点
+        self.planner = GridPlanner(self)
+        for robot in self.robots:
+            robot.planner = self.planner
+            robot.simulation = self
+
+        # 充电站：坐标 -> ChargingStation，车位有限，满员时机器人在站内排队
+        self.stations = {
+            pos: ChargingStation(i, pos, slots=station_slots, queue_policy=station_policy)
+            for i, pos in enumerate(self.charging_stations)
+        }
+
+        # 充电调度：车辆停入车位时进入需求队列，每隔 dispatch_interval 为空闲机器人分配一次任务
+        self.dispatch_interval = 5
+        self.dispatch_candidates = 4  # "distance" 策略下每个空闲机器人的候选车辆数
+        self.charging_queue = ChargingDemandQueue(self, strategy="distance")
+        self._serving = {}  # 车辆 -> 正在为其服务的机器人
+        self._dispatch_pending = False
+
+        # 空间索引：机器人（随移动增量更新）、待充电的停放车辆、充电站
+        self.robot_index = SpatialGrid(self.grid_size)
+        for robot in self.robots:
+            self.robot_index.insert(robot, robot.position)
+        self.waiting_index = SpatialGrid(self.grid_size)
+        self.station_index = SpatialGrid(self.grid_size)
+        for station in self.charging_stations:
+            self.station_index.insert(station, station)
 
     def _generate_inner_ring_roads(self):
         w, h = self.grid_size
         rw = self.road_offset
         # 四边铺设4格宽的道路
-        self.map[rw:h-rw, rw:rw+4] = "R"
-        self.map[rw:h-rw, w-rw-4:w-rw] = "R"
-        self.map[rw:rw+4, rw:w-rw] = "R"
-        self.map[h-rw-4:h-rw, rw:w-rw] = "R"
+        self.map[rw:h-rw, rw:rw+4] = CELL_ROAD
+        self.map[rw:h-rw, w-rw-4:w-rw] = CELL_ROAD
+        self.map[rw:rw+4, rw:w-rw] = CELL_ROAD
+        self.map[h-rw-4:h-rw, rw:w-rw] = CELL_ROAD
 
         # 四角恢复为空闲区
-        self.map[:rw, :rw] = "S"
-        self.map[:rw, w-rw:] = "S"
-        self.map[h-rw:, :rw] = "S"
-        self.map[h-rw:, w-rw:] = "S"
+        self.map[:rw, :rw] = CELL_FREE
+        self.map[:rw, w-rw:] = CELL_FREE
+        self.map[h-rw:, :rw] = CELL_FREE
+        self.map[h-rw:, w-rw:] = CELL_FREE
 
     def _generate_parking_spots(self):
         w, h = self.grid_size
@@ -98,9 +253,10 @@ class Simulation:
         if len(right_spots) >= 3:
             candidates.append(('right', right_spots))
 
-        chosen = random.sample(candidates, min(len(candidates), self.num_gates))
-        for edge, spots in chosen:
-            start_idx = random.randint(0, len(spots) - 3)
+        rng = self.layout_rng
+        chosen = rng.choice(len(candidates), size=min(len(candidates), self.num_gates), replace=False)
+        for edge, spots in (candidates[i] for i in chosen):
+            start_idx = int(rng.integers(0, len(spots) - 2))
             selected = spots[start_idx:start_idx+3]
             if edge in ('top', 'bottom'):
                 x1 = selected[0].x1
@@ -112,118 +268,240 @@ class Simulation:
                 y2 = selected[-1].y2
                 x1 = selected[0].x1
                 x2 = selected[0].x2
-            self.map[y1:y2, x1:x2] = "G"
+            self.map[y1:y2, x1:x2] = CELL_GATE
             self.gates.append((x1, y1, x2, y2))
 
     def _generate_buildings(self):
         w, h = self.grid_size
+        rng = self.layout_rng
         for _ in range(self.num_buildings):
-            bx = random.randint(self.road_offset+5, w - self.road_offset - 10)
-            by = random.randint(self.road_offset+5, h - self.road_offset - 10)
-            bw = random.randint(3, 6)
-            bh = random.randint(3, 6)
-            if np.all(self.map[by:by+bh, bx:bx+bw] == "S"):
-                self.map[by:by+bh, bx:bx+bw] = "B"
-                 # 将建筑覆盖的所有坐标点存储到列表中
-                for y in range(by, by + bh):
-                    for x in range(bx, bx + bw):
-                        self.building_positions.append((x, y))
+            bx = int(rng.integers(self.road_offset+5, w - self.road_offset - 9))
+            by = int(rng.integers(self.road_offset+5, h - self.road_offset - 9))
+            bw = int(rng.integers(3, 7))
+            bh = int(rng.integers(3, 7))
+            if self.free[by:by+bh, bx:bx+bw].all():
+                self.map[by:by+bh, bx:bx+bw] = CELL_BUILDING
+                self.free[by:by+bh, bx:bx+bw] = False
+                # 将建筑覆盖的所有坐标点存储到列表中（按行优先一次生成）
+                ys, xs = np.mgrid[by:by + bh, bx:bx + bw]
+                self.building_positions.extend(zip(xs.ravel().tolist(), ys.ravel().tolist()))
+
     def _generate_charging_stations(self):
-        for _ in range(self.num_stations):
-            ys, xs = np.where(self.map == "S")
-            if len(xs) > 0:
-                idx = random.randint(0, len(xs)-1)
-                self.map[ys[idx], xs[idx]] = "C"
-                self.charging_stations = list(zip(xs, ys))  # 将坐标组合成 (x, y) 的形式
-    # ====== BFS 寻路（仅走 'R' 或 'G'）=====
+        # 从空闲掩码一次性取出所有空闲格子，再无放回地抽取充电桩位置
+        ys, xs = np.nonzero(self.free)
+        count = min(self.num_stations, len(xs))
+        for idx in self.layout_rng.choice(len(xs), size=count, replace=False):
+            x, y = int(xs[idx]), int(ys[idx])
+            self.map[y, x] = CELL_STATION
+            self.free[y, x] = False
+            self.charging_stations.append((x, y))  # 以 (x, y) 的形式记录每个充电桩
+
+    def _apply_layout(self, layout):
+        # 直接使用给定布局；未给出车位和环路时按默认规则由地图尺寸生成
+        self.map = np.array(layout["map"], dtype=np.uint8)
+        if layout.get("ring") is not None:
+            self.ring = tuple(int(v) for v in layout["ring"])
+        if layout.get("parking_spots") is not None:
+            self.parking_spots = [ParkingSpot(x1, y1, x2, y2, is_horizontal=bool(hz))
+                                  for x1, y1, x2, y2, hz in np.asarray(layout["parking_spots"]).tolist()]
+        else:
+            self._generate_parking_spots()
+        self.gates = [tuple(int(v) for v in gate) for gate in layout["gates"]]
+        self.charging_stations = [tuple(int(v) for v in pos) for pos in layout["charging_stations"]]
+        if layout.get("building_positions") is not None:
+            self.building_positions = [tuple(int(v) for v in pos) for pos in layout["building_positions"]]
+        else:
+            ys, xs = np.nonzero(self.map == CELL_BUILDING)
+            self.building_positions = list(zip(xs.tolist(), ys.tolist()))
+        self.num_gates = len(self.gates)
+        self.num_stations = len(self.charging_stations)
+
+    def mark_map_changed(self):
+        """地图被修改后调用：刷新布尔掩码，寻路等缓存会在下次查询时重建"""
+        self.driveable = (self.map == CELL_ROAD) | (self.map == CELL_GATE)
+        self.passable = self.map != CELL_BUILDING
+        self.free = self.map == CELL_FREE
+        self.map_version += 1
+
+    def get_driveable_mask(self):
+        """返回可行驶（道路或大门）格子的布尔掩码，形状与 map 相同"""
+        return self.driveable
+
+    def get_passable_mask(self):
+        """返回充电机器人可通行（非建筑）格子的布尔掩码，形状与 map 相同"""
+        return self.passable
+
+    # ====== 道路网络寻路 ======
+    @property
+    def router(self):
+        """道路寻路服务 (RoadRouter)：首次使用时创建并预计算各大门生成点的最短路树，地图修改后自动重建"""
+        if self._router is None:
+            router = self._router = RoadRouter(self)
+            sources = [router.snap(self.get_spawn_position_for_gate(g)) for g in self.gates]
+            router.precompute([pos for pos in sources if pos is not None])
+        return self._router
+
+    def _lanes_off_road(self):
+        # 两条车道循环中有不在道路/大门上的格子
+        cells = np.array(self.lane_loops["inner"] + self.lane_loops["outer"], dtype=np.int64).reshape(-1, 2)
+        h, w = self.driveable.shape
+        inside = (cells[:, 0] >= 0) & (cells[:, 0] < w) & (cells[:, 1] >= 0) & (cells[:, 1] < h)
+        return not inside.all() or not self.driveable[cells[:, 1], cells[:, 0]].all()
+
     def _compute_path_on_road(self, start, end):
-        w, h = self.grid_size
-        if not self._is_driveable(start) or not self._is_driveable(end):
-            return None
-
-        from collections import deque
-        queue = deque()
-        visited = set()
-        parent = {}
-        queue.append(start)
-        visited.add(start)
-        directions = [(0,1), (0,-1), (1,0), (-1,0)]
-        found = False
-
-        while queue:
-            cx, cy = queue.popleft()
-            if (cx, cy) == end:
-                found = True
-                break
-            for dx, dy in directions:
-                nx, ny = cx+dx, cy+dy
-                if 0 <= nx < w and 0 <= ny < h:
-                    if (nx, ny) not in visited and self._is_driveable((nx, ny)):
-                        visited.add((nx, ny))
-                        parent[(nx, ny)] = (cx, cy)
-                        queue.append((nx, ny))
-
-        if not found:
-            return None
-
-        # 回溯
-        path = []
-        cur = end
-        while cur != start:
-            path.append(cur)
-            cur = parent[cur]
-        path.reverse()
-        return path
-
-    def _is_driveable(self, pos):
-        x, y = pos
-        if x < 0 or x >= self.grid_size[0] or y < 0 or y >= self.grid_size[1]:
-            return False
-        cell = self.map[y, x]
-        return cell in ("R", "G")
+        # 由 RoadRouter 的缓存最短路树回答，不可达时返回 None
+        return self.router.path(start, end)
+
+    def road_route(self, start, end):
+        """
+        道路网络模式下车辆从 start 到 end 的路线，两端先贴靠到最近的可行驶格子。
+        与车道路线一致，第 0 步为起点所在格子；不可达时路线只含起点。
+        """
+        start, end = self.router.snap(start), self.router.snap(end)
+        path = self._compute_path_on_road(start, end)
+        return PathRoute([start] + (path or []))
 
     # ====== 内道和外道车道循环 ======
-    def get_inner_loop(self):
+    def _compute_inner_loop(self):
         """
-        内道（顺时针车辆走），位于靠内侧的 2 像素：
-        上边：y = road_offset+3
-        右边：x = w-road_offset-3
-        下边：y = h-road_offset-3
-        左边：x = road_offset+3
+        内道（顺时针车辆走），位于环路靠内侧的 2 像素（环路外边界为 ring = (x0, y0, x1, y1)）：
+        上边：y = y0+3
+        右边：x = x1-3
+        下边：y = y1-3
+        左边：x = x0+3
         顺时针顺序：上 -> 右 -> 下 -> 左
+        四条边首尾相接成一个矩形，每个格子只出现一次、路线不自交
+        （拐角处重复或交叉的格子在拥堵模型下会让几辆车互相等待而死锁）
         """
-        w, h = self.grid_size
-        rw = self.road_offset
+        x0, y0, x1, y1 = self.ring
 
-        top_inner = [(x, rw+3) for x in range(rw+2, w-rw-1)]
-        right_inner = [(w-rw-3, y) for y in range(rw+2, h-rw-1)]
-        bottom_inner = [(x, h-rw-3) for x in range(w-rw-2, rw+1, -1)]
-        left_inner = [(rw+3, y) for y in range(h-rw-2, rw+1, -1)]
+        top_inner = [(x, y0+3) for x in range(x0+3, x1-3)]
+        right_inner = [(x1-3, y) for y in range(y0+3, y1-3)]
+        bottom_inner = [(x, y1-3) for x in range(x1-3, x0+3, -1)]
+        left_inner = [(x0+3, y) for y in range(y1-3, y0+3, -1)]
 
         return top_inner + right_inner + bottom_inner + left_inner
 
-    def get_outer_loop(self):
+    def _compute_outer_loop(self):
         """
-        外道（逆时针车辆走），位于靠外侧的 2 像素：
-        上边：y = road_offset+1
-        左边：x = road_offset+1
-        下边：y = h-road_offset-1
-        右边：x = w-road_offset-1
+        外道（逆时针车辆走），位于环路靠外侧的 2 像素：
+        上边：y = y0+1
+        左边：x = x0+1
+        下边：y = y1-1
+        右边：x = x1-1
         逆时针顺序：上(右到左) -> 左(上到下) -> 下(左到右) -> 右(下到上)
         """
-        w, h = self.grid_size
-        rw = self.road_offset
+        x0, y0, x1, y1 = self.ring
 
-        top_ccw = [(x, rw+1) for x in range(w-rw-2, rw+1, -1)]
-        left_ccw = [(rw+1, y) for y in range(rw+2, h-rw-1)]
-        bottom_ccw = [(x, h-rw-1) for x in range(rw+2, w-rw-1)]
-        right_ccw = [(w-rw-1, y) for y in range(h-rw-2, rw+1, -1)]
+        top_ccw = [(x, y0+1) for x in range(x1-2, x0+1, -1)]
+        left_ccw = [(x0+1, y) for y in range(y0+2, y1-1)]
+        bottom_ccw = [(x, y1-1) for x in range(x0+2, x1-1)]
+        right_ccw = [(x1-1, y) for y in range(y1-2, y0+1, -1)]
 
         return top_ccw + left_ccw + bottom_ccw + right_ccw
 
+    def _build_lane_index(self):
+        """
+        布局生成后一次性构建两条车道循环及其索引：
+        - lane_loops：车道 id -> 坐标列表（所有车辆共享，不再每次重建）
+        - lane_cell_index：车道 id -> {坐标: 在循环中的下标}
+        - nearest_lane：车道 id -> {位置: 最近车道点下标}，预先覆盖所有车位邻近位置和大门生成点
+        """
+        self.lane_loops = {
+            "inner": self._compute_inner_loop(),
+            "outer": self._compute_outer_loop(),
+        }
+        self.lane_cell_index = {}
+        self.nearest_lane = {}
+        self._lane_arrays = {}
+        for lane_id, loop in self.lane_loops.items():
+            index = {}
+            for i, cell in enumerate(loop):
+                index.setdefault(cell, i)
+            self.lane_cell_index[lane_id] = index
+            self.nearest_lane[lane_id] = {}
+            self._lane_arrays[lane_id] = np.array(loop, dtype=np.float64).reshape(-1, 2)
+
+        key_positions = [self.get_parking_adjacent_position(s) for s in self.parking_spots]
+        key_positions += [self.get_spawn_position_for_gate(g) for g in self.gates]
+        if key_positions:
+            points = np.array(key_positions, dtype=np.int32)
+            for lane_id, arr in self._lane_arrays.items():
+                if len(arr) == 0:
+                    continue
+                # 向量化计算关键位置到车道点的距离，argmin 与 min() 一样取首个最小值；
+                # 坐标都是整数，比较距离平方即可（结果与 hypot 相同且没有舍入误差）；
+                # 按块计算，大地图上距离矩阵的内存占用有上限
+                lane = arr.astype(np.int32)
+                chunk = max(1, (1 << 22) // len(lane))
+                nearest = np.concatenate([
+                    ((block[:, None, 0] - lane[None, :, 0]) ** 2
+                     + (block[:, None, 1] - lane[None, :, 1]) ** 2).argmin(axis=1)
+                    for block in (points[i:i + chunk] for i in range(0, len(points), chunk))
+                ])
+                table = self.nearest_lane[lane_id]
+                for pos, idx in zip(key_positions, nearest.tolist()):
+                    table[pos] = idx
+
+    def _build_spot_index(self):
+        """
+        构建车位索引：
+        - spot_by_adjacent：车位邻近道路位置 -> 车位，停车时 O(1) 绑定
+        - spot_pool：空闲车位池（被大门覆盖的车位不参与分配；道路网络模式下还排除从某个大门无法驶达的车位）
+        - occupied_count：当前已停入车辆的车位数
+        """
+        self.spot_by_adjacent = {}
+        free_spots = []
+        if self.road_routing:
+            router = self.router
+            gates = [router.snap(self.get_spawn_position_for_gate(g)) for g in self.gates]
+        for spot in self.parking_spots:
+            adjacent = self.get_parking_adjacent_position(spot)
+            self.spot_by_adjacent.setdefault(adjacent, spot)
+            if self.map[spot.y1, spot.x1] == CELL_GATE:
+                continue
+            if self.road_routing:
+                target = router.snap(adjacent)
+                if not all(router.reachable(gate, target) for gate in gates):
+                    continue
+            free_spots.append(spot)
+        self.spot_pool = FreeSpotPool(free_spots)
+        self.occupied_count = 0
+
+    def snap_to_lane(self, pos, lane_id):
+        """
+        返回距离 pos 最近的车道点在循环中的下标。
+        车道上的点和预计算过的位置为 O(1) 查表，其余位置计算一次后缓存。
+        :param pos: (x, y) 坐标
+        :param lane_id: "inner"（顺时针）或 "outer"（逆时针）
+        """
+        idx = self.lane_cell_index[lane_id].get(pos)
+        if idx is not None:
+            return idx
+        table = self.nearest_lane[lane_id]
+        idx = table.get(pos)
+        if idx is None:
+            arr = self._lane_arrays[lane_id]
+            idx = int(np.hypot(arr[:, 0] - pos[0], arr[:, 1] - pos[1]).argmin())
+            table[pos] = idx
+        return idx
+
+    def get_lane_loop(self, lane_id):
+        return self.lane_loops[lane_id]
+
+    def get_inner_loop(self):
+        return self.lane_loops["inner"]
+
+    def get_outer_loop(self):
+        return self.lane_loops["outer"]
+
     # ====== 公共方法 ======
     def get_map_data(self):
-        return self.map
+        """返回字符地图（'S'/'R'/'B'/'C'/'G'），供渲染使用；按地图版本缓存"""
+        if self._map_chars_version != self.map_version:
+            self._map_chars = CELL_CHARS[self.map]
+            self._map_chars_version = self.map_version
+        return self._map_chars
 
     def get_parking_spots(self):
         return self.parking_spots
@@ -232,20 +510,36 @@ class Simulation:
         return self.gates
 
     def get_empty_parking_spots(self):
-        return [s for s in self.parking_spots if not s.is_occupied]
+        return self.spot_pool.spots()
+
+    def occupy_spot(self, spot):
+        """车辆抵达车位，标记为已停入"""
+        if not spot.is_occupied:
+            spot.is_occupied = True
+            self.occupied_count += 1
+
+    def release_spot(self, spot):
+        """车辆离场，释放车位回空闲池"""
+        if spot.is_occupied:
+            spot.is_occupied = False
+            self.occupied_count -= 1
+        spot.reserved_by = None
+        if self.map[spot.y1, spot.x1] != CELL_GATE:
+            self.spot_pool.release(spot)
 
     def get_parking_adjacent_position(self, spot):
-        w, h = self.grid_size
+        # 车位在环路外侧时，贴靠点为车位朝向环路一侧的相邻格子
+        x0, y0, x1, y1 = self.ring
         cx = (spot.x1 + spot.x2) // 2
         cy = (spot.y1 + spot.y2) // 2
 
-        if spot.y1 == 0:
+        if spot.y2 <= y0:
             return (cx, spot.y2)
-        elif spot.y2 == h:
+        elif spot.y1 >= y1:
             return (cx, spot.y1 - 1)
-        elif spot.x1 == 0:
+        elif spot.x2 <= x0:
             return (spot.x2, cy)
-        elif spot.x2 == w:
+        elif spot.x1 >= x1:
             return (spot.x1 - 1, cy)
         else:
             return (cx, cy)
@@ -255,56 +549,594 @@ class Simulation:
         返回位于道路中线的生成点，保证车辆可随机贴靠到内道或外道
         """
         x1, y1, x2, y2 = gate
-        w, h = self.grid_size
+        rx0, ry0, rx1, ry1 = self.ring
         cx = (x1 + x2) // 2
         cy = (y1 + y2) // 2
-        rw = self.road_offset
 
-        if y1 == 0:
-            return (cx, rw+2)
-        elif y2 == h:
-            return (cx, h - rw - 2)
-        elif x1 == 0:
-            return (rw+2, cy)
-        elif x2 == w:
-            return (w - rw - 2, cy)
+        if y2 <= ry0:
+            return (cx, ry0 + 2)
+        elif y1 >= ry1:
+            return (cx, ry1 - 2)
+        elif x2 <= rx0:
+            return (rx0 + 2, cy)
+        elif x1 >= rx1:
+            return (rx1 - 2, cy)
         else:
             return (cx, cy)
 
     def update(self):
+        prof = self.profiler
+        if prof is not None:
+            prof.begin_tick()
+        if self.mode == "event":
+            self._update_events()
+            if prof is not None:
+                prof.end_tick(self)
+            return
+
         self.global_time += 1
+        if self.road_graph is not None:
+            self.road_graph.begin_tick()
 
         if self.global_time % self.spawn_interval == 0:
-            for i, gate in enumerate(self.gates):
-                prob = self.gate_spawn_prob[i] if i < len(self.gate_spawn_prob) else 0
-                if random.random() < prob:
-                    spawn_pos = self.get_spawn_position_for_gate(gate)
-                    empties = self.get_empty_parking_spots()
-
-                    if empties:
-                        chosen_spot = random.choice(empties)
-                        target_pos = self.get_parking_adjacent_position(chosen_spot)
-                        parking_time = random.randint(15, 40)
-                        # 备用 BFS (实际会被车辆内部的车道行驶策略覆盖)
-                        route = self._compute_path_on_road(spawn_pos, target_pos)
-                        if not route:
-                            route = []
-
-                        v = Vehicle(
-                            simulation=self,
-                            origin_gate=gate,
-                            spawn_pos=spawn_pos,
-                            target_pos=target_pos,
-                            parking_duration=parking_time,
-                            spawn_time=self.global_time,
-                            route=route
-                        )
-                        self.vehicles.append(v)
-
-        for v in self.vehicles[:]:
+            batch = self.arrivals.take(self.global_time)
+            if batch is not None:
+                self._spawn_batch(batch)
+        if prof is not None:
+            prof.lap(PHASE_SPAWN)
+
+        if self.engine == "fleet":
+            dirty = self.dirty_cells if self.track_dirty else None
+            self.total_exited += self.vehicles.step(self.global_time, dirty)
+        elif self.track_dirty:
+            self._update_entities_tracked()
+        else:
+            for v in self.vehicles:
+                v.update()
+            self._remove_exited()
+        if prof is not None:
+            prof.lap(PHASE_VEHICLES)
+
+        self._update_robots()
+        if prof is not None:
+            prof.end_tick(self)
+
+    def _spawn_batch(self, batch):
+        """
+        按到达批次批量刷新车辆：一次性从空闲车位池随机预订车位（车位不足时多出的车辆不进场），
+        车队模式下整批向量化写入，对象模式下逐辆创建 Vehicle。
+        :return: 新车辆列表（车队模式下为视图）
+        """
+        count = min(len(batch), len(self.spot_pool))
+        if count == 0:
+            return []
+        if count < len(batch):
+            batch = batch.head(count)
+        spots = self.spot_pool.reserve_many(count, self.arrival_rng)
+        curves = self.charging_curves
+        if self.engine == "fleet":
+            vids = self.vehicles.add_many(
+                gate=batch.gate,
+                spots=spots,
+                parking_duration=batch.parking_duration,
+                spawn_time=self.global_time,
+                initial_battery=batch.initial_battery,
+                target_battery=batch.target_battery,
+                clockwise=batch.clockwise,
+                charging_curves=[curves[c] for c in batch.curve.tolist()]
+            )
+            spawned = [FleetVehicleView(self.vehicles, vid) for vid in vids.tolist()]
+            for v, spot in zip(spawned, spots):
+                spot.reserved_by = v
+            if self.telemetry is not None:
+                fleet = self.vehicles
+                rows = slice(fleet.size - count, fleet.size)
+                self.telemetry.emit_many(self.global_time, EVENT_SPAWN, vids, fleet.x[rows], fleet.y[rows],
+                                         fleet.battery[rows], peer=batch.gate)
+        else:
+            spawned = []
+            for i, spot in enumerate(spots):
+                gate = self.gates[batch.gate[i]]
+                v = Vehicle(
+                    simulation=self,
+                    origin_gate=gate,
+                    spawn_pos=self.get_spawn_position_for_gate(gate),
+                    target_pos=self.get_parking_adjacent_position(spot),
+                    parking_duration=int(batch.parking_duration[i]),
+                    spawn_time=self.global_time,
+                    spot=spot,
+                    charging_curve=curves[batch.curve[i]],
+                    initial_battery=int(batch.initial_battery[i]),
+                    target_battery=int(batch.target_battery[i]),
+                    clockwise=bool(batch.clockwise[i]),
+                    vid=self.total_spawned + i
+                )
+                spot.reserved_by = v
+                spawned.append(v)
+                if self.telemetry is not None:
+                    self.telemetry.emit(self.global_time, EVENT_SPAWN, v.vid, v.position[0], v.position[1],
+                                        v.current_battery, int(batch.gate[i]))
+            self.vehicles.extend(spawned)
+        self.total_spawned += count
+        if self.track_dirty:
+            self.dirty_cells.update(v.position for v in spawned)
+        return spawned
+
+    def reseed(self, seed):
+        """
+        由新的种子重新派生车辆到达、车辆属性、调度三路随机数流，布局保持不变。
+        用于从同一个预热快照分叉出多次运行：各次运行的预热过程相同，此后的随机序列不同。
+        """
+        self.seed = seed
+        _, arrival_seq, vehicle_seq, scheduling_seq = np.random.SeedSequence(seed).spawn(4)
+        self.arrival_rng = np.random.default_rng(arrival_seq)
+        self.vehicle_rng = np.random.default_rng(vehicle_seq)
+        self.scheduling_rng = np.random.default_rng(scheduling_seq)
+        self.resample_arrivals()
+
+    @property
+    def spawn_interval(self):
+        """车辆刷新间隔（时间单位）"""
+        return self._spawn_interval
+
+    @spawn_interval.setter
+    def spawn_interval(self, value):
+        if value != self._spawn_interval:
+            self._spawn_interval = value
+            self.resample_arrivals()
+
+    @property
+    def gate_spawn_prob(self):
+        """各大门每个刷新时刻的到达速率（元组，整体赋值才会生效）"""
+        return self._gate_spawn_prob
+
+    @gate_spawn_prob.setter
+    def gate_spawn_prob(self, value):
+        value = tuple(value)
+        if value != self._gate_spawn_prob:
+            self._gate_spawn_prob = value
+            self.resample_arrivals()
+
+    def resample_arrivals(self):
+        """
+        丢弃已预先抽样的到达块，从下一个刷新时刻起按当前的速率、刷新间隔、车型和随机数流重新抽样。
+        离散事件模式下已排定的刷新事件来自旧的抽样块，一并重新排定。
+        """
+        self.arrivals.reset()
+        if self._events_started:
+            self.events.remove_kind("spawn")
+            self._schedule_next_spawn()
+
+    def set_arrival_model(self, model="bernoulli", profile=None):
+        """
+        设置车辆到达模型。
+        :param model: "bernoulli"（每门每刷新时刻最多一辆，概率为 gate_spawn_prob）或
+                      "poisson"（每门每刷新时刻到达数服从均值为 gate_spawn_prob 的泊松分布）
+        :param profile: 时变到达曲线：profile(t) -> 速率系数，或按刷新时刻循环的系数序列
+        """
+        self.arrivals = ArrivalGenerator(self, model=model, profile=profile)
+        self.resample_arrivals()  # 离散事件模式下按新的到达模型重新排定刷新事件
+
+    def set_charging_curves(self, curves):
+        """
+        设置车型充电曲线，刷新的车辆从中随机选用一条。
+        :param curves: ChargingCurve 或曲线描述（如 "cccv"、{"type": "linear", "slope": 0.3}）的列表
+        """
+        self.charging_curves = [make_curve(c) for c in curves] or [DEFAULT_CURVE]
+        self.resample_arrivals()
+
+    def _remove_exited(self):
+        # 一次性过滤掉已离场车辆，避免逐个 list.remove 的 O(n²)
+        remaining = [v for v in self.vehicles if v.state != "exited"]
+        self.total_exited += len(self.vehicles) - len(remaining)
+        self.vehicles = remaining
+
+    def _update_robots(self):
+        prof = self.profiler
+        if self.global_time % self.dispatch_interval == 0:
+            self._dispatch()
+            if prof is not None:
+                prof.lap(PHASE_SCHEDULING)
+        track = self.track_dirty
+        telemetry = self.telemetry
+        for robot in self.robots:
+            old_pos = robot.position
+            robot.update()
+            if robot.position != old_pos:
+                self.robot_index.update(robot, robot.position)
+                if telemetry is not None:
+                    telemetry.emit(self.global_time, EVENT_ROBOT_MOVE, robot.id, robot.position[0], robot.position[1],
+                                   robot.battery_level)
+                if track:
+                    self.dirty_cells.add(old_pos)
+                    self.dirty_cells.add(robot.position)
+        if prof is not None:
+            prof.lap(PHASE_ROBOTS)
+
+    # ====== 充电调度 ======
+    def set_charging_strategy(self, strategy):
+        """切换充电需求队列的排序策略（"distance" / "demand" / "deadline"），已排队车辆按新策略重新入队"""
+        pending = self.charging_queue.pop_batch(len(self.charging_queue))
+        self.charging_queue = ChargingDemandQueue(self, strategy=strategy)
+        for v in pending:
+            self.charging_queue.push(v)
+
+    def on_vehicle_parked(self, vehicle):
+        """车辆停入车位：记录进场耗时，电量未达目标则进入充电需求队列"""
+        self.total_parked += 1
+        self.entry_time_total += self.global_time - vehicle.spawn_time
+        if self.telemetry is not None:
+            x, y = vehicle.position
+            self.telemetry.emit(self.global_time, EVENT_PARK, vehicle.vid, x, y, vehicle.current_battery)
+        if vehicle.current_battery < vehicle.target_battery_level:
+            self.charging_queue.push(vehicle)
+            self.waiting_index.insert(vehicle, vehicle.position)
+            self._request_dispatch()
+
+    def on_vehicle_departed(self, vehicle):
+        """车辆开始离场：移出需求队列，正在为其服务的机器人放弃任务"""
+        if self.telemetry is not None:
+            x, y = vehicle.position
+            self.telemetry.emit(self.global_time, EVENT_DEPART, vehicle.vid, x, y, vehicle.current_battery)
+        queued = vehicle in self.charging_queue
+        self.charging_queue.discard(vehicle)
+        self.waiting_index.remove(vehicle)
+        if queued:
+            self._check_idle_robots()
+        robot = self._serving.pop(vehicle, None)
+        if robot is not None and robot.target_vehicle == vehicle:
+            self.sync_robot(robot)
+            robot.release_target()
+            self._robot_changed(robot)
+            self._request_dispatch()
+
+    def _request_dispatch(self):
+        # 离散事件模式下，按调度节拍排定一次调度事件（已排定则忽略）
+        if self.mode != "event" or self._dispatch_pending:
+            return
+        self._dispatch_pending = True
+        # 与逐步模式一致：调度发生在 dispatch_interval 整数倍的时刻。当前时刻还没到调度阶段时
+        # 可以排在当前时刻，否则最早排在下一时刻，再向上取整到调度节拍
+        time, stage, _ = self._stage
+        earliest = self.global_time if time == self.global_time and stage < STAGE_DISPATCH else self.global_time + 1
+        next_time = -(-earliest // self.dispatch_interval) * self.dispatch_interval
+        self.events.push(next_time, "dispatch", priority=STAGE_DISPATCH)
+
+    def _dispatch(self):
+        """
+        为空闲机器人分配充电任务，未分配的车辆保留在队列中：
+        - 电量不足以完成最小任务的机器人先去补电，不参与分配
+        - "distance" 策略：借助空间索引为每个空闲机器人取最近的若干辆待充电车辆作为候选
+        - 其它策略：从需求队列按优先级取出与空闲机器人数量相同的车辆
+        两种情况都再用全局最优分配决定由哪个机器人服务哪辆车；
+        分到的车辆超出自身电量能力的机器人放弃分配、转去补电。
+        """
+        idle = []
+        for robot in self.robots:
+            if robot.status != "idle":
+                continue
+            if robot.maybe_recharge():
+                self._robot_changed(robot)
+            else:
+                idle.append(robot)
+        if not idle or not self.charging_queue:
+            return
+        if self.charging_queue.strategy == "distance":
+            candidates = {}
+            for robot in idle:
+                for _, vehicle in self.waiting_index.k_nearest(robot.position, self.dispatch_candidates):
+                    candidates[vehicle] = None
+            batch = list(candidates)
+            assignment = self._affordable(optimal_assignment(idle, batch))
+            for vehicle in assignment.values():
+                self.charging_queue.discard(vehicle)
+        else:
+            batch = self.charging_queue.pop_batch(len(idle))
+            assignment = self._affordable(optimal_assignment(idle, batch))
+            assigned = set(assignment.values())
+            for vehicle in batch:
+                if vehicle not in assigned:
+                    self.charging_queue.push(vehicle)
+
+        for robot, vehicle in assignment.items():
+            self.waiting_index.remove(vehicle)
+            self.sync_robot(robot)
+            robot.bind_target_vehicle(vehicle)
+            self._serving[vehicle] = robot
+            self._robot_changed(robot)
+        self._check_idle_robots()
+
+    def _affordable(self, assignment):
+        # 过滤掉机器人电量不足以服务的分配，这些机器人直接去补电
+        accepted = {}
+        for robot, vehicle in assignment.items():
+            if robot.can_serve(vehicle):
+                accepted[robot] = vehicle
+            elif robot.go_recharge():
+                self._robot_changed(robot)
+        return accepted
+
+    def _robot_changed(self, robot):
+        # 机器人状态被外部改变后，离散事件模式下重新排定其事件
+        if self.mode == "event":
+            self.schedule_robot(robot)
+
+    def _check_idle_robots(self):
+        # 离散事件模式下需求队列被清空后，空闲机器人在本步的更新中可能决定趁空闲补电（见 needs_recharge），
+        # 为它们各排定一次补电检查
+        if self.mode == "event" and not self.charging_queue:
+            for robot in self.robots:
+                if robot.status == "idle":
+                    self.schedule_robot(robot)
+
+    def on_robot_job_finished(self, robot, vehicle):
+        """机器人结束车辆任务：未充满且仍停在车位的车辆重新进入需求队列"""
+        if self._serving.get(vehicle) is robot:
+            del self._serving[vehicle]
+        if vehicle.state == "parked" and vehicle.charging_status != "charged":
+            self.charging_queue.push(vehicle)
+            self.waiting_index.insert(vehicle, vehicle.position)
+            self._request_dispatch()
+
+    # ====== 充电站 ======
+    def choose_station(self, robot):
+        """
+        为需要补电的机器人动态选择充电站：行驶距离 + 前方机器人预计占用时间，取最小者。
+        电量不足以到达的充电站不予考虑（都到不了时选最近的）。
+        行驶距离不小于曼哈顿距离，按曼哈顿距离得到的代价下界由小到大检查，
+        下界已不优于当前最佳的充电站不再调用寻路。
+        """
+        x, y = robot.position
+        nearest = robot.nearest_station(robot.position)
+        candidates = []
+        for order, (pos, station) in enumerate(self.stations.items()):
+            straight = abs(pos[0] - x) + abs(pos[1] - y)
+            if pos != nearest and robot.move_cost * straight > robot.battery_level:
+                continue
+            # 已在站内的和正在前往该站的机器人都算在前面
+            ahead = station.load() + station.inbound
+            wait = (ahead // station.slots) * (robot.max_battery / station.charge_rate)
+            candidates.append((straight + wait, order, pos, wait))
+        candidates.sort()
+
+        best, best_key = None, (math.inf, 0)
+        for bound, order, pos, wait in candidates:
+            if bound > best_key[0]:
+                break
+            if (bound, order) >= best_key:
+                continue
+            travel = robot.travel_distance(robot.position, pos)
+            if pos != nearest and robot.move_cost * travel > robot.battery_level:
+                continue
+            key = (travel + wait, order)
+            if key < best_key:
+                best, best_key = pos, key
+        return best
+
+    def head_to_station(self, robot, pos):
+        """机器人出发前往充电站：计入该站的在途机器人数"""
+        self.stations[pos].inbound += 1
+
+    def enter_station(self, robot, pos):
+        """机器人到达充电站：有空位则占用并返回 True，否则排队并返回 False"""
+        station = self.stations[pos]
+        station.inbound -= 1
+        robot.charging_station = station
+        return station.request(robot, self.global_time)
+
+    def leave_station(self, robot, pos):
+        """机器人补电完成离开充电站，排队中的机器人按排队规则开始补电"""
+        station = self.stations.get(pos)
+        if station is None:
+            return
+        robot.charging_station = None
+        for waiting in station.release(robot, self.global_time):
+            self.sync_robot(waiting)
+            waiting.start_recharge()
+            self._robot_changed(waiting)
+        self._request_dispatch()
+
+    def station_stats(self):
+        """返回各充电站的统计指标列表（等待时间、利用率、吞吐量等）"""
+        return [station.stats(self.global_time) for station in self.stations.values()]
+
+    def nearest_station(self, pos):
+        """返回距离 pos 最近的充电站坐标，没有充电站时返回 None"""
+        return self.station_index.nearest(pos)
+
+    def count_vehicle_states(self):
+        """返回 {状态名: 数量}，两种车辆引擎通用"""
+        if self.engine == "fleet":
+            return self.vehicles.count_states()
+        counts = {"entering": 0, "parked": 0, "exiting": 0, "exited": 0}
+        for v in self.vehicles:
+            counts[v.state] += 1
+        return counts
+
+    def count_waiting_for_charge(self):
+        """已停入车位、但电量尚未达到目标电量的车辆数"""
+        if self.engine == "fleet":
+            fleet = self.vehicles
+            n = fleet.size
+            return int(np.count_nonzero((fleet.state[:n] == STATE_PARKED)
+                                        & (fleet.battery[:n] < fleet.target_battery[:n])))
+        return sum(1 for v in self.vehicles
+                   if v.state == "parked" and v.current_battery < v.target_battery_level)
+
+    def _update_entities_tracked(self):
+        """与 update() 中的车辆更新相同，但记录位置/状态发生变化的格子和车位"""
+        dirty_cells = self.dirty_cells
+        for v in self.vehicles:
+            old_pos, old_state = v.position, v.state
             v.update()
-            if v.state == "exited":
-                self.vehicles.remove(v)
-        
+            if v.position != old_pos or v.state != old_state:
+                dirty_cells.add(old_pos)
+                dirty_cells.add(v.position)
+                # 进入车位 / 离开园区时车位颜色随之变化
+                if v.state != old_state and v.bound_spot is not None:
+                    self.dirty_spots.add(v.bound_spot)
+        self._remove_exited()
+
+    def consume_dirty(self):
+        """
+        取出并清空自上次调用以来累计的脏区域。
+        :return: (格子坐标集合, 车位集合)
+        """
+        cells, spots = self.dirty_cells, self.dirty_spots
+        self.dirty_cells, self.dirty_spots = set(), set()
+        return cells, spots
+
+    def run(self, num_ticks, on_tick=None):
+        """
+        固定步长推进模拟，与 Qt 定时器解耦，用于无界面批量运行。
+        :param num_ticks: 推进的步数（离散事件模式下为处理的事件时刻数）
+        :param on_tick: 每步结束后的回调 on_tick(sim)，可用于统计指标
+        """
+        for _ in range(num_ticks):
+            self.update()
+            if on_tick is not None:
+                on_tick(self)
+
+    def run_until(self, end_time, on_tick=None):
+        """
+        推进模拟直到 global_time 到达 end_time，两种推进方式通用。
+        离散事件模式下只在有事件的时刻回调 on_tick，没有事件的时间段直接跳过。
+        """
+        if self.mode == "event":
+            self._start_events()
+            while self.events and self.events.peek_time() <= end_time:
+                self.update()
+                if on_tick is not None:
+                    on_tick(self)
+            self.global_time = max(self.global_time, end_time)
+            return
+        while self.global_time < end_time:
+            self.update()
+            if on_tick is not None:
+                on_tick(self)
+
+    # ====== 离散事件模式 ======
+    def _start_events(self):
+        # 首次推进时再排定初始事件，保证构造后修改的 spawn_interval / gate_spawn_prob 生效
+        if self._events_started:
+            return
+        self._events_started = True
+        self._schedule_next_spawn()
         for robot in self.robots:
-            robot.update()
\ No newline at end of file
+            self.schedule_robot(robot)
+
+    def _schedule_next_spawn(self):
+        """
+        到达生成器已预先抽样了各刷新时刻的到达数，直接跳到下一个有车辆到达的刷新时刻，
+        只排定一个刷新事件，中间没有到达的刷新时刻不产生事件。
+        """
+        next_time = self.arrivals.next_time(self.global_time)
+        if next_time is not None:
+            self.events.push(next_time, "spawn", None, priority=STAGE_SPAWN)
+
+    def _robot_clock(self, robot):
+        """
+        机器人此刻应推进到的时刻：逐步模式中机器人在一步的最后按编号依次更新，
+        本时刻的车辆事件、调度，以及编号更小的机器人处理时，它还停留在上一时刻。
+        """
+        time, stage, robot_id = self._stage
+        if time == self.global_time and (stage < STAGE_ROBOTS or (stage == STAGE_ROBOTS and robot.id > robot_id)):
+            return self.global_time - 1
+        return self.global_time
+
+    def schedule_robot(self, robot):
+        """
+        为机器人排定下一次状态切换事件。机器人被外部改变（如分配新任务）前应先调用 sync_robot。
+        旧的事件通过令牌失效，不需要从堆中删除。
+        空闲的机器人排定下一步的补电检查（对应逐步模式中空闲时每步的 maybe_recharge），并申请一次调度。
+        """
+        token = self._robot_events.get(robot, (0, None))[0] + 1
+        now = self._robot_clock(robot)
+        self._robot_events[robot] = (token, now)
+        ticks = robot.ticks_until_transition()
+        if ticks is None and robot.status == "idle":
+            ticks = 1
+            self._request_dispatch()
+        if ticks is not None:
+            self.events.push(now + ticks, "robot", (robot, token), priority=STAGE_ROBOTS, order=robot.id)
+
+    def sync_robot(self, robot):
+        """把机器人推进到当前时刻（离散事件模式下机器人只在事件时刻更新）"""
+        if self.mode != "event":
+            return
+        now = self._robot_clock(robot)
+        token, last_time = self._robot_events.get(robot, (0, now))
+        old_pos = robot.position
+        robot.advance(now - last_time)
+        self._robot_events[robot] = (token, now)
+        self.robot_index.update(robot, robot.position)
+        if self.telemetry is not None and robot.position != old_pos:
+            self.telemetry.emit(self.global_time, EVENT_ROBOT_MOVE, robot.id, robot.position[0], robot.position[1],
+                                robot.battery_level)
+
+    def sync_vehicle_positions(self):
+        """离散事件模式下把行驶中车辆的位置同步到当前时刻（渲染或统计位置前调用）"""
+        if self.mode != "event":
+            return
+        for v in self.vehicles:
+            v.sync_position(self.global_time)
+
+    def _update_events(self):
+        self._start_events()
+        next_time = self.events.peek_time()
+        if next_time is None:
+            self.global_time += 1
+            return
+        self.global_time = max(self.global_time, next_time)
+
+        exited = False
+        while self.events and self.events.peek_time() <= self.global_time:
+            _, kind, payload = self.events.pop()
+            exited |= self._handle_event(kind, payload)
+        self._stage = (self.global_time, STAGE_DONE, 0)
+        if exited:
+            self._remove_exited()
+
+    def _handle_event(self, kind, payload):
+        """处理单个事件，返回是否有车辆离开园区"""
+        now = self.global_time
+        self._stage = (now, EVENT_STAGES[kind], payload[0].id if kind == "robot" else 0)
+        if kind == "spawn":
+            batch = self.arrivals.take(now)
+            if batch is not None:
+                for v in self._spawn_batch(batch):
+                    # 刷新当步即前进一格，走完路线的下一步停车
+                    self.events.push(now + len(v.route), "arrive", v, priority=STAGE_VEHICLES, order=v.vid)
+            self._schedule_next_spawn()
+        elif kind == "arrive":
+            payload.sync_position(now)
+            payload.park()
+            self.events.push(now + payload.parking_duration, "depart", payload,
+                             priority=STAGE_VEHICLES, order=payload.vid)
+        elif kind == "depart":
+            payload.depart()
+            # 离场当步不移动，走完路线的下一步离开
+            self.events.push(now + len(payload.route) + 1, "exit", payload,
+                             priority=STAGE_VEHICLES, order=payload.vid)
+        elif kind == "exit":
+            payload.sync_position(now)
+            payload.leave_park()
+            return True
+        elif kind == "robot":
+            robot, token = payload
+            if self._robot_events.get(robot, (None,))[0] == token:
+                if robot.status == "idle":
+                    # 补电检查：即逐步模式中空闲机器人这一步的 update()，仍然空闲时不再排定事件
+                    self.sync_robot(robot)
+                    if robot.maybe_recharge():
+                        self.schedule_robot(robot)
+                else:
+                    # 状态切换；变为空闲时排定下一步的补电检查
+                    self.sync_robot(robot)
+                    self.schedule_robot(robot)
+        elif kind == "dispatch":
+            self._dispatch_pending = False
+            self._dispatch()
+            if self.charging_queue and any(r.status == "idle" for r in self.robots):
+                self._request_dispatch()
+        return False
\ No newline at end of file
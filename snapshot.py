@@ -0,0 +1,589 @@
+"""
+-------------------------------------------------
+文件名：snapshot.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    模拟状态的快照（检查点）保存与恢复：
+    - 保存地图（含车位、环路边界）、车位状态、车辆（含路线游标和电量）、机器人、充电站、调度队列、事件队列、
+      随机数流状态、拥堵模型的道路占用和 global_time，恢复后继续运行的结果与不中断运行完全一致
+    - 文件格式：8 字节魔数 + 版本号 + JSON 头（标量、机器人等少量对象）+ 按 64 字节对齐的原始数组
+      （地图、逐车辆的列、车位状态、预抽样的到达块）
+    - 恢复时以写时复制（copy-on-write）方式内存映射整个文件，数组直接引用映射的页面，
+      不逐元素解析；修改只发生在进程私有的副本上，同一快照可被多个进程同时分叉
+    - 恢复时不再执行 `_generate_*` 布局生成，可指定新的种子，从同一预热状态分叉出多次不同的运行
+
+用法示例：
+    save_snapshot(sim, "warm.snap")
+    sim = load_snapshot("warm.snap", seed=7)
+-------------------------------------------------
+"""
+import itertools
+import json
+import struct
+
+import numpy as np
+
+from simulation import Simulation
+from models.vehicle import Vehicle
+from models.fleet import VehicleFleet, STATE_NAMES, CHARGE_NAMES, CHARGE_CODES
+from models.route import LoopRoute, ManhattanRoute, WaypointRoute
+from models.spot_pool import FreeSpotPool
+from models.arrivals import ArrivalGenerator
+from models.charging_curve import DEFAULT_CURVE, CURVES, make_curve
+from models.charging_queue import ChargingDemandQueue
+
+MAGIC = b"PARKSNAP"
+VERSION = 2  # 版本 2：内道改为不自交的矩形，车道下标与版本 1 不兼容
+ALIGN = 64
+_PREAMBLE = struct.Struct("<8sII")  # 魔数、版本号、JSON 头长度
+
+STATE_CODES = {name: i for i, name in enumerate(STATE_NAMES)}
+
+# 对象引擎下逐车辆保存的列
+_VEHICLE_COLUMNS = {
+    "vid": np.int64,
+    "state": np.int8,
+    "x": np.int32,
+    "y": np.int32,
+    "gate": np.int32,
+    "spot": np.int32,
+    "target_x": np.int32,
+    "target_y": np.int32,
+    "lane": np.int8,
+    "route_start": np.int32,
+    "route_len": np.int32,
+    "cursor": np.int32,
+    "route_time": np.int64,
+    "horizontal": np.bool_,
+    "initial_battery": np.float64,
+    "battery": np.float64,
+    "target_battery": np.float64,
+    "charge_state": np.int8,
+    "curve": np.int16,
+    "spawn_time": np.int64,
+    "parked_time": np.int64,
+    "parking_duration": np.int64,
+}
+
+_ROBOT_PARAMS = ("id", "battery_level", "max_battery", "move_speed", "charge_efficiency",
+                 "min_battery_threshold", "move_cost", "recharge_level", "recharge_rate", "min_transfer")
+# 当前一段开始时的电量与已进行步数（恢复后电量按同样的闭式解继续计算）
+_ROBOT_SEGMENT = ("_segment_battery", "_segment_vehicle", "_segment_ticks")
+
+_STATION_STATS = ("arrivals", "completed", "total_wait", "max_wait", "queue_peak",
+                  "_busy_time", "_start_time", "_last_time")
+
+
+# ====== 基础编码 ======
+def _py(value):
+    # NumPy 标量转为 JSON 可写的 Python 数值
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _number(value):
+    # 恢复电量等数值：整数值还原为 int，与新建车辆时的类型一致
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _curve_spec(curve):
+    """充电曲线 -> 可写入 JSON 的描述（make_curve 的逆）"""
+    if curve is DEFAULT_CURVE:
+        return "default"
+    for name, cls in CURVES.items():
+        if type(curve) is cls:
+            spec = {"type": name}
+            spec.update({k: _py(v) for k, v in vars(curve).items()})
+            return spec
+    raise ValueError(f"cannot save charging curve {curve!r}")
+
+
+class _CurveTable:
+    """快照中的充电曲线表：同一个曲线对象只保存一次，各处按下标引用"""
+
+    def __init__(self):
+        self.curves = []
+
+    def index(self, curve):
+        for i, known in enumerate(self.curves):
+            if known is curve:
+                return i
+        self.curves.append(curve)
+        return len(self.curves) - 1
+
+    def specs(self):
+        return [_curve_spec(c) for c in self.curves]
+
+
+def _load_curves(specs):
+    return [DEFAULT_CURVE if spec == "default" else make_curve(spec) for spec in specs]
+
+
+# ====== 保存 ======
+class _Writer:
+    """收集 JSON 头和数组，写出时计算各数组的对齐偏移"""
+
+    def __init__(self):
+        self.header = {}
+        self.arrays = {}
+
+    def array(self, name, values, dtype=None):
+        self.arrays[name] = np.ascontiguousarray(values, dtype=dtype)
+
+    def write(self, path):
+        table = {}
+        offset = 0
+        for name, arr in self.arrays.items():
+            table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+            offset += -(-arr.nbytes // ALIGN) * ALIGN
+        self.header["arrays"] = table
+        head = json.dumps(self.header, separators=(",", ":")).encode("utf-8")
+        data_start = -(-(_PREAMBLE.size + len(head)) // ALIGN) * ALIGN
+        with open(path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, VERSION, len(head)))
+            f.write(head)
+            f.write(b"\0" * (data_start - _PREAMBLE.size - len(head)))
+            for name, arr in self.arrays.items():
+                f.write(arr.tobytes())
+                f.write(b"\0" * (-arr.nbytes % ALIGN))
+
+
+def _vehicle_refs(sim):
+    # 车辆 -> 快照中的引用：对象引擎为 vehicles 列表下标，车队引擎为车辆编号
+    if sim.engine == "fleet":
+        return lambda v: -1 if v is None else int(v.vid)
+    index = {v: i for i, v in enumerate(sim.vehicles)}
+    return lambda v: -1 if v is None else index.get(v, -1)
+
+
+def _encode_route(route):
+    if not route:
+        return None
+    if isinstance(route, ManhattanRoute):
+        return {"kind": "manhattan", "start": [route.sx, route.sy], "end": [route.ex, route.ey],
+                "cursor": route.cursor}
+    if isinstance(route, WaypointRoute):
+        return {"kind": "waypoint", "start": list(route.start_pos),
+                "waypoints": [list(p) for p in route.waypoints], "cursor": route.cursor}
+    raise ValueError(f"cannot save robot route {route!r}")
+
+
+def _index_items(index):
+    # 按桶内顺序导出空间索引，重建后 k 近邻的并列次序不变
+    return [(item, pos) for bucket in index._buckets.values() for item, pos in bucket.items()]
+
+
+def _save_vehicles(writer, sim, curves):
+    if sim.engine == "fleet":
+        fleet = sim.vehicles
+        n = fleet.size
+        for name in VehicleFleet._COLUMNS:
+            writer.array(f"fleet.{name}", getattr(fleet, name)[:n])
+        writer.array("fleet.curve_table", [curves.index(c) for c in fleet.curves], np.int64)
+        writer.header["fleet"] = {"next_id": int(fleet.next_id)}
+        return
+
+    vehicles = sim.vehicles
+    gate_index = {gate: i for i, gate in enumerate(sim.gates)}
+    spot_index = {spot: i for i, spot in enumerate(sim.parking_spots)}
+    columns = {name: np.zeros(len(vehicles), dtype=dtype) for name, dtype in _VEHICLE_COLUMNS.items()}
+    for i, v in enumerate(vehicles):
+        route = v.route
+        row = {
+            "vid": -1 if v.vid is None else v.vid,
+            "state": STATE_CODES[v.state],
+            "x": v.position[0],
+            "y": v.position[1],
+            "gate": gate_index[v.origin_gate],
+            "spot": spot_index[v.bound_spot] if v.bound_spot is not None else -1,
+            "target_x": v.target_pos[0],
+            "target_y": v.target_pos[1],
+            "lane": 0 if v.clockwise else 1,
+            "route_start": getattr(route, "start", 0),
+            "route_len": route.length,
+            "cursor": route.cursor,
+            "route_time": v.route_time,
+            "horizontal": v.orientation == "horizontal",
+            "initial_battery": v.initial_battery_level,
+            "battery": v.current_battery,
+            "target_battery": v.target_battery_level,
+            "charge_state": CHARGE_CODES[v.charging_status],
+            "curve": curves.index(v.charging_curve),
+            "spawn_time": v.spawn_time,
+            "parked_time": -1 if v.parked_time is None else v.parked_time,
+            "parking_duration": v.parking_duration,
+        }
+        for name, value in row.items():
+            columns[name][i] = value
+    for name, column in columns.items():
+        writer.array(f"vehicle.{name}", column)
+
+
+def save_snapshot(sim, path):
+    """
+    把模拟的完整状态写入快照文件。
+    应在两次 update() 之间调用；时变到达曲线为可调用对象时无法保存，请改用系数序列。
+    """
+    arrivals = sim.arrivals
+    if callable(arrivals.profile):
+        raise ValueError("callable arrival profiles cannot be saved; use a list of factors")
+
+    writer = _Writer()
+    curves = _CurveTable()
+    ref = _vehicle_refs(sim)
+    robot_index = {robot: i for i, robot in enumerate(sim.robots)}
+    spot_index = {spot: i for i, spot in enumerate(sim.parking_spots)}
+
+    # 布局
+    writer.array("map", sim.map)
+    writer.array("building_positions", np.array(sim.building_positions, dtype=np.int32).reshape(-1, 2))
+    writer.array("parking_spots", [(p.x1, p.y1, p.x2, p.y2, p.is_horizontal) for p in sim.parking_spots], np.int32)
+
+    # 车辆、车位
+    _save_vehicles(writer, sim, curves)
+    writer.array("spot.occupied", [s.is_occupied for s in sim.parking_spots], np.bool_)
+    writer.array("spot.reserved_by", [ref(s.reserved_by) for s in sim.parking_spots], np.int64)
+    writer.array("spot.pool", [spot_index[s] for s in sim.spot_pool], np.int32)
+    if sim.road_graph is not None:
+        writer.array("road.capacity", sim.road_graph.capacity)
+        writer.array("road.occupancy", sim.road_graph.occupancy)
+
+    # 预抽样的到达块
+    if arrivals._arrays is not None:
+        writer.array("arrivals.times", arrivals._times)
+        writer.array("arrivals.offsets", arrivals._offsets)
+        names = ("gate", "parking_duration", "initial_battery", "target_battery", "clockwise", "curve")
+        for name, arr in zip(names, arrivals._arrays):
+            writer.array(f"arrivals.{name}", arr)
+
+    # 机器人
+    robots = []
+    for robot in sim.robots:
+        state = {name: _py(getattr(robot, name)) for name in _ROBOT_PARAMS + _ROBOT_SEGMENT}
+        state.update({
+            "position": list(robot.position),
+            "status": robot.status,
+            "target_vehicle": None if robot.target_vehicle is None else ref(robot.target_vehicle),
+            "target_station": None if robot.target_station is None else list(robot.target_station),
+            "charging_station": None if robot.charging_station is None else list(robot.charging_station.position),
+            "route": _encode_route(robot.route),
+        })
+        robots.append(state)
+
+    # 充电站：排队中的条目按出队顺序保存，已取消的条目丢弃
+    stations = []
+    for station in sim.stations.values():
+        queue = sorted(entry for entry in station._queue if entry[2] in station._queued)
+        state = {name: _py(getattr(station, name)) for name in _STATION_STATS}
+        state.update({
+            "id": station.id,
+            "position": list(station.position),
+            "slots": station.slots,
+            "charge_rate": station.charge_rate,
+            "queue_policy": station.queue_policy,
+            "users": sorted(robot_index[r] for r in station.users),
+            "queue": [[_py(key), robot_index[r], arrived] for key, _, r, arrived in queue],
+        })
+        stations.append(state)
+
+    # 充电需求队列（同样只保存仍在队列中的条目）
+    demand = sim.charging_queue
+    if demand.ordered:
+        demand_entries = sorted((entry for entry in demand._heap if entry[2] in demand._queued),
+                                key=lambda entry: entry[:2])
+    else:
+        demand_entries = [(None, n, v) for n, v in enumerate(demand._queued)]
+
+    def encode_payload(kind, payload):
+        if kind == "robot":
+            robot, token = payload
+            return [robot_index[robot], token]
+        if kind in ("arrive", "depart", "exit"):
+            return ref(payload)
+        return None
+
+    events = [[time, priority, order, kind, encode_payload(kind, payload)]
+              for time, priority, order, _, kind, payload in sorted(sim.events._heap, key=lambda e: e[:4])]
+
+    writer.header.update({
+        "config": {
+            "grid_size": list(sim.grid_size),
+            "num_buildings": sim.num_buildings,
+            "num_stations": sim.num_stations,
+            "num_gates": sim.num_gates,
+            "engine": sim.engine,
+            "mode": sim.mode,
+            "station_slots": sim.station_slots,
+            "station_policy": sim.station_policy,
+            "seed": sim.seed,
+            "traffic": sim.traffic,
+            "cell_capacity": sim.cell_capacity,
+        },
+        "ring": list(sim.ring),
+        "gates": [list(g) for g in sim.gates],
+        "charging_stations": [list(s) for s in sim.charging_stations],
+        "rng": {name: getattr(sim, name).bit_generator.state
+                for name in ("layout_rng", "arrival_rng", "vehicle_rng", "scheduling_rng")},
+        "scalars": {
+            "global_time": sim.global_time,
+            "total_spawned": sim.total_spawned,
+            "total_exited": sim.total_exited,
+            "total_parked": sim.total_parked,
+            "entry_time_total": sim.entry_time_total,
+            "exit_time_total": sim.exit_time_total,
+            "blocked_total": 0 if sim.road_graph is None else sim.road_graph.blocked_total,
+            "spawn_interval": sim.spawn_interval,
+            "gate_spawn_prob": [_py(p) for p in sim.gate_spawn_prob],
+            "dispatch_interval": sim.dispatch_interval,
+            "dispatch_candidates": sim.dispatch_candidates,
+            "dispatch_pending": sim._dispatch_pending,
+            "events_started": sim._events_started,
+        },
+        "charging_curves": [curves.index(c) for c in sim.charging_curves],
+        "arrivals": {
+            "model": arrivals.model,
+            "profile": None if arrivals.profile is None else [_py(p) for p in arrivals.profile],
+            "block_slots": arrivals.block_slots,
+            "interval": arrivals._interval,
+            "sampled": arrivals._arrays is not None,
+        },
+        "robots": robots,
+        "stations": stations,
+        "charging_queue": {
+            "strategy": demand.strategy,
+            "entries": [[_py(key), ref(v)] for key, _, v in demand_entries],
+        },
+        "serving": [[ref(v), robot_index[r]] for v, r in sim._serving.items()],
+        "waiting_index": [[ref(v), list(pos)] for v, pos in _index_items(sim.waiting_index)],
+        "robot_index": [robot_index[r] for r, _ in _index_items(sim.robot_index)],
+        "events": events,
+        "robot_events": [None if r not in sim._robot_events else list(sim._robot_events[r])
+                         for r in sim.robots],
+    })
+    # 曲线表最后写入：上面各处引用到的曲线都已登记
+    writer.header["curves"] = curves.specs()
+    writer.write(path)
+
+
+# ====== 恢复 ======
+def read_snapshot(path):
+    """
+    读取快照文件，返回 (JSON 头, {数组名: 数组})。
+    数组以写时复制方式映射自文件，读取不复制数据，修改不会写回文件。
+    """
+    with open(path, "rb") as f:
+        magic, version, head_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a simulation snapshot")
+        if version != VERSION:
+            raise ValueError(f"unsupported snapshot version {version}")
+        header = json.loads(f.read(head_len).decode("utf-8"))
+    data_start = -(-(_PREAMBLE.size + head_len) // ALIGN) * ALIGN
+    buf = np.memmap(path, dtype=np.uint8, mode="c")
+    arrays = {}
+    for name, info in header["arrays"].items():
+        dtype = np.dtype(info["dtype"])
+        count = int(np.prod(info["shape"], dtype=np.int64))
+        start = data_start + info["offset"]
+        raw = buf[start:start + count * dtype.itemsize]
+        arrays[name] = np.asarray(raw).view(dtype).reshape(info["shape"])
+    return header, arrays
+
+
+def _decode_route(state):
+    if state is None:
+        return []
+    if state["kind"] == "manhattan":
+        route = ManhattanRoute(tuple(state["start"]), tuple(state["end"]))
+    else:
+        route = WaypointRoute(tuple(state["start"]), [tuple(p) for p in state["waypoints"]])
+    route.seek(state["cursor"])
+    return route
+
+
+def _load_vehicles(sim, arrays, header, curves):
+    if sim.engine == "fleet":
+        fleet = sim.vehicles
+        fleet.curves = [curves[i] for i in arrays["fleet.curve_table"].tolist()]
+        fleet.next_id = header["fleet"]["next_id"]
+        n = len(arrays["fleet.ids"])
+        if n:
+            for name in VehicleFleet._COLUMNS:
+                setattr(fleet, name, arrays[f"fleet.{name}"])
+            fleet.size = fleet.capacity = n
+        return list(fleet)
+
+    cols = {name: arrays[f"vehicle.{name}"].tolist() for name in _VEHICLE_COLUMNS if f"vehicle.{name}" in arrays}
+    vehicles = []
+    for i in range(len(cols["state"])):
+        gate = sim.gates[cols["gate"][i]]
+        spot = sim.parking_spots[cols["spot"][i]] if cols["spot"][i] >= 0 else None
+        clockwise = cols["lane"][i] == 0
+        v = Vehicle(
+            simulation=sim,
+            origin_gate=gate,
+            spawn_pos=sim.get_spawn_position_for_gate(gate),
+            target_pos=(cols["target_x"][i], cols["target_y"][i]),
+            parking_duration=cols["parking_duration"][i],
+            spawn_time=cols["spawn_time"][i],
+            spot=spot,
+            charging_curve=curves[cols["curve"][i]],
+            initial_battery=_number(cols["initial_battery"][i]),
+            target_battery=_number(cols["target_battery"][i]),
+            clockwise=clockwise,
+            vid=cols["vid"][i] if "vid" in cols else None
+        )
+        # 覆盖构造函数算出的进场初始状态
+        v.state = STATE_NAMES[cols["state"][i]]
+        if sim.road_routing:
+            # 道路网络路线由两端唯一确定（最短路树固定），按状态重新求出
+            if v.state in ("exiting", "exited"):
+                v.route = sim.road_route(v.target_pos, v.spawn_pos)
+        else:
+            loop = sim.get_lane_loop(v.lane_id)
+            start, length = cols["route_start"][i], cols["route_len"][i]
+            v.route = LoopRoute(loop, start, (start + length - 1) % len(loop), v.lane_id)
+        v.route.seek(cols["cursor"][i])
+        v.route_time = cols["route_time"][i]
+        v.position = (cols["x"][i], cols["y"][i])
+        v.current_battery = _number(cols["battery"][i])
+        v.charging_status = CHARGE_NAMES[cols["charge_state"][i]]
+        v.parked_time = None if cols["parked_time"][i] < 0 else cols["parked_time"][i]
+        v.orientation = "horizontal" if cols["horizontal"][i] else "vertical"
+        v._detect_road_side()
+        vehicles.append(v)
+    sim.vehicles = vehicles
+    return vehicles
+
+
+def load_snapshot(path, seed=None):
+    """
+    从快照文件恢复模拟，不执行布局生成。
+    :param seed: 给出时用它重新派生到达、车辆属性和调度随机数流（布局不变），
+                 从同一预热快照分叉出随机序列不同的多次运行；None 表示精确延续原运行
+    :return: Simulation 实例
+    """
+    header, arrays = read_snapshot(path)
+    config = dict(header["config"])
+    config["grid_size"] = tuple(config["grid_size"])
+    layout = {
+        "map": arrays["map"],
+        "gates": header["gates"],
+        "charging_stations": header["charging_stations"],
+        "building_positions": arrays["building_positions"].tolist(),
+        "parking_spots": arrays["parking_spots"].reshape(-1, 5),
+        "ring": header["ring"],
+    }
+    sim = Simulation(num_robots=len(header["robots"]), layout=layout, **config)
+
+    for name, state in header["rng"].items():
+        getattr(sim, name).bit_generator.state = state
+    scalars = header["scalars"]
+    sim.global_time = scalars["global_time"]
+    sim.total_spawned = scalars["total_spawned"]
+    sim.total_exited = scalars["total_exited"]
+    sim.total_parked = scalars.get("total_parked", 0)
+    sim.entry_time_total = scalars.get("entry_time_total", 0)
+    sim.exit_time_total = scalars.get("exit_time_total", 0)
+    sim.spawn_interval = scalars["spawn_interval"]
+    sim.gate_spawn_prob = scalars["gate_spawn_prob"]
+    sim.dispatch_interval = scalars["dispatch_interval"]
+    sim.dispatch_candidates = scalars["dispatch_candidates"]
+    sim._dispatch_pending = scalars["dispatch_pending"]
+    sim._events_started = scalars["events_started"]
+
+    # 充电曲线与到达生成器
+    curves = _load_curves(header["curves"])
+    sim.charging_curves = [curves[i] for i in header["charging_curves"]]
+    info = header["arrivals"]
+    sim.arrivals = ArrivalGenerator(sim, model=info["model"], profile=info["profile"],
+                                    block_slots=info["block_slots"])
+    if info["sampled"]:
+        arrivals = sim.arrivals
+        arrivals._interval = info["interval"]
+        arrivals._times = arrays["arrivals.times"]
+        arrivals._offsets = arrays["arrivals.offsets"]
+        arrivals._arrays = tuple(arrays[f"arrivals.{name}"] for name in (
+            "gate", "parking_duration", "initial_battery", "target_battery", "clockwise", "curve"))
+
+    # 车辆与车位
+    vehicles = _load_vehicles(sim, arrays, header, curves)
+    if sim.engine == "fleet":
+        by_ref = {v.vid: v for v in vehicles}
+    else:
+        by_ref = dict(enumerate(vehicles))
+    vehicle = by_ref.get
+
+    occupied = arrays["spot.occupied"].tolist()
+    reserved = arrays["spot.reserved_by"].tolist()
+    for spot, is_occupied, owner in zip(sim.parking_spots, occupied, reserved):
+        spot.is_occupied = is_occupied
+        spot.reserved_by = vehicle(owner)
+    sim.occupied_count = sum(occupied)
+    sim.spot_pool = FreeSpotPool(sim.parking_spots[i] for i in arrays["spot.pool"].tolist())
+    if sim.road_graph is not None:
+        sim.road_graph.capacity[:] = arrays["road.capacity"]
+        sim.road_graph.occupancy[:] = arrays["road.occupancy"]
+        sim.road_graph.blocked_total = scalars["blocked_total"]
+
+    # 机器人与充电站
+    robots = sim.robots
+    for robot, state in zip(robots, header["robots"]):
+        for name in _ROBOT_PARAMS + _ROBOT_SEGMENT:
+            setattr(robot, name, state[name])
+        robot.position = tuple(state["position"])
+        robot.status = state["status"]
+        robot.target_vehicle = None if state["target_vehicle"] is None else vehicle(state["target_vehicle"])
+        robot.target_station = None if state["target_station"] is None else tuple(state["target_station"])
+        robot.charging_station = (None if state["charging_station"] is None
+                                  else sim.stations[tuple(state["charging_station"])])
+        robot.route = _decode_route(state["route"])
+
+    for state in header["stations"]:
+        station = sim.stations[tuple(state["position"])]
+        station.id = state["id"]
+        station.slots = state["slots"]
+        station.charge_rate = state["charge_rate"]
+        station.queue_policy = state["queue_policy"]
+        for name in _STATION_STATS:
+            setattr(station, name, state[name])
+        station.users = {robots[i] for i in state["users"]}
+        # 按出队顺序重新编号，有序列表本身就是合法的堆
+        station._queue = [(key, n, robots[i], arrived) for n, (key, i, arrived) in enumerate(state["queue"])]
+        station._queued = {entry[2] for entry in station._queue}
+        station._counter = itertools.count(len(station._queue))
+        station.inbound = 0
+    for robot in robots:
+        if robot.target_station is not None and robot.charging_station is None:
+            sim.stations[robot.target_station].inbound += 1
+
+    # 调度队列与索引
+    demand = sim.charging_queue = ChargingDemandQueue(sim, strategy=header["charging_queue"]["strategy"])
+    entries = header["charging_queue"]["entries"]
+    demand._queued = {vehicle(r): None for _, r in entries}
+    if demand.ordered:
+        demand._heap = [(key, n, vehicle(r)) for n, (key, r) in enumerate(entries)]
+    demand._counter = itertools.count(len(entries))
+    sim._serving = {vehicle(v): robots[r] for v, r in header["serving"]}
+
+    for robot in robots:
+        sim.robot_index.remove(robot)
+    for r in header["robot_index"]:
+        sim.robot_index.insert(robots[r], robots[r].position)
+    for r, pos in header["waiting_index"]:
+        sim.waiting_index.insert(vehicle(r), tuple(pos))
+
+    # 事件队列
+    for time, priority, order, kind, payload in header["events"]:
+        if kind == "robot":
+            payload = (robots[payload[0]], payload[1])
+        elif kind in ("arrive", "depart", "exit"):
+            payload = vehicle(payload)
+        sim.events.push(time, kind, payload, priority=priority, order=order)
+    sim._robot_events = {robot: tuple(state) for robot, state in zip(robots, header["robot_events"])
+                         if state is not None}
+
+    if seed is not None:
+        sim.reseed(seed)
+    return sim
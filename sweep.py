@@ -0,0 +1,255 @@
+"""
+-------------------------------------------------
+文件名：sweep.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    参数扫描 / 蒙特卡洛批量运行入口，不依赖图形界面：
+    - 输入参数网格（每个参数一组取值）和重复次数，展开为全部 (参数组合, 重复编号) 运行
+    - 使用 ProcessPoolExecutor 多进程并行运行无界面模拟（见 headless.py）
+    - 每次运行的种子由基础种子和重复编号派生：不同参数组合的同一重复编号使用相同种子
+      （共同随机数），组合之间的差异只来自参数本身
+    - 每完成一次运行立即向 CSV 追加一行（每个参数、每个指标各占一列）并刷新
+    - 中断后以同样的参数重新运行即可续跑：已写入结果的运行按 run_key 跳过；
+      run_key 包含本次扫描的共享设置摘要（时长、基础配置、基础种子、预热快照内容，见 setup_key），
+      改变这些设置后不会误把旧结果当作已完成，新旧结果可按 setup 列区分
+    - 可指定预热快照（见 snapshot.py），各次运行都从该状态分叉，不再重复模拟预热过程
+
+用法示例：
+    python sweep.py --grid grid.json --replicates 10 --ticks 5000 --output sweep.csv
+    python sweep.py --param num_stations=1,2,4 --param charging_strategy=distance,demand \\
+                    --replicates 5 --jobs 8 --output sweep.csv
+    grid.json 形如 {"num_stations": [1, 2, 4], "gate_spawn_prob": [[0.5, 0.3, 0.2], [0.9, 0.9, 0.9]]}
+-------------------------------------------------
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from headless import run_headless
+
+# 结果表中参数和指标之前的固定列
+BASE_COLUMNS = ["run_key", "setup", "replicate", "seed"]
+
+
+def expand_grid(grid):
+    """
+    把参数网格展开为参数组合列表，按参数名排序以保证顺序稳定。
+    :param grid: {参数名: [取值, ...]}
+    :return: [{参数名: 取值}, ...]
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def _file_digest(path):
+    # 按内容计算文件摘要（分块读取，大快照文件也不占用大量内存）
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def setup_key(ticks, base_config, base_seed, snapshot=None):
+    """
+    各次运行共享的设置摘要：模拟时长、基础场景配置、基础种子、预热快照文件内容。
+    其中任何一项变化都会得到不同的摘要。
+    """
+    setup = {
+        "ticks": ticks,
+        "base_config": base_config,
+        "base_seed": base_seed,
+        "snapshot": _file_digest(snapshot) if snapshot else None,
+    }
+    text = json.dumps(setup, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def run_key(params, replicate, setup):
+    """由参数组合、重复编号和共享设置摘要得到稳定的运行标识，用于续跑时跳过已完成的运行"""
+    text = json.dumps(params, sort_keys=True) + f"#{replicate}@{setup}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def run_seed(base_seed, replicate):
+    """派生每次运行的种子：同一重复编号在所有参数组合中相同（共同随机数）"""
+    return int(np.random.SeedSequence([base_seed, replicate]).generate_state(1)[0])
+
+
+def flatten_result(result):
+    """
+    把 run_headless 的结果展平为标量列：列表型的逐机器人/逐充电站指标汇总为均值和最大值。
+    """
+    row = {}
+    for key, value in result.items():
+        if key in ("config", "seed"):
+            continue
+        if key == "robot_utilisation":
+            row["robot_utilisation_max"] = max(value) if value else 0.0
+        elif key == "stations":
+            for metric in ("wait_mean", "wait_max", "utilisation", "throughput", "queue_peak"):
+                values = [station[metric] for station in value]
+                row[f"station_{metric}_mean"] = sum(values) / len(values) if values else 0.0
+                row[f"station_{metric}_max"] = max(values) if values else 0.0
+        elif isinstance(value, (int, float, str, bool)) or value is None:
+            row[key] = value
+    return row
+
+
+def _run_one(task):
+    # 在工作进程中运行一次模拟（必须是模块级函数才能被进程池序列化）
+    key, replicate, seed, params, base_config, ticks, snapshot = task
+    config = dict(base_config)
+    config.update(params)
+    result = run_headless(config, ticks, seed=seed, snapshot=snapshot)
+    return key, replicate, seed, params, flatten_result(result)
+
+
+def _encode(value):
+    # 列表等复合参数以 JSON 写入单元格
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    return value
+
+
+def _completed_keys(path):
+    """
+    读取已有结果文件，返回 (表头, 已完成的 run_key 集合)。
+    进程被强行终止时最后一行可能不完整，列数不足的行不算完成，续跑时会重新运行。
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None, set()
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        done = {row["run_key"] for row in reader if row.get("run_key") and None not in row.values()}
+        return reader.fieldnames, done
+
+
+def _ends_with_newline(path):
+    # 不完整的最后一行没有换行符，追加前先补上，避免与新行拼接
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def run_sweep(grid, replicates, ticks, output, base_config=None, base_seed=0, jobs=None, log=sys.stderr,
+              snapshot=None):
+    """
+    运行参数扫描，结果流式追加到 CSV 文件 output，返回本次新完成的运行数。
+    :param grid: {参数名: [取值, ...]}，参数名为 headless 场景配置的键
+    :param replicates: 每个参数组合的重复次数
+    :param ticks: 每次运行的模拟时长
+    :param base_config: 各次运行共享的基础场景配置
+    :param base_seed: 基础种子
+    :param jobs: 并行进程数，默认 CPU 核数
+    :param snapshot: 预热快照文件，给出时每次运行都从它分叉（按运行种子重新派生随机数流）
+    """
+    base_config = dict(base_config or {})
+    param_names = sorted(grid)
+    header, done = _completed_keys(output)
+    setup = setup_key(ticks, base_config, base_seed, snapshot)
+
+    tasks = []
+    keys = set()
+    for params in expand_grid(grid):
+        for replicate in range(replicates):
+            key = run_key(params, replicate, setup)
+            keys.add(key)
+            if key not in done:
+                tasks.append((key, replicate, run_seed(base_seed, replicate), params, base_config, ticks,
+                              snapshot))
+    if log is not None:
+        log.write(f"{len(done & keys)} runs already in {output}, {len(tasks)} to go\n")
+        if done - keys:
+            log.write(f"{len(done - keys)} runs in {output} were made with other settings and are kept as is\n")
+    if not tasks:
+        return 0
+
+    start = time.perf_counter()
+    finished = 0
+    with open(output, "a", newline="", encoding="utf-8") as f:
+        writer = None
+        if header is not None:
+            if not _ends_with_newline(output):
+                f.write("\n")
+            writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore")
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_run_one, task) for task in tasks]
+            for future in as_completed(futures):
+                try:
+                    key, replicate, seed, params, metrics = future.result()
+                except Exception as exc:  # 单次运行失败不影响其它运行，未写入的结果续跑时会重试
+                    if log is not None:
+                        log.write(f"run failed: {exc!r}\n")
+                    continue
+                if writer is None:
+                    # 首个结果确定表头：固定列 + 参数列 + 指标列
+                    header = BASE_COLUMNS + param_names + sorted(metrics)
+                    writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore")
+                    writer.writeheader()
+                row = {"run_key": key, "setup": setup, "replicate": replicate, "seed": seed}
+                row.update({name: _encode(value) for name, value in params.items()})
+                row.update(metrics)
+                writer.writerow(row)
+                f.flush()
+                finished += 1
+                if log is not None:
+                    elapsed = time.perf_counter() - start
+                    log.write(f"[{finished}/{len(tasks)}] {key} done ({elapsed:.1f}s)\n")
+    return finished
+
+
+def _parse_value(text):
+    # 命令行取值优先按 JSON 解析（数字、列表），否则作为字符串
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="智能园区参数扫描")
+    parser.add_argument("--grid", type=str, default=None, help="参数网格 JSON 文件 {参数名: [取值, ...]}")
+    parser.add_argument("--param", type=str, action="append", default=[], metavar="NAME=V1,V2",
+                        help="单个参数的取值（可多次给出，取值按 JSON 解析；列表取值请用 --grid）")
+    parser.add_argument("--config", type=str, default=None, help="基础场景配置 JSON 文件")
+    parser.add_argument("--replicates", type=int, default=1, help="每个参数组合的重复次数")
+    parser.add_argument("--ticks", type=int, default=1000, help="每次运行的模拟时长")
+    parser.add_argument("--seed", type=int, default=0, help="基础种子")
+    parser.add_argument("--jobs", type=int, default=None, help="并行进程数，默认 CPU 核数")
+    parser.add_argument("--snapshot", type=str, default=None, help="预热快照文件，各次运行从它分叉")
+    parser.add_argument("--output", type=str, required=True, help="结果 CSV 文件（已存在时续跑）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, "r", encoding="utf-8") as f:
+            grid.update(json.load(f))
+    for item in args.param:
+        name, _, values = item.partition("=")
+        grid[name] = [_parse_value(v) for v in values.split(",")]
+
+    base_config = {"grid_size": (200, 200), "num_buildings": 2, "num_stations": 2, "num_gates": 3}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            base_config.update(json.load(f))
+
+    run_sweep(grid, args.replicates, args.ticks, args.output, base_config=base_config,
+              base_seed=args.seed, jobs=args.jobs, snapshot=args.snapshot)
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,443 @@
+"""
+-------------------------------------------------
+文件名：test.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    模拟行为的回归检查，可直接运行 `python test.py`，也可用 `pytest test.py` 运行：
+    - 拥堵交通模型下长时间运行，车辆始终能持续驶出园区（车道不会互相等待而死锁），沿道路网络行驶的布局也一样
+    - 两条环路车道是沿道路、逐格相邻、每格只经过一次的简单环路（内道顺时针、外道逆时针），自由交通下车辆持续驶出
+    - 逐步推进模式和离散事件模式在同一场景、同一种子下得到完全相同的汇总指标
+    - 运行中修改到达速率立即生效（不会沿用已预先抽样的到达块）
+    - 到达曲线中很长的零速率时段过后，离散事件模式照常恢复刷新车辆，与逐步模式一致
+    - 道路不能承载环路车道的布局中，车辆沿道路网络的最短路行驶，始终不离开道路
+    - 布局文件未给出车位时按默认规则生成车位，给出时只使用给出的车位（包括二进制缓存）
+    - 内置匈牙利算法与穷举得到相同的最小总代价；车辆数超过 dense_limit 时按空间索引取 k 近邻候选的分配正确
+    - 机器人避障寻路：A* 步数与 BFS 最短路相同，路线绕开建筑、路点只保留转弯处，LRU 缓存按容量淘汰并随地图版本失效
+    - 从快照恢复后继续运行（1500 + 2500 步）与一次运行 4000 步的状态完全相同（逐步/离散事件/车队/拥堵模型）
+    - 参数扫描被中断（结果文件截断在半行）后续跑，每个 run_key 恰好出现一次；共享设置改变时得到新的 setup 摘要
+    - 充电站的在途机器人计数与机器人状态一致，剪枝后的选站结果与逐站寻路的结果相同
+-------------------------------------------------
+"""
+import csv
+import itertools
+import json
+import os
+import tempfile
+from collections import deque
+
 import numpy as np
+
+from headless import build_simulation, run_headless
+from models.grid_planner import GridPlanner
+from models.layout import load_layout
+from models.scheduler import _hungarian, build_cost_matrix, optimal_assignment
+from models.spatial_index import SpatialGrid
+from simulation import Simulation
+from snapshot import load_snapshot, save_snapshot
+from sweep import run_key, run_sweep, setup_key
+
+
+def _network_layout(directory):
+    """写出一个由两条十字相交的大道和一条尽头支路组成的园区（不含环路），返回描述文件路径"""
+    grid = np.full((40, 60), "S")
+    grid[18:22, :] = "R"
+    grid[:, 28:32] = "R"
+    grid[5:7, 28:55] = "R"
+    grid[10:14, 10:14] = "B"
+    grid[18:22, 0:2] = "G"
+    grid[0:2, 28:32] = "G"
+    with open(os.path.join(directory, "net.txt"), "w") as f:
+        f.write("\n".join("".join(row) for row in grid) + "\n")
+    spots = [{"row": [4, 14, 26, 18], "size": [2, 4]}, {"row": [4, 22, 26, 26], "size": [2, 4]},
+             {"row": [34, 7, 54, 11], "size": [2, 4]}, {"row": [32, 24, 36, 38], "size": [4, 2]}]
+    path = os.path.join(directory, "net.json")
+    with open(path, "w") as f:
+        json.dump({"raster": "net.txt", "parking_spots": spots, "charging_stations": [[40, 30]]}, f)
+    return path
+
+
+def _exits_per_window(engine, grid_size=(80, 80), ticks=6000, window=1000, seed=1):
+    """拥堵模型下高负载运行，返回每 window 步内驶出园区的车辆数"""
+    sim = Simulation(grid_size=grid_size, engine=engine, seed=seed, traffic="queue", cell_capacity=1)
+    sim.spawn_interval = 2
+    exited = []
+    for t in range(ticks):
+        sim.update()
+        if (t + 1) % window == 0:
+            exited.append(sim.total_exited)
+    return np.diff([0] + exited)
+
+
+def test_queue_traffic_keeps_exiting():
+    for engine in ("object", "fleet"):
+        counts = _exits_per_window(engine)
+        assert (counts > 0).all(), f"{engine}: vehicles stopped exiting {counts.tolist()}"
+
+
+def test_lanes_are_simple_cycles():
+    sim = Simulation(grid_size=(80, 80), seed=1)
+    x0, y0, x1, y1 = sim.ring
+    for lane_id, offset, clockwise in (("inner", 3, True), ("outer", 1, False)):
+        loop = sim.get_lane_loop(lane_id)
+        assert len(set(loop)) == len(loop), f"{lane_id}: repeated cells"
+        for (ax, ay), (bx, by) in zip(loop, loop[1:] + loop[:1]):
+            # 每步移到相邻格子（外道在拐角处斜向切过一步）
+            assert max(abs(ax - bx), abs(ay - by)) == 1, f"{lane_id}: gap between {(ax, ay)} and {(bx, by)}"
+            assert sim.driveable[ay, ax]
+        xs, ys = zip(*loop)
+        assert (min(xs), min(ys), max(xs), max(ys)) == (x0 + offset, y0 + offset, x1 - offset, y1 - offset)
+        # 屏幕坐标（y 向下）中顺时针环路的有向面积为正
+        area = sum(ax * by - bx * ay for (ax, ay), (bx, by) in zip(loop, loop[1:] + loop[:1]))
+        assert (area > 0) == clockwise, lane_id
+
+
+def test_free_traffic_keeps_exiting():
+    results = []
+    for engine in ("object", "fleet"):
+        sim = Simulation(grid_size=(80, 80), engine=engine, seed=1)
+        sim.spawn_interval = 2
+        exited = []
+        for t in range(6000):
+            sim.update()
+            if (t + 1) % 1000 == 0:
+                exited.append(sim.total_exited)
+        counts = np.diff([0] + exited)
+        assert (counts > 0).all(), f"{engine}: vehicles stopped exiting {counts.tolist()}"
+        results.append((sim.total_spawned, sim.total_exited, sim.entry_time_total))
+    assert results[0] == results[1], results
+
+
+def test_routed_queue_traffic_keeps_exiting():
+    with tempfile.TemporaryDirectory() as directory:
+        sim = Simulation(layout=load_layout(_network_layout(directory), cache=False), seed=2,
+                         traffic="queue", cell_capacity=1)
+        assert sim.road_graph.directional
+        sim.spawn_interval = 2
+        exited = []
+        for t in range(4000):
+            sim.update()
+            if (t + 1) % 1000 == 0:
+                exited.append(sim.total_exited)
+        counts = np.diff([0] + exited)
+        assert (counts > 100).all(), f"vehicles stopped exiting {counts.tolist()}"
+
+
+def test_tick_and_event_modes_agree():
+    base = {"grid_size": (200, 200), "num_buildings": 2, "num_stations": 2, "num_gates": 3}
+    for extra in ({}, {"dispatch_interval": 7, "num_robots": 6}):
+        tick = run_headless(dict(base, mode="tick", **extra), 5000, seed=1)
+        event = run_headless(dict(base, mode="event", **extra), 5000, seed=1)
+        timing = ("steps", "wall_time_s", "ticks_per_second")
+        diff = {k: (tick[k], event[k]) for k in tick if k not in timing and tick[k] != event[k]}
+        assert not diff, f"{extra}: {diff}"
+
+
+def test_arrival_rate_change_applies_immediately():
+    for mode in ("tick", "event"):
+        sim = Simulation(grid_size=(120, 120), seed=1, mode=mode)
+        sim.gate_spawn_prob = [0, 0, 0]
+        sim.run_until(500)
+        assert sim.total_spawned == 0
+        sim.gate_spawn_prob = [1, 1, 1]
+        sim.run_until(520)
+        assert sim.total_spawned == 6, f"{mode}: {sim.total_spawned}"
+
+
+def test_arrivals_resume_after_zero_rate_gap():
+    # 零速率时段（17000 个刷新时刻）长于 next_time 一次最多查找的 64 个块（64 × 256 个刷新时刻）
+    profile = [1] * 20 + [0] * 17000 + [1] * 20
+    spawned = []
+    for mode in ("tick", "event"):
+        sim = Simulation(grid_size=(60, 60), seed=1, mode=mode)
+        sim.spawn_interval = 1
+        sim.set_arrival_model("bernoulli", profile=profile)
+        sim.run_until(17000)
+        before = sim.total_spawned
+        sim.run_until(17100)
+        assert sim.total_spawned > before, f"{mode}: no arrivals after the gap"
+        spawned.append((before, sim.total_spawned))
+    assert spawned[0] == spawned[1], spawned
+
+
+def test_vehicles_follow_road_network():
+    assert Simulation(grid_size=(90, 90), seed=1)._router is None  # 环路布局不构建寻路服务
+    with tempfile.TemporaryDirectory() as directory:
+        sim = Simulation(layout=load_layout(_network_layout(directory), cache=False), seed=1)
+        assert sim.road_routing
+        sim.spawn_interval = 2
+        for _ in range(2000):
+            sim.update()
+            for v in sim.vehicles:
+                x, y = v.position
+                assert sim.driveable[y, x], f"vehicle {v.vid} left the road at {v.position}"
+        assert sim.total_exited > 500
+
+
+def _ring_layout(directory, spots=None):
+    """把随机生成的园区导出为 ASCII 布局文件；spots 为 None 时描述文件不含 parking_spots"""
+    base = Simulation(grid_size=(90, 90), seed=3)
+    with open(os.path.join(directory, "ring.txt"), "w") as f:
+        f.write("\n".join("".join(row) for row in base.get_map_data()) + "\n")
+    spec = {"raster": "ring.txt", "gates": [list(g) for g in base.gates]}
+    if spots is not None:
+        spec["parking_spots"] = spots
+    path = os.path.join(directory, "ring.json")
+    with open(path, "w") as f:
+        json.dump(spec, f)
+    return base, path
+
+
+def test_layout_parking_spots():
+    with tempfile.TemporaryDirectory() as directory:
+        base, path = _ring_layout(directory)
+        expected = [(s.x1, s.y1, s.x2, s.y2) for s in base.parking_spots]
+        for cache in (False, True, True):  # 不用缓存、写入缓存、读取缓存
+            layout = load_layout(path, cache=cache)
+            assert layout["parking_spots"] is None
+            sim = Simulation(layout=layout, seed=3)
+            assert [(s.x1, s.y1, s.x2, s.y2) for s in sim.parking_spots] == expected
+        sim.run(200)
+        assert sim.total_spawned > 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        _, path = _ring_layout(directory, spots=[[0, 10, 4, 12], {"row": [10, 0, 30, 4], "size": [2, 4]}])
+        for cache in (False, True, True):
+            sim = Simulation(layout=load_layout(path, cache=cache), seed=3)
+            assert [(s.x1, s.y1, s.x2, s.y2) for s in sim.parking_spots] == \
+                [(0, 10, 4, 12)] + [(x, 0, x + 2, 4) for x in range(10, 30, 2)]
+
+
+def test_hungarian_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(1, 6))
+        m = int(rng.integers(n, 7))
+        # 小整数代价，包含大量并列最优的情况
+        cost = rng.integers(0, 10, size=(n, m)).astype(np.float64)
+        rows, cols = _hungarian(cost)
+        assert rows.tolist() == list(range(n)) and len(set(cols.tolist())) == n
+        best = min(sum(cost[i, c] for i, c in enumerate(perm)) for perm in itertools.permutations(range(m), n))
+        assert cost[rows, cols].sum() == best, (cost, cols)
+
+
+class _Agent:
+    """只带坐标和状态的机器人/车辆替身"""
+
+    def __init__(self, x, y, status="idle"):
+        self.position = (int(x), int(y))
+        self.status = status
+
+
+def test_assignment_k_nearest_candidates():
+    rng = np.random.default_rng(1)
+    vehicles = [_Agent(x, y) for x, y in rng.integers(0, 200, size=(300, 2))]
+    robots = [_Agent(x, y) for x, y in rng.integers(0, 200, size=(12, 2))]
+    dense = optimal_assignment(robots, vehicles, dense_limit=len(vehicles))
+    index = SpatialGrid((200, 200))
+    for v in vehicles:
+        index.insert(v, v.position)
+    for idx in (None, index):
+        sparse = optimal_assignment(robots, vehicles, k_nearest=4, dense_limit=50, index=idx)
+        assert set(sparse) == set(robots) and len(set(sparse.values())) == len(robots)
+        # 每辆分到的车都是某个机器人的 4 近邻之一，总距离与完整矩阵的最优解相同
+        near = {v for r in robots for _, v in index.k_nearest(r.position, 4)}
+        assert set(sparse.values()) <= near
+        total = lambda a: build_cost_matrix(list(a), list(a.values())).diagonal().sum()
+        assert np.isclose(total(sparse), total(dense))
+
+
+class _PlannerMap:
+    """只提供可通行掩码和地图版本号的 Simulation 替身"""
+
+    def __init__(self, passable):
+        self.passable = passable
+        self.map_version = 0
+        self.profiler = None
+
+    def get_passable_mask(self):
+        return self.passable
+
+
+def _bfs_distance(passable, start, goal):
+    """四连通 BFS 最短步数（起点和终点本身视为可通行），不可达返回 None"""
+    rows, cols = passable.shape
+    dist = {start: 0}
+    frontier = deque([start])
+    while frontier:
+        x, y = frontier.popleft()
+        if (x, y) == goal:
+            return dist[goal]
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < cols and 0 <= ny < rows and (nx, ny) not in dist and \
+                    (passable[ny, nx] or (nx, ny) == goal):
+                dist[(nx, ny)] = dist[(x, y)] + 1
+                frontier.append((nx, ny))
+    return None
+
+
+def test_grid_planner_matches_bfs():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        passable = rng.random((30, 40)) > 0.3
+        planner = GridPlanner(_PlannerMap(passable))
+        for _ in range(20):
+            start = (int(rng.integers(40)), int(rng.integers(30)))
+            goal = (int(rng.integers(40)), int(rng.integers(30)))
+            expected = _bfs_distance(passable, start, goal)
+            assert planner.distance(start, goal) == expected, (start, goal)
+            waypoints = planner.waypoints(start, goal)
+            if expected is None:
+                assert waypoints is None
+                continue
+            cells = list(planner.plan(start, goal))
+            assert len(cells) == expected and (not cells or cells[-1] == goal)
+            # 逐格相邻，除终点外不经过建筑
+            for (ax, ay), (bx, by) in zip([start] + cells, cells):
+                assert abs(ax - bx) + abs(ay - by) == 1
+            assert all(passable[y, x] for x, y in cells[:-1])
+            # 路点只保留转弯处：相邻两段沿同一坐标轴、方向相反或相同都说明多保留了路点
+            points = [start] + list(waypoints)
+            for a, b, c in zip(points, points[1:], points[2:]):
+                assert (a[0] == b[0]) != (b[0] == c[0]), (a, b, c)
+
+
+def test_grid_planner_cache():
+    passable = np.ones((20, 20), dtype=bool)
+    passable[10, :19] = False  # 一堵留有缺口的墙
+    sim = _PlannerMap(passable)
+    planner = GridPlanner(sim, max_cached_paths=2)
+    first = planner.waypoints((0, 0), (0, 19))
+    assert planner.distance((0, 0), (0, 19)) == 19 * 3  # 绕到 x = 19 的缺口再折回
+    assert planner.waypoints((0, 0), (0, 19)) is first  # 命中缓存
+    planner.waypoints((1, 0), (1, 19))
+    planner.waypoints((2, 0), (2, 19))
+    assert list(planner._cached) == [((1, 0), (1, 19)), ((2, 0), (2, 19))]  # 最久未用的被淘汰
+
+    # 堵上缺口：地图版本号变化后缓存失效，按新地图重新寻路
+    passable[10, 19] = False
+    sim.map_version += 1
+    assert planner.waypoints((1, 0), (1, 19)) is None
+    passable[10, :] = True
+    sim.map_version += 1
+    assert planner.distance((0, 0), (0, 19)) == 19
+
+
+def _state_fingerprint(sim):
+    """可比较的完整模拟状态：时间、计数、每辆车和每个机器人的状态、充电站统计、需求队列、道路占用"""
+    sim.sync_vehicle_positions()
+    vehicles = [(v.vid, v.state, v.position, float(v.current_battery), v.charging_status) for v in sim.vehicles]
+    robots = [(r.position, r.battery_level, r.status, r.target_station) for r in sim.robots]
+    stations = [sorted((k, v) for k, v in st.items() if k != "position") for st in sim.station_stats()]
+    road = None if sim.road_graph is None else (sim.road_graph.occupancy.tolist(), sim.road_graph.blocked_total)
+    return (sim.global_time, sim.total_spawned, sim.total_parked, sim.total_exited, sim.occupied_count,
+            vehicles, robots, stations, len(sim.charging_queue), road)
+
+
+def test_snapshot_resume_matches_full_run():
+    base = {"grid_size": (80, 80), "num_robots": 4, "spawn_interval": 2}
+    configs = ({}, {"mode": "event"}, {"engine": "fleet"}, {"traffic": "queue", "charging_strategy": "demand"},
+               {"engine": "fleet", "traffic": "queue", "cell_capacity": 2})
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.snap")
+        for extra in configs:
+            config = dict(base, **extra)
+            full = build_simulation(config, seed=4)
+            full.run_until(4000)
+            first = build_simulation(config, seed=4)
+            first.run_until(1500)
+            save_snapshot(first, path)
+            resumed = load_snapshot(path)
+            resumed.run_until(4000)
+            assert _state_fingerprint(resumed) == _state_fingerprint(full), extra
+
+
+def _complete_rows(path):
+    """结果文件中列数完整的行"""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row for row in csv.DictReader(f) if None not in row.values()]
+
+
+def test_sweep_resume():
+    grid = {"num_stations": [1, 2]}
+    base = {"grid_size": [60, 60]}
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "sweep.csv")
+        assert run_sweep(grid, 2, 200, output, base_config=base, jobs=2, log=None) == 4
+        setup = setup_key(200, base, 0)
+        expected = {run_key({"num_stations": n}, r, setup) for n in (1, 2) for r in range(2)}
+        assert {row["run_key"] for row in _complete_rows(output)} == expected
+
+        # 模拟中断：保留表头和第一行，第二行只写了一半
+        with open(output, encoding="utf-8") as f:
+            lines = f.readlines()
+        with open(output, "w", encoding="utf-8") as f:
+            f.writelines(lines[:2])
+            f.write(lines[2][:len(lines[2]) // 2])
+        assert run_sweep(grid, 2, 200, output, base_config=base, jobs=2, log=None) == 3
+        keys = [row["run_key"] for row in _complete_rows(output)]
+        assert sorted(keys) == sorted(expected), keys
+        assert run_sweep(grid, 2, 200, output, base_config=base, jobs=2, log=None) == 0
+
+        # 共享设置（时长、基础配置、基础种子、快照内容）改变时 setup 摘要不同，旧结果保留、新运行另行写入
+        snapshot = os.path.join(directory, "warm.snap")
+        save_snapshot(Simulation(grid_size=(60, 60), seed=1), snapshot)
+        variants = {setup, setup_key(300, base, 0), setup_key(200, {"grid_size": [70, 70]}, 0),
+                    setup_key(200, base, 1), setup_key(200, base, 0, snapshot)}
+        assert len(variants) == 5
+        assert run_sweep(grid, 2, 300, output, base_config=base, jobs=2, log=None) == 4
+        rows = _complete_rows(output)
+        assert len({row["run_key"] for row in rows}) == len(rows) == 8
+        assert {row["setup"] for row in rows} == {setup, setup_key(300, base, 0)}
+
+
+def _choose_station_reference(sim, robot):
+    """逐站调用寻路、逐个机器人统计在途数的选站结果"""
+    best, best_cost = None, float("inf")
+    nearest = robot.nearest_station(robot.position)
+    for pos, station in sim.stations.items():
+        travel = robot.travel_distance(robot.position, pos)
+        if pos != nearest and robot.move_cost * travel > robot.battery_level:
+            continue
+        ahead = station.load() + sum(1 for r in sim.robots
+                                     if r is not robot and r.target_station == pos and r.charging_station is None)
+        cost = travel + (ahead // station.slots) * (robot.max_battery / station.charge_rate)
+        if cost < best_cost:
+            best, best_cost = pos, cost
+    return best
+
+
+def test_station_choice():
+    sim = Simulation(grid_size=(120, 120), num_buildings=4, num_stations=8, num_robots=12, seed=2)
+    sim.spawn_interval = 2
+    sent = 0
+    for t in range(3000):
+        sim.update()
+        for pos, station in sim.stations.items():
+            inbound = sum(1 for r in sim.robots if r.target_station == pos and r.charging_station is None)
+            assert station.inbound == inbound, f"{pos}: {station.inbound} != {inbound}"
+        for robot in sim.robots if t % 50 == 0 else ():
+            if robot.target_station is None:
+                assert sim.choose_station(robot) == _choose_station_reference(sim, robot)
+        sent += sum(station.inbound for station in sim.stations.values())
+    assert sent > 0
+
+
+if __name__ == "__main__":
+    test_queue_traffic_keeps_exiting()
+    test_lanes_are_simple_cycles()
+    test_free_traffic_keeps_exiting()
+    test_routed_queue_traffic_keeps_exiting()
+    test_tick_and_event_modes_agree()
+    test_arrival_rate_change_applies_immediately()
+    test_arrivals_resume_after_zero_rate_gap()
+    test_vehicles_follow_road_network()
+    test_layout_parking_spots()
+    test_hungarian_matches_brute_force()
+    test_assignment_k_nearest_candidates()
+    test_grid_planner_matches_bfs()
+    test_grid_planner_cache()
+    test_snapshot_resume_matches_full_run()
+    test_sweep_resume()
+    test_station_choice()
+    print("ok")
@@ -0,0 +1,231 @@
+"""
+-------------------------------------------------
+文件名：logger.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    模拟事件日志（遥测），把车辆刷新、停车、充电开始/结束、离场、机器人移动等事件以流的形式输出：
+    - `EventLog` 内部是固定容量的环形缓冲区，每个事件只写入一个元组（约几十纳秒），
+      缓冲区写满或调用 flush() 时整批交给各输出端，内存占用有上限，可在长时间运行中一直开启
+    - 输出端可插拔，任何提供 write(batch) / close() 的对象都可以作为输出端：
+      `JsonlSink`（每行一个 JSON 事件）、`ChunkSink`（按列存储的二进制分块，读取见 read_events）、
+      `SocketSink`（把同样的二进制分块发送到本地 TCP 或 Unix 套接字）
+    - 每个事件有 7 列：时刻、类型、实体编号（车辆编号或机器人编号）、关联编号（充电事件的机器人编号，
+      刷新事件的大门下标，其余为 -1）、坐标 x / y、数值（车辆或机器人当前电量）
+    Simulation.telemetry 为 None 时不产生任何事件，没有额外开销。
+
+用法示例：
+    sim.telemetry = EventLog([JsonlSink("events.jsonl")])
+    sim.run(10000)
+    sim.telemetry.close()
+-------------------------------------------------
+"""
+import socket
+import struct
+
+import numpy as np
+
+# 事件类型编码
+EVENT_SPAWN = 0
+EVENT_PARK = 1
+EVENT_CHARGE_START = 2
+EVENT_CHARGE_STOP = 3
+EVENT_DEPART = 4
+EVENT_EXIT = 5
+EVENT_ROBOT_MOVE = 6
+EVENT_NAMES = ("spawn", "park", "charge_start", "charge_stop", "depart", "exit", "robot_move")
+
+# 按列存储时各列的名称和类型（与事件元组的顺序一致）
+EVENT_COLUMNS = (
+    ("time", np.int64),
+    ("kind", np.uint8),
+    ("entity", np.int64),
+    ("peer", np.int64),
+    ("x", np.int32),
+    ("y", np.int32),
+    ("value", np.float64),
+)
+EVENT_DTYPE = np.dtype([(name, dtype) for name, dtype in EVENT_COLUMNS])
+
+CHUNK_MAGIC = b"PARKEVT1"
+_CHUNK_HEADER = struct.Struct("<I")  # 分块行数
+
+
+class EventLog:
+    def __init__(self, sinks=(), capacity=65536):
+        """
+        :param sinks: 输出端列表
+        :param capacity: 缓冲区容量（事件数），写满即整批输出
+        """
+        self.sinks = list(sinks)
+        self.capacity = max(int(capacity), 1)
+        self._buf = [None] * self.capacity
+        self._n = 0
+        self.emitted = 0  # 累计事件数
+
+    def __len__(self):
+        return self._n
+
+    def emit(self, time, kind, entity, x, y, value=0.0, peer=-1):
+        """记录一个事件"""
+        n = self._n
+        self._buf[n] = (time, kind, entity, peer, x, y, value)
+        n += 1
+        self._n = n
+        if n == self.capacity:
+            self.flush()
+
+    def emit_many(self, time, kind, entity, x, y, value, peer=None):
+        """
+        批量记录同一时刻、同一类型的事件（车队引擎的向量化结果），各参数为等长数组。
+        :param peer: 关联编号数组，None 表示均为 -1
+        """
+        rows = len(entity)
+        if rows == 0:
+            return
+        peer = [-1] * rows if peer is None else np.asarray(peer).tolist()
+        events = zip([time] * rows, [kind] * rows, np.asarray(entity).tolist(), peer,
+                     np.asarray(x).tolist(), np.asarray(y).tolist(), np.asarray(value).tolist())
+        for event in events:
+            self._buf[self._n] = event
+            self._n += 1
+            if self._n == self.capacity:
+                self.flush()
+
+    def flush(self):
+        """把缓冲区中的事件整批交给各输出端"""
+        n = self._n
+        if n == 0:
+            return
+        batch = self._buf[:n]
+        self._n = 0
+        self.emitted += n
+        for sink in self.sinks:
+            sink.write(batch)
+
+    def close(self):
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+
+def to_columns(batch):
+    """把一批事件元组转换为按列存储的结构化数组"""
+    return np.array(batch, dtype=EVENT_DTYPE)
+
+
+def encode_chunk(batch):
+    """一批事件编码为二进制分块：行数 + 各列连续存放的原始字节"""
+    table = to_columns(batch)
+    parts = [_CHUNK_HEADER.pack(len(table))]
+    parts.extend(np.ascontiguousarray(table[name]).tobytes() for name, _ in EVENT_COLUMNS)
+    return b"".join(parts)
+
+
+def decode_chunks(data):
+    """
+    解码连续的二进制分块（不含文件头），返回 {列名: 数组}。
+    末尾不完整的分块（写入中断）会被忽略。
+    """
+    row_size = sum(np.dtype(dtype).itemsize for _, dtype in EVENT_COLUMNS)
+    chunks = {name: [] for name, _ in EVENT_COLUMNS}
+    offset = 0
+    while offset + _CHUNK_HEADER.size <= len(data):
+        (rows,) = _CHUNK_HEADER.unpack_from(data, offset)
+        if offset + _CHUNK_HEADER.size + rows * row_size > len(data):
+            break
+        offset += _CHUNK_HEADER.size
+        for name, dtype in EVENT_COLUMNS:
+            chunks[name].append(np.frombuffer(data, dtype=dtype, count=rows, offset=offset))
+            offset += rows * np.dtype(dtype).itemsize
+    return {name: np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+            for (name, dtype), parts in zip(EVENT_COLUMNS, chunks.values())}
+
+
+def read_events(path):
+    """读取 ChunkSink 写出的文件，返回 {列名: 数组}，kind 列可用 EVENT_NAMES 转为名称"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(CHUNK_MAGIC):
+        raise ValueError(f"{path} is not an event chunk file")
+    return decode_chunks(memoryview(data)[len(CHUNK_MAGIC):])
+
+
+# ====== 输出端 ======
+class JsonlSink:
+    """每个事件写为一行 JSON"""
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, batch):
+        names = EVENT_NAMES
+        self.file.write("".join(
+            f'{{"time": {t}, "kind": "{names[k]}", "entity": {e}, "peer": {p}, "x": {x}, "y": {y}, "value": {v}}}\n'
+            for t, k, e, p, x, y, v in batch))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ChunkSink:
+    """按列存储的二进制分块文件：文件头魔数后依次追加各批事件的分块"""
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(CHUNK_MAGIC)
+
+    def write(self, batch):
+        self.file.write(encode_chunk(batch))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SocketSink:
+    """
+    把二进制分块发送到本地套接字（连接建立后先发送魔数）。
+    对端断开后不再发送，丢弃的事件数记在 dropped 中，不影响模拟继续运行。
+    """
+    def __init__(self, address):
+        """
+        :param address: (host, port) 为 TCP 连接，字符串为 Unix 套接字路径
+        """
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address)
+        else:
+            self.sock = socket.create_connection(tuple(address))
+        self.sock.sendall(CHUNK_MAGIC)
+        self.dropped = 0
+
+    def write(self, batch):
+        if self.sock is None:
+            self.dropped += len(batch)
+            return
+        try:
+            self.sock.sendall(encode_chunk(batch))
+        except OSError:
+            self.sock.close()
+            self.sock = None
+            self.dropped += len(batch)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def open_sink(target):
+    """
+    根据目标字符串创建输出端：tcp://host:port 或 unix:///path 为套接字，
+    以 .jsonl 结尾为 JSONL 文件，其余为二进制分块文件。
+    """
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rpartition(":")
+        return SocketSink((host, int(port)))
+    if target.startswith("unix://"):
+        return SocketSink(target[len("unix://"):])
+    if target.endswith(".jsonl"):
+        return JsonlSink(target)
+    return ChunkSink(target)
@@ -0,0 +1,132 @@
+"""
+-------------------------------------------------
+文件名：profiler.py
+创作人：顾昊瑜
+日期：2025年3月
+功能描述：
+    模拟各子系统的耗时剖析，用于定位界面卡顿或批量运行变慢的来源：
+    - Simulation.update 按阶段计时：刷新车辆 (spawn)、车辆推进 (vehicles)、充电调度 (scheduling)、
+      机器人更新 (robots)，以及整步耗时 (tick)
+    - 嵌套在上述阶段内部的机器人避障 A*（planning，GridPlanner 未命中缓存的搜索）单独计时；
+      界面每次重绘记为 render
+    - 计时使用 time.perf_counter_ns，每个阶段保留最近 window 个样本（环形数组），
+      按需计算 p50 / p95 / p99 和耗时分布，同时记录车辆数、需求队列长度等实体数量
+    Simulation.profiler 为 None（默认）时各计时点只做一次 None 判断，不产生计时开销。
+
+用法示例：
+    sim.profiler = Profiler()
+    sim.run(1000)
+    print(sim.profiler.stats()["vehicles"]["p99_ms"])
+-------------------------------------------------
+"""
+from time import perf_counter_ns
+
+import numpy as np
+
+# 阶段编码
+PHASE_TICK = 0
+PHASE_SPAWN = 1
+PHASE_VEHICLES = 2
+PHASE_SCHEDULING = 3
+PHASE_ROBOTS = 4
+PHASE_PLANNING = 5
+PHASE_RENDER = 6
+PHASE_NAMES = ("tick", "spawn", "vehicles", "scheduling", "robots", "planning", "render")
+
+
+class Profiler:
+    def __init__(self, window=1024):
+        """
+        :param window: 每个阶段保留的最近样本数，百分位数按这些样本滚动计算
+        """
+        self.window = max(int(window), 1)
+        self._samples = np.zeros((len(PHASE_NAMES), self.window), dtype=np.int64)
+        self._counts = [0] * len(PHASE_NAMES)  # 各阶段累计样本数
+        self._tick_start = 0
+        self._last = 0
+        self.entities = {}  # 最近一步结束时的实体数量
+
+    # ====== 计时 ======
+    def record(self, phase, ns):
+        """记录某阶段的一次耗时（纳秒）"""
+        i = self._counts[phase]
+        self._samples[phase, i % self.window] = ns
+        self._counts[phase] = i + 1
+
+    def begin_tick(self):
+        """一步开始：之后的 lap() 从此刻起计时"""
+        self._tick_start = self._last = perf_counter_ns()
+
+    def lap(self, phase):
+        """记录从上一个计时点到现在的耗时，归入 phase"""
+        now = perf_counter_ns()
+        self.record(phase, now - self._last)
+        self._last = now
+
+    def end_tick(self, sim):
+        """一步结束：记录整步耗时和实体数量"""
+        self.record(PHASE_TICK, perf_counter_ns() - self._tick_start)
+        self.entities = {
+            "vehicles": len(sim.vehicles),
+            "robots": len(sim.robots),
+            "occupied_spots": sim.occupied_count,
+            "charge_queue": len(sim.charging_queue),
+            "pending_events": len(sim.events),
+        }
+
+    def reset(self):
+        self._counts = [0] * len(PHASE_NAMES)
+
+    # ====== 读取 ======
+    def samples(self, phase):
+        """某阶段最近的样本（纳秒，按时间先后）"""
+        if isinstance(phase, str):
+            phase = PHASE_NAMES.index(phase)
+        n = self._counts[phase]
+        if n <= self.window:
+            return self._samples[phase, :n].copy()
+        return np.roll(self._samples[phase], -(n % self.window))
+
+    def stats(self):
+        """
+        返回 {阶段名: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"}}（只含有样本的阶段），
+        百分位数按最近 window 个样本计算，count 为累计样本数；"entities" 为最近一步的实体数量。
+        """
+        result = {}
+        for phase, name in enumerate(PHASE_NAMES):
+            n = self._counts[phase]
+            if n == 0:
+                continue
+            window = self._samples[phase, :min(n, self.window)] / 1e6
+            p50, p95, p99 = np.percentile(window, (50, 95, 99)).tolist()
+            result[name] = {
+                "count": n,
+                "mean_ms": float(window.mean()),
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "max_ms": float(window.max()),
+            }
+        result["entities"] = dict(self.entities)
+        return result
+
+    def histogram(self, phase="tick", bins=16):
+        """
+        某阶段最近样本的耗时分布，按 2 的幂次分桶（1µs、2µs、4µs...）。
+        :return: (各桶下边界毫秒数组, 各桶样本数数组)
+        """
+        samples = self.samples(phase)
+        edges = 1000 * 2.0 ** np.arange(bins + 1)
+        counts, _ = np.histogram(np.clip(samples, edges[0], edges[-1] - 1), bins=edges)
+        return edges[:-1] / 1e6, counts
+
+    def summary_lines(self):
+        """叠加显示用的文本行：每个阶段一行 p50/p95/p99，最后一行为实体数量"""
+        stats = self.stats()
+        lines = []
+        for name in PHASE_NAMES:
+            if name in stats:
+                s = stats[name]
+                lines.append(f"{name:<11} p50 {s['p50_ms']:7.2f}  p95 {s['p95_ms']:7.2f}  p99 {s['p99_ms']:7.2f} ms")
+        lines.append(" ".join(f"{k}={v}" for k, v in stats["entities"].items()))
+        return lines